@@ -1,87 +1,307 @@
-import base64
+import random
+import threading
+import time
+from collections import Counter
 import requests
-from pathlib import Path
-from typing import Optional
+from email.utils import parsedate_to_datetime
+from typing import List, Optional
+from requests.adapters import HTTPAdapter
+
+from api.errors import (
+    EmbeddingError, RateLimitError, ServerError, RequestTimeoutError, NetworkError,
+    ClientError, InvalidResponseError, InputError, CancelledError,
+)
+from api.preprocess import encode_image, encode_raw
+from api.query_cache import QueryEmbeddingCache
+from api.rate_limiter import TokenBucket
+from config.settings import (
+    API_URL, MODEL_NAME, EMBED_BATCH_SIZE, EMBED_BATCH_MAX_BYTES, INDEX_CONCURRENCY,
+    API_MAX_RETRIES, API_BACKOFF_BASE, API_BACKOFF_MAX,
+    PREPROCESS_ENABLED, PREPROCESS_MAX_EDGE, PREPROCESS_QUALITY, HASH_ALGORITHM,
+)
+from core.file_hash import file_hash
+from core.metrics import metrics
+
+
+class EmbeddingResult:
+    """批量请求中单个输入的结果"""
+
+    def __init__(self, embedding: Optional[list] = None,
+                 error: Optional[EmbeddingError] = None):
+        self.embedding = embedding
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.embedding is not None
+
+    @property
+    def retryable(self) -> bool:
+        return self.error is not None and self.error.retryable
 
-from config.settings import API_URL, MODEL_NAME
 
 class EmbeddingAPI:
-    """阿里云百炼 Embedding API 封装"""
-    
-    def __init__(self, api_key: str):
+    """阿里云百炼 Embedding API 封装
+
+    批量方法把多个输入打包进同一个请求的 contents 列表，按条数和
+    请求体大小分批，返回结果按 index 对应回各自的输入。所有请求共用
+    一个保持长连接的 Session（可跨线程共享），429/5xx/超时按带抖动的
+    指数退避重试并遵循 Retry-After，失败以 EmbeddingError 子类返回。
+    文本向量可经由 QueryEmbeddingCache 缓存，重复查询不再请求 API。
+    请求耗时、JSON 解析耗时、上传字节数、状态码与重试次数记录在
+    core.metrics.metrics 中。
+    """
+
+    def __init__(self, api_key: str, rate_limiter: Optional[TokenBucket] = None,
+                 batch_size: int = EMBED_BATCH_SIZE,
+                 batch_max_bytes: int = EMBED_BATCH_MAX_BYTES,
+                 pool_size: int = INDEX_CONCURRENCY,
+                 max_retries: int = API_MAX_RETRIES,
+                 query_cache: Optional[QueryEmbeddingCache] = None,
+                 api_url: str = API_URL):
         self.api_key = api_key
+        self.api_url = api_url
+        self.rate_limiter = rate_limiter
+        self.query_cache = query_cache
+        self.batch_size = max(1, batch_size)
+        self.batch_max_bytes = batch_max_bytes
+        self.max_retries = max_retries
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
-    
-    def get_text_embedding(self, text: str) -> Optional[list]:
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+    def get_text_embedding(self, text: str,
+                           cancel_event: Optional[threading.Event] = None) -> Optional[list]:
         """获取文本的embedding向量"""
+        result = self.get_text_embeddings([text], cancel_event)[0]
+        if not result.ok and not isinstance(result.error, CancelledError):
+            print(f"文本Embedding错误: {result.error}")
+        return result.embedding
+
+    def get_image_embedding(self, image_path: str,
+                            cancel_event: Optional[threading.Event] = None) -> Optional[list]:
+        """获取图片的embedding向量"""
+        result = self.get_image_embeddings([image_path], cancel_event)[0]
+        if not result.ok and not isinstance(result.error, CancelledError):
+            print(f"图片Embedding错误 {image_path}: {result.error}")
+        return result.embedding
+
+    def get_image_query_embedding(self, image_path: str,
+                                  cancel_event: Optional[threading.Event] = None) -> Optional[list]:
+        """获取作为查询的图片的向量，按内容哈希缓存在查询缓存中，同一张图片只请求一次"""
+        key = None
+        if self.query_cache is not None:
+            try:
+                key = f"image:{file_hash(image_path, HASH_ALGORITHM)}"
+            except (OSError, ValueError) as e:
+                print(f"读取图片失败 {image_path}: {e}")
+                return None
+            cached = self.query_cache.get(MODEL_NAME, key)
+            metrics.inc("query_cache_requests_total", result="miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
+
+        embedding = self.get_image_embedding(image_path, cancel_event)
+        if embedding is not None and key is not None:
+            self.query_cache.put(MODEL_NAME, key, embedding)
+        return embedding
+
+    def get_text_embeddings(self, texts: List[str],
+                            cancel_event: Optional[threading.Event] = None) -> List[EmbeddingResult]:
+        """批量获取文本的embedding向量，结果与输入一一对应"""
+        results = [None] * len(texts)
+        positions = []
+        for i, text in enumerate(texts):
+            cached = None
+            if self.query_cache is not None:
+                cached = self.query_cache.get(MODEL_NAME, text)
+            if cached is not None:
+                results[i] = EmbeddingResult(embedding=cached)
+            else:
+                positions.append(i)
+        if self.query_cache is not None:
+            metrics.inc("query_cache_requests_total", len(texts) - len(positions), result="hit")
+            metrics.inc("query_cache_requests_total", len(positions), result="miss")
+
+        contents = [{"text": texts[i]} for i in positions]
+        sizes = [len(texts[i].encode("utf-8")) for i in positions]
+        batch_results = self._embed_batched(contents, sizes, timeout=30, cancel_event=cancel_event)
+        for i, result in zip(positions, batch_results):
+            results[i] = result
+            if result.ok and self.query_cache is not None:
+                self.query_cache.put(MODEL_NAME, texts[i], result.embedding)
+        return results
+
+    def get_image_embeddings(self, image_paths: List[str],
+                             cancel_event: Optional[threading.Event] = None) -> List[EmbeddingResult]:
+        """批量获取图片的embedding向量，结果与输入一一对应"""
+        data_uris = []
+        for image_path in image_paths:
+            try:
+                with metrics.timer("api_stage_seconds", stage="encode"):
+                    data_uris.append(self.encode_image(image_path))
+            except Exception as e:
+                data_uris.append(InputError(f"读取图片失败: {e}"))
+        return self.get_data_uri_embeddings(data_uris, cancel_event)
+
+    def get_data_uri_embeddings(self, data_uris: list,
+                                cancel_event: Optional[threading.Event] = None) -> List[EmbeddingResult]:
+        """批量获取已编码图片的向量；列表中的 EmbeddingError 原样作为该项的结果"""
+        results = [None] * len(data_uris)
+        contents, sizes, positions = [], [], []
+
+        for i, data_uri in enumerate(data_uris):
+            if isinstance(data_uri, EmbeddingError):
+                results[i] = EmbeddingResult(error=data_uri)
+                continue
+            contents.append({"image": data_uri})
+            sizes.append(len(data_uri))
+            positions.append(i)
+
+        batch_results = self._embed_batched(contents, sizes, timeout=60, cancel_event=cancel_event)
+        for i, result in zip(positions, batch_results):
+            results[i] = result
+        return results
+
+    def encode_image(self, image_path: str) -> str:
+        """把图片文件编码为 base64 data URI（按配置先缩小并重新编码）"""
+        if PREPROCESS_ENABLED:
+            return encode_image(image_path, PREPROCESS_MAX_EDGE, PREPROCESS_QUALITY)
+        return encode_raw(image_path)
+
+    def _embed_batched(self, contents: list, sizes: list, timeout: int,
+                       cancel_event: Optional[threading.Event]) -> List[EmbeddingResult]:
+        """按条数和请求体大小分批发送"""
+        results = []
+        batch, batch_bytes = [], 0
+
+        for content, size in zip(contents, sizes):
+            if batch and (len(batch) >= self.batch_size
+                          or batch_bytes + size > self.batch_max_bytes):
+                results.extend(self._embed_request(batch, timeout, cancel_event))
+                batch, batch_bytes = [], 0
+            batch.append(content)
+            batch_bytes += size
+
+        if batch:
+            results.extend(self._embed_request(batch, timeout, cancel_event))
+
+        kind = "text" if contents and "text" in contents[0] else "image"
+        failures = Counter(type(r.error).__name__ for r in results if not r.ok)
+        metrics.inc("api_inputs_total", len(results) - sum(failures.values()), kind=kind, result="ok")
+        for error, count in failures.items():
+            metrics.inc("api_inputs_total", count, kind=kind, result=error)
+        return results
+
+    def _embed_request(self, contents: list, timeout: int,
+                       cancel_event: Optional[threading.Event]) -> List[EmbeddingResult]:
+        """发送一次请求，按返回的 index 把向量对应回输入"""
         payload = {
             "model": MODEL_NAME,
             "input": {
-                "contents": [
-                    {"text": text}
-                ]
+                "contents": contents
             }
         }
-        
+
         try:
-            response = requests.post(
-                API_URL,
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
-            response.raise_for_status()
-            result = response.json()
-            
-            if "output" in result and "embeddings" in result["output"]:
-                return result["output"]["embeddings"][0]["embedding"]
+            result = self._post(payload, timeout, cancel_event)
+        except ClientError as e:
+            # 批内某个输入不合法会导致整批 400，拆半重试以定位到单个输入
+            if e.status_code == 400 and len(contents) > 1:
+                middle = len(contents) // 2
+                return (self._embed_request(contents[:middle], timeout, cancel_event)
+                        + self._embed_request(contents[middle:], timeout, cancel_event))
+            return [EmbeddingResult(error=e) for _ in contents]
+        except EmbeddingError as e:
+            return [EmbeddingResult(error=e) for _ in contents]
+
+        results = [
+            EmbeddingResult(error=InvalidResponseError("响应中缺少该输入的向量"))
+            for _ in contents
+        ]
+        embeddings = result.get("output", {}).get("embeddings", [])
+        for position, item in enumerate(embeddings):
+            index = item.get("index", position)
+            if 0 <= index < len(contents) and item.get("embedding"):
+                results[index] = EmbeddingResult(embedding=item["embedding"])
+        return results
+
+    def _post(self, payload: dict, timeout: int,
+              cancel_event: Optional[threading.Event]) -> dict:
+        """带限流与重试的 POST，返回解析后的 JSON，失败抛出 EmbeddingError"""
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                if not self.rate_limiter.acquire(cancel_event=cancel_event):
+                    raise CancelledError("已取消")
+
+            if attempt:
+                metrics.inc("api_retries_total")
+            try:
+                with metrics.timer("api_stage_seconds", stage="http"):
+                    response = self.session.post(self.api_url, json=payload, timeout=timeout)
+            except requests.Timeout as e:
+                metrics.inc("api_requests_total", status="timeout")
+                error = RequestTimeoutError(f"请求超时: {e}")
+            except requests.RequestException as e:
+                metrics.inc("api_requests_total", status="network")
+                error = NetworkError(f"网络错误: {e}")
+            else:
+                metrics.inc("api_requests_total", status=str(response.status_code))
+                metrics.inc("api_upload_bytes_total", len(response.request.body or b""))
+                error = self._classify(response)
+                if error is None:
+                    try:
+                        with metrics.timer("api_stage_seconds", stage="parse"):
+                            return response.json()
+                    except ValueError as e:
+                        raise InvalidResponseError(f"响应不是合法的 JSON: {e}")
+
+            if not error.retryable or attempt == self.max_retries:
+                raise error
+
+            delay = getattr(error, "retry_after", None)
+            if delay is None:
+                # 带完全抖动的指数退避
+                delay = random.uniform(0, min(API_BACKOFF_MAX, API_BACKOFF_BASE * 2 ** attempt))
+            if cancel_event is None:
+                time.sleep(delay)
+            elif cancel_event.wait(delay):
+                raise CancelledError("已取消")
+
+    def _classify(self, response: requests.Response) -> Optional[EmbeddingError]:
+        """把 HTTP 状态码映射为对应的错误类型，成功时返回 None"""
+        status = response.status_code
+        if status < 400:
             return None
-        except Exception as e:
-            print(f"文本Embedding错误: {e}")
+
+        message = f"HTTP {status}: {response.text[:200]}"
+        if status == 429:
+            return RateLimitError(message, retry_after=self._retry_after(response))
+        if status >= 500:
+            return ServerError(message, status)
+        return ClientError(message, status)
+
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """解析 Retry-After（秒数或 HTTP 日期）"""
+        value = response.headers.get("Retry-After")
+        if not value:
             return None
-    
-    def get_image_embedding(self, image_path: str) -> Optional[list]:
-        """获取图片的embedding向量"""
         try:
-            with open(image_path, "rb") as f:
-                image_data = base64.b64encode(f.read()).decode("utf-8")
-            
-            # 获取图片格式
-            ext = Path(image_path).suffix.lower()
-            mime_types = {
-                '.jpg': 'image/jpeg',
-                '.jpeg': 'image/jpeg',
-                '.png': 'image/png',
-                '.gif': 'image/gif',
-                '.bmp': 'image/bmp',
-                '.webp': 'image/webp'
-            }
-            mime_type = mime_types.get(ext, 'image/jpeg')
-            
-            payload = {
-                "model": MODEL_NAME,
-                "input": {
-                    "contents": [
-                        {"image": f"data:{mime_type};base64,{image_data}"}
-                    ]
-                }
-            }
-            
-            response = requests.post(
-                API_URL,
-                headers=self.headers,
-                json=payload,
-                timeout=60
-            )
-            response.raise_for_status()
-            result = response.json()
-            
-            if "output" in result and "embeddings" in result["output"]:
-                return result["output"]["embeddings"][0]["embedding"]
-            return None
-        except Exception as e:
-            print(f"图片Embedding错误 {image_path}: {e}")
-            return None
\ No newline at end of file
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(delay, 0.0), API_BACKOFF_MAX)
@@ -0,0 +1,51 @@
+from typing import Optional
+
+
+class EmbeddingError(Exception):
+    """Embedding 请求失败的基类，retryable 表示稍后重试可能成功"""
+    retryable = False
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RateLimitError(EmbeddingError):
+    """超出 QPS 配额（HTTP 429）"""
+    retryable = True
+
+    def __init__(self, message: str, status_code: Optional[int] = 429,
+                 retry_after: Optional[float] = None):
+        super().__init__(message, status_code)
+        self.retry_after = retry_after
+
+
+class ServerError(EmbeddingError):
+    """服务端错误（HTTP 5xx）"""
+    retryable = True
+
+
+class RequestTimeoutError(EmbeddingError):
+    """请求超时"""
+    retryable = True
+
+
+class NetworkError(EmbeddingError):
+    """连接失败等网络错误"""
+    retryable = True
+
+
+class ClientError(EmbeddingError):
+    """请求本身不合法（HTTP 4xx），重试不会成功"""
+
+
+class InvalidResponseError(EmbeddingError):
+    """响应无法解析或缺少向量"""
+
+
+class InputError(EmbeddingError):
+    """本地输入无法读取"""
+
+
+class CancelledError(EmbeddingError):
+    """请求在发出前被取消"""
@@ -0,0 +1,98 @@
+import os
+import base64
+from io import BytesIO
+from pathlib import Path
+from typing import Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.bmp': 'image/bmp',
+    '.webp': 'image/webp'
+}
+
+# 可以原样上传的格式；其余格式（GIF、BMP 等）总是重新编码
+PASSTHROUGH_MIME_TYPES = {'image/jpeg', 'image/png'}
+
+
+def _data_uri(data: bytes, mime_type: str) -> str:
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+def encode_raw(image_path: str) -> str:
+    """原样读取文件并编码为 data URI"""
+    with open(image_path, "rb") as f:
+        data = f.read()
+    mime_type = MIME_TYPES.get(Path(image_path).suffix.lower(), 'image/jpeg')
+    return _data_uri(data, mime_type)
+
+
+def encode_image(image_path: str, max_edge: int, quality: int) -> str:
+    """解码、缩小到最长边不超过 max_edge 并重新编码为 JPEG，返回 data URI
+
+    JPEG 使用 draft 模式按缩小后的尺寸解码，内存占用与原图分辨率基本无关；
+    动图只取第一帧；原图已经足够小且格式可直接上传时保留原始字节。
+    未安装 Pillow 时退化为原样上传。
+    """
+    if Image is None:
+        return encode_raw(image_path)
+
+    original_size = os.path.getsize(image_path)
+    mime_type = MIME_TYPES.get(Path(image_path).suffix.lower(), 'image/jpeg')
+    passthrough = mime_type in PASSTHROUGH_MIME_TYPES
+
+    with Image.open(image_path) as img:
+        img.draft("RGB", (max_edge, max_edge))
+        if getattr(img, "is_animated", False):
+            img.seek(0)
+        small_enough = max(img.size) <= max_edge
+        if small_enough and passthrough and original_size < 512 * 1024:
+            return encode_raw(image_path)
+
+        frame = ImageOps.exif_transpose(img)
+        if frame.mode in ("RGBA", "LA", "P"):
+            # 透明背景合成到白底
+            frame = frame.convert("RGBA")
+            background = Image.new("RGB", frame.size, (255, 255, 255))
+            background.paste(frame, mask=frame.getchannel("A"))
+            frame = background
+        elif frame.mode != "RGB":
+            frame = frame.convert("RGB")
+
+        if not small_enough:
+            frame.thumbnail((max_edge, max_edge), Image.Resampling.BICUBIC, reducing_gap=2.0)
+
+        buffer = BytesIO()
+        frame.save(buffer, "JPEG", quality=quality)
+
+    encoded = buffer.getvalue()
+    if passthrough and original_size <= len(encoded):
+        return encode_raw(image_path)
+    return _data_uri(encoded, "image/jpeg")
+
+
+def image_size(image_path: str) -> Optional[Tuple[int, int]]:
+    """只读取文件头返回 (宽, 高)，不解码像素；未安装 Pillow 或无法识别时返回 None"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(image_path) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def encode_image_safe(image_path: str, max_edge: int,
+                      quality: int) -> Tuple[Optional[str], Optional[str]]:
+    """供进程池调用：返回 (data URI, 错误信息)，异常不跨进程抛出"""
+    try:
+        return encode_image(image_path, max_edge, quality), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import base64
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Optional
+
+
+class QueryEmbeddingCache:
+    """查询向量的 LRU 缓存
+
+    以 (模型名, 查询文本) 为键（以图搜图的外部图片以 "image:内容哈希" 为键），容量满时淘汰最久未使用的条目，超过 ttl
+    秒的条目视为过期。可选持久化到磁盘，向量以 float32 的 base64 保存。
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, max_size: int, ttl: float = 0, persist_path: str = ""):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # (model, text) -> (写入时间, 向量)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, model: str, text: str) -> Optional[list]:
+        """命中时返回向量并刷新 LRU 顺序"""
+        key = (model, text)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and self._expired(item[0]):
+                del self._items[key]
+                item = None
+
+            if item is None:
+                self.misses += 1
+                return None
+
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, model: str, text: str, embedding: list):
+        if self.max_size <= 0:
+            return
+        key = (model, text)
+        with self._lock:
+            self._items[key] = (time.time(), embedding)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate
+        }
+
+    def load(self):
+        """从磁盘加载，跳过已过期的条目"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            with self._lock:
+                for model, text, created, encoded in data.get("items", []):
+                    if self._expired(created):
+                        continue
+                    vector = np.frombuffer(base64.b64decode(encoded), dtype=np.float32)
+                    self._items[(model, text)] = (created, vector.tolist())
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+        except Exception as e:
+            print(f"加载查询缓存失败: {e}")
+
+    def save(self):
+        """原子地写回磁盘（按 LRU 顺序）"""
+        if not self.persist_path:
+            return
+        with self._lock:
+            items = [
+                [model, text, created,
+                 base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode('ascii')]
+                for (model, text), (created, vector) in self._items.items()
+                if not self._expired(created)
+            ]
+        try:
+            tmp = self.persist_path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({"version": self.FORMAT_VERSION, "items": items}, f, ensure_ascii=False)
+            os.replace(tmp, self.persist_path)
+        except Exception as e:
+            print(f"保存查询缓存失败: {e}")
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
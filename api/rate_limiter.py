@@ -0,0 +1,43 @@
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """线程安全的令牌桶限流器
+
+    以 rate 个/秒的速度补充令牌，最多积攒 capacity 个，用于把并发请求
+    限制在 API 的 QPS 配额之内。rate 为 0 时不限流。
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """不阻塞地尝试取得令牌：成功返回 0，否则返回还需等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0,
+                cancel_event: Optional[threading.Event] = None) -> bool:
+        """阻塞直到取得令牌；等待期间 cancel_event 被置位则返回 False"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return True
+            if cancel_event is None:
+                time.sleep(wait)
+            elif cancel_event.wait(wait):
+                return False
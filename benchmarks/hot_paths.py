@@ -0,0 +1,308 @@
+"""加载、检索与索引热路径的基准测试
+
+按给定规模生成合成向量库与合成图片目录，测量：
+
+- 向量库加载（ImageLibrary.load，即界面的 load_cache）耗时与 Python 堆峰值内存
+- 单条查询延迟分位数（SearchWorker 的打分 + 取第一页），以及批量检索吞吐
+- 只命中一个目录（1000 条）的元数据过滤检索延迟
+- 分块扫描时第一批中间结果的延迟（界面最早显示结果的时间）
+- 对本地模拟服务（tools.fake_server）的索引速度（Indexer，即 IndexWorker 的流程）
+
+结果写成 JSON，可与保存的基线对比，超出容差的退化以非零状态码退出：
+
+    python -m benchmarks.hot_paths --sizes 1000 10000 100000 -o bench.json
+    python -m benchmarks.hot_paths --baseline bench.json
+
+1M 规模的向量库约占 4GB 磁盘与 4GB 内存，需显式加入 --sizes 1000000。
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from api.embedding import EmbeddingAPI
+from benchmarks.ann_recall import make_corpus
+from config.settings import RESULTS_PAGE_SIZE
+from core.filters import compile_filter
+from core.indexer import Indexer
+from core.library import ImageLibrary
+from core.streaming import StreamingSearch
+from core.vector_math import normalize_rows
+from core.vector_store import VectorStore
+from tools.fake_server import DEFAULT_DIM, FakeEmbeddingServer, FakeServerConfig
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# 以这些后缀结尾的指标越大越好，其余（耗时、内存）越小越好
+HIGHER_IS_BETTER = ("_per_s", "_qps")
+
+
+def make_store(store_dir: Path, count: int, dim: int, seed: int = 0):
+    """生成合成向量库；目录中已有同规模的库时直接复用"""
+    store = VectorStore(str(store_dir))
+    if store.load() and len(store) == count and store.dim == dim:
+        return
+    store_dir.mkdir(parents=True, exist_ok=True)
+
+    # 先分块写入临时的 memmap，再由 VectorStore.save 写出正式文件
+    scratch = store_dir / "synthetic.npy"
+    vectors = np.lib.format.open_memmap(scratch, mode="w+", dtype=np.float32, shape=(count, dim))
+    make_corpus(count, dim, clusters=min(2000, max(1, count // 50)), seed=seed, out=vectors)
+
+    store.paths = [f"/synthetic/{i // 1000:04d}/{i:07d}.jpg" for i in range(count)]
+    store.columns = {
+        "hash": [f"{i:032x}" for i in range(count)],
+        "name": [f"{i:07d}.jpg" for i in range(count)],
+        "size": [200000 + i for i in range(count)],
+        "mtime": [1700000000000000000 + i for i in range(count)],
+        "inode": [1000000 + i for i in range(count)],
+    }
+    store.vectors = vectors
+    store._rebuild_rows()
+    store.save()
+    del vectors, store
+    scratch.unlink()
+
+
+def make_images(image_dir: Path, count: int, width: int, height: int):
+    """生成内容互不相同的合成 JPEG（避免被内容哈希去重）；已存在的文件直接复用"""
+    if Image is None:
+        raise SystemExit("生成合成图片需要安装 Pillow")
+    image_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        path = image_dir / f"{i:06d}.jpg"
+        if path.exists():
+            continue
+        pixels = np.random.default_rng(i).integers(0, 256, (24, 32, 3), dtype=np.uint8)
+        image = Image.fromarray(pixels).resize((width, height), Image.BILINEAR)
+        image.save(path, "JPEG", quality=90)
+
+
+def bench_load(store_dir: Path, repeat: int):
+    """返回 (指标, 加载好的 ImageLibrary)"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        library = ImageLibrary(str(store_dir))
+        library.load()
+        times.append(time.perf_counter() - start)
+        del library
+
+    # 单独跑一次统计内存，tracemalloc 本身会拖慢计时
+    gc.collect()
+    tracemalloc.start()
+    library = ImageLibrary(str(store_dir))
+    library.load()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "load_s": min(times),
+        "load_peak_mb": peak / 2 ** 20,
+        "resident_mb": current / 2 ** 20,
+    }, library
+
+
+def bench_search(library: ImageLibrary, queries: int, page_size: int, seed: int = 1):
+    engine = library.engine
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(engine), min(queries, len(engine)), replace=False)
+    query_vectors = engine.vectors(np.sort(rows))
+    query_vectors = normalize_rows(
+        query_vectors + rng.standard_normal(query_vectors.shape, dtype=np.float32) * 0.02
+    )
+
+    engine.rank(query_vectors[0]).fetch(0, page_size)  # 预热
+    latencies = []
+    for query in query_vectors:
+        start = time.perf_counter()
+        engine.rank(query).fetch(0, page_size)
+        latencies.append(time.perf_counter() - start)
+    ms = np.asarray(latencies) * 1000
+
+    # 合成路径每 1000 条一个目录，过滤后只对一个目录打分
+    where = compile_filter("dir:/synthetic/0000")
+    filtered = []
+    for query in query_vectors:
+        start = time.perf_counter()
+        engine.rank(query, where=where).fetch(0, page_size)
+        filtered.append(time.perf_counter() - start)
+    filtered_ms = np.asarray(filtered) * 1000
+
+    # 分块扫描：第一块打分并归并后即报告中间结果
+    first_partial = []
+    for query in query_vectors:
+        start = time.perf_counter()
+        reported = []
+        StreamingSearch([engine], query, k=page_size, interval=0,
+                        on_partial=lambda items, fraction: reported.append(time.perf_counter())).run()
+        first_partial.append((reported[0] if reported else time.perf_counter()) - start)
+    first_partial_ms = np.asarray(first_partial) * 1000
+
+    start = time.perf_counter()
+    engine.search_batch(query_vectors, page_size)
+    batch_s = time.perf_counter() - start
+    return {
+        "search_p50_ms": float(np.percentile(ms, 50)),
+        "search_p90_ms": float(np.percentile(ms, 90)),
+        "search_p99_ms": float(np.percentile(ms, 99)),
+        "search_mean_ms": float(ms.mean()),
+        "filtered_search_p50_ms": float(np.percentile(filtered_ms, 50)),
+        "first_partial_p50_ms": float(np.percentile(first_partial_ms, 50)),
+        "batch_search_qps": len(query_vectors) / batch_s,
+    }
+
+
+def bench_index(workdir: Path, args):
+    """对本地模拟服务完整索引一遍合成图片目录，再测无变化时的重新扫描"""
+    image_dir = workdir / f"images_{args.images}_{args.image_width}x{args.image_height}"
+    make_images(image_dir, args.images, args.image_width, args.image_height)
+
+    with tempfile.TemporaryDirectory(dir=workdir) as store_dir:
+        config = FakeServerConfig(dim=args.dim, latency=args.latency, seed=0)
+        with FakeEmbeddingServer(config) as server:
+            api = EmbeddingAPI("benchmark", api_url=server.url)
+            library = ImageLibrary(store_dir)
+            library.load()
+            try:
+                start = time.perf_counter()
+                library.commit(*Indexer(api, [str(image_dir)], library.store, library.journal).run())
+                index_s = time.perf_counter() - start
+                requests = server.snapshot_stats()["requests"]
+
+                start = time.perf_counter()
+                library.commit(*Indexer(api, [str(image_dir)], library.store, library.journal).run())
+                rescan_s = time.perf_counter() - start
+            finally:
+                api.close()
+        indexed = len(library.store)
+        del library  # 释放向量文件的映射，临时目录才能删除
+
+    if indexed != args.images:
+        print(f"警告：只索引了 {indexed}/{args.images} 张图片", file=sys.stderr)
+    return {
+        "index_s": index_s,
+        "index_images_per_s": args.images / index_s,
+        "index_requests": requests,
+        "rescan_s": rescan_s,
+        "rescan_images_per_s": args.images / rescan_s,
+    }
+
+
+def flatten(results: dict) -> dict:
+    return {
+        f"{section}.{name}": value
+        for section, metrics in results.items()
+        for name, value in metrics.items()
+        if isinstance(value, (int, float))
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """打印与基线的对比，返回超出容差的退化指标"""
+    current, baseline = flatten(current), flatten(baseline)
+    regressions = []
+    print(f"\n{'metric':<40}{'baseline':>12}{'current':>12}{'change':>10}")
+    for key in sorted(current.keys() & baseline.keys()):
+        old, new = baseline[key], current[key]
+        if not old:
+            continue
+        change = (new - old) / old
+        worse = -change if key.endswith(HIGHER_IS_BETTER) else change
+        flag = ""
+        if worse > tolerance and not key.endswith("_requests"):
+            flag = "  <-- 退化"
+            regressions.append(key)
+        print(f"{key:<40}{old:>12.4g}{new:>12.4g}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3, help="加载耗时取多次中的最小值")
+    parser.add_argument("--images", type=int, default=200, help="索引测试的图片数，0 表示跳过")
+    parser.add_argument("--image-width", type=int, default=1024)
+    parser.add_argument("--image-height", type=int, default=768)
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务每个请求的延迟（秒）")
+    parser.add_argument("--workdir", help="合成数据目录，指定后可在多次运行间复用（默认使用临时目录）")
+    parser.add_argument("-o", "--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="与之对比的历史结果文件")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="允许的退化比例")
+    args = parser.parse_args()
+
+    temp = None
+    if args.workdir:
+        workdir = Path(args.workdir)
+        workdir.mkdir(parents=True, exist_ok=True)
+    else:
+        temp = tempfile.TemporaryDirectory()
+        workdir = Path(temp.name)
+
+    results = {}
+    try:
+        for count in args.sizes:
+            store_dir = workdir / f"store_{count}_{args.dim}"
+            make_store(store_dir, count, args.dim)
+            metrics, library = bench_load(store_dir, args.repeat)
+            metrics.update(bench_search(library, args.queries, RESULTS_PAGE_SIZE))
+            results[f"n={count}"] = metrics
+            del library
+            print(f"n={count:<9} load {metrics['load_s'] * 1000:9.1f} ms  "
+                  f"peak {metrics['load_peak_mb']:8.1f} MB  "
+                  f"p50 {metrics['search_p50_ms']:7.2f} ms  p99 {metrics['search_p99_ms']:7.2f} ms  "
+                  f"filtered p50 {metrics['filtered_search_p50_ms']:6.2f} ms  "
+                  f"first partial p50 {metrics['first_partial_p50_ms']:6.2f} ms  "
+                  f"batch {metrics['batch_search_qps']:9.0f} q/s")
+
+        if args.images:
+            metrics = bench_index(workdir, args)
+            results["index"] = metrics
+            print(f"index      {metrics['index_images_per_s']:.1f} images/s "
+                  f"({metrics['index_requests']} requests), "
+                  f"rescan {metrics['rescan_images_per_s']:.0f} images/s")
+    finally:
+        if temp is not None:
+            temp.cleanup()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "dim": args.dim,
+            "latency": args.latency,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.tolerance)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.output}")
+
+    if regressions:
+        print(f"{len(regressions)} 项指标超出 {args.tolerance:.0%} 容差", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
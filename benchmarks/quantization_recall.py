@@ -0,0 +1,69 @@
+"""量化向量（float16 / int8）的召回率、延迟与内存报告
+
+在带簇结构的合成向量上对比各量化格式与 float32 精确检索的 top-k 结果，
+rerank 为 0 表示只用编码打分、不做精确重排：
+
+    python -m benchmarks.quantization_recall --count 200000 --dim 1024
+"""
+import argparse
+import numpy as np
+
+from benchmarks.ann_recall import make_corpus, measure
+from core.search_engine import SearchEngine
+from core.vector_math import normalize_rows
+from core.vector_store import VectorStore
+
+
+def make_store(vectors: np.ndarray) -> VectorStore:
+    """构造只在内存中的向量库（不写磁盘）"""
+    store = VectorStore("quantization_recall")
+    store.paths = [str(i) for i in range(len(vectors))]
+    store.columns = {name: [None] * len(vectors) for name in VectorStore.COLUMNS}
+    store.vectors = vectors
+    store._rebuild_rows()
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", default=["float16", "int8"])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 50, 200])
+    args = parser.parse_args()
+
+    vectors = make_corpus(args.count, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(args.count, args.queries, replace=False)]
+    queries = normalize_rows(queries + rng.standard_normal(queries.shape, dtype=np.float32) * 0.02)
+    store = make_store(vectors)
+
+    engine = SearchEngine("none")
+    engine.load(store)
+    exact, exact_ms = measure(engine, queries, args.k)
+    exact_mb = engine.nbytes / 2 ** 20
+    del engine
+
+    print(f"N={args.count} D={args.dim} k={args.k} queries={args.queries}")
+    print(f"{'mode':<20}{'recall@k':>10}{'ms/query':>10}{'memory MB':>11}{'ratio':>7}")
+    print(f"{'float32':<20}{1.0:>10.3f}{exact_ms:>10.2f}{exact_mb:>11.1f}{1.0:>7.1f}")
+    for mode in args.modes:
+        engine = SearchEngine(mode)
+        engine.load(store)
+        memory_mb = engine.nbytes / 2 ** 20
+        for rerank in args.rerank:
+            engine.rerank = rerank
+            approx, approx_ms = measure(engine, queries, args.k)
+            recall = np.mean([
+                len(set(a) & set(e)) / len(e) for a, e in zip(approx, exact)
+            ])
+            print(f"{mode + ' rerank=' + str(rerank):<20}{recall:>10.3f}{approx_ms:>10.2f}"
+                  f"{memory_mb:>11.1f}{exact_mb / memory_mb:>7.1f}")
+        del engine
+
+
+if __name__ == "__main__":
+    main()
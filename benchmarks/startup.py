@@ -0,0 +1,107 @@
+"""启动耗时的分阶段测量：首次绘制不应随图库规模增长
+
+对每个规模的合成向量库在子进程中启动主窗口（无界面的 offscreen 平台），
+记录 core.metrics.startup 的各阶段时间点，索引加载完成后退出：
+
+    python -m benchmarks.startup --sizes 0 10000 100000 --repeat 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.hot_paths import make_store
+from core.metrics import StartupTimeline
+from tools.fake_server import DEFAULT_DIM
+
+# 子进程：与 main.py 相同的启动流程，只是改用合成向量库，并在就绪后退出
+CHILD = """
+import time
+STARTED = time.perf_counter()
+import sys, json
+import config.settings as settings
+settings.STORE_DIR, settings.IMAGE_DIRS = sys.argv[1], [sys.argv[2]]
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QApplication
+from core.metrics import startup
+from ui.main_window import MainWindow
+
+startup.start(STARTED)
+startup.mark("imports")
+app = QApplication(sys.argv[:1])
+window = MainWindow()
+startup.mark("window")
+window.show()
+
+def poll():
+    if "ready" in startup.marks:
+        print(json.dumps(startup.marks))
+        app.quit()
+
+timer = QTimer()
+timer.timeout.connect(poll)
+timer.start(5)
+app.exec()
+"""
+
+
+def run_once(store_dir: Path, workdir: Path) -> dict:
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(Path(__file__).resolve().parents[1]),
+                                                      env.get("PYTHONPATH")]))
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, str(store_dir), str(workdir / "images")],
+        cwd=workdir, env=env, capture_output=True, text=True, timeout=600, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--repeat", type=int, default=3, help="每个规模取多次中各阶段的最小值")
+    parser.add_argument("--workdir", help="合成数据目录，指定后可在多次运行间复用（默认使用临时目录）")
+    parser.add_argument("-o", "--output", help="把结果写成 JSON")
+    args = parser.parse_args()
+
+    temp = None
+    if args.workdir:
+        workdir = Path(args.workdir)
+        workdir.mkdir(parents=True, exist_ok=True)
+    else:
+        temp = tempfile.TemporaryDirectory()
+        workdir = Path(temp.name)
+
+    stages = list(StartupTimeline.STAGES)
+    print(f"{'size':>10}" + "".join(f"{stage:>18}" for stage in stages) + "   (ms)")
+    results = {}
+    try:
+        for count in args.sizes:
+            store_dir = workdir / f"store_{count}_{args.dim}"
+            if count:
+                make_store(store_dir, count, args.dim)
+            runs = [run_once(store_dir, workdir) for _ in range(args.repeat)]
+            marks = {
+                stage: min(run[stage] for run in runs) * 1000
+                for stage in stages if all(stage in run for run in runs)
+            }
+            results[f"n={count}"] = marks
+            print(f"{count:>10}" + "".join(
+                f"{marks[stage]:>18.1f}" if stage in marks else f"{'-':>18}" for stage in stages
+            ))
+    finally:
+        if temp is not None:
+            temp.cleanup()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"dim": args.dim, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""图片语义检索的命令行入口（不依赖 Qt，可在无界面的服务器上批量运行）
+
+    python cli.py index [--dir D ...]
+    python cli.py search "海边的日落" -k 10
+    python cli.py search --image photo.jpg -k 10
+    python cli.py search "海边的日落" --filter "dir:旅行 ext:jpg mtime>=2024-01-01"
+    python cli.py batch-search queries.txt -k 10 -o results.jsonl
+    python cli.py shards
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from api.embedding import EmbeddingAPI
+from api.query_cache import QueryEmbeddingCache
+from api.rate_limiter import TokenBucket
+from config.settings import (
+    API_KEY, IMAGE_DIRS, STORE_DIR,
+    ANN_ENABLED, ANN_MIN_VECTORS, ANN_NPROBE,
+    INDEX_CONCURRENCY, API_QPS,
+    QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_FILE,
+)
+from core.filters import compile_filter
+from core.indexer import Indexer
+from core.library import ImageLibrary
+from core.shards import ShardedLibrary
+from core.vector_store import VectorStore
+
+
+def log(message: str, end: str = "\n"):
+    """进度与错误写到 stderr，stdout 只输出结果"""
+    print(message, end=end, file=sys.stderr, flush=True)
+
+
+def make_api(query_cache: QueryEmbeddingCache = None) -> EmbeddingAPI:
+    return EmbeddingAPI(API_KEY, TokenBucket(API_QPS), query_cache=query_cache)
+
+
+def open_library(args) -> ShardedLibrary:
+    """加载图片库（分片模式下 --shard 只加载指定的分片），规模足够大且近似索引与向量库一致时一并挂载"""
+    library = ShardedLibrary(IMAGE_DIRS, args.store)
+    shards = library.shards
+    if args.shard:
+        shards = [
+            shard for shard in library.shards
+            if shard.name in args.shard or any(shard.has_root(s) for s in args.shard)
+        ]
+        if not shards:
+            log("没有匹配的分片，可用 shards 命令查看")
+    library.load(shards)
+    for shard in library.loaded_shards():
+        if ANN_ENABLED and len(shard) >= ANN_MIN_VECTORS:
+            shard.library.load_ann(ANN_NPROBE)
+    return library
+
+
+def cmd_index(args) -> int:
+    """扫描图片目录并建立/更新索引（分片模式下只重建 --dir 指定目录的分片）"""
+    if not API_KEY:
+        log("未配置 API Key，请在 config/settings.py 中填写 API_KEY")
+        return 2
+    dirs = args.dir or IMAGE_DIRS
+    missing = [d for d in dirs if not os.path.exists(d)]
+    if missing:
+        log("图片目录不存在：" + ", ".join(missing))
+        return 2
+
+    library = ShardedLibrary(dirs, args.store)
+    shards = library.shards_for(dirs)
+    library.load(shards)
+    api = make_api()
+    code = 0
+    try:
+        for shard in shards:
+            if library.sharded:
+                log(f"分片 {shard.name}: {', '.join(shard.roots)}")
+            code = max(code, index_library(shard.library, shard.roots, api, args))
+            if code == 130:
+                break
+    finally:
+        api.close()
+    return code
+
+
+def index_library(library: ImageLibrary, dirs: list, api: EmbeddingAPI, args) -> int:
+    """索引一个图片库；Ctrl-C 取消时已写入索引日志的结果会保留"""
+    def on_progress(done: int, total: int, name: str):
+        log(f"\r正在索引 ({done}/{total}) {name[:40]:<40}", end="")
+
+    def on_checkpoint(updates: dict, journal_seq: int):
+        library.commit(updates, [], journal_seq, save=False)
+        if library.compaction_due:
+            library.flush()
+
+    indexer = Indexer(api, dirs, library.store, library.journal, args.concurrency,
+                      on_progress=on_progress, on_checkpoint=on_checkpoint)
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = indexer.run()
+        except Exception as e:
+            outcome["error"] = e
+
+    # 索引在后台线程中运行，主线程负责响应 Ctrl-C
+    thread = threading.Thread(target=run, daemon=True)
+    started = time.perf_counter()
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(0.2)
+    except KeyboardInterrupt:
+        log("\n正在取消...")
+        indexer.cancel()
+        thread.join()
+    log("")
+
+    if "error" in outcome:
+        library.replay_journal()
+        log(f"索引出错: {outcome['error']}")
+        return 1
+    updates, removed, journal_seq = outcome["result"]
+    library.commit(updates, removed, journal_seq)
+    elapsed = time.perf_counter() - started
+    state = "已取消" if indexer.cancelled else "索引完成"
+    log(f"{state}：共 {len(library.store)} 张图片，删除 {len(removed)} 条，耗时 {elapsed:.1f} 秒")
+    return 130 if indexer.cancelled else 0
+
+
+def cmd_search(args) -> int:
+    """检索单条查询（--image 时以图搜图，库中已有的图片不调用 API）"""
+    try:
+        where = compile_filter(args.filter)
+    except ValueError as e:
+        log(str(e))
+        return 2
+    library = open_library(args)
+    if not len(library):
+        log("向量库为空，请先运行 index")
+        return 2
+
+    embedding = None
+    if args.image:
+        embedding = library.vector_of(args.query)
+        if embedding is None:
+            embedding = library.vector_of(os.path.abspath(args.query))
+    if embedding is None:
+        if not API_KEY:
+            log("未配置 API Key，请在 config/settings.py 中填写 API_KEY")
+            return 2
+        query_cache = QueryEmbeddingCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_FILE)
+        query_cache.load()
+        api = make_api(query_cache)
+        try:
+            if args.image:
+                embedding = api.get_image_query_embedding(args.query)
+            else:
+                result = api.get_text_embeddings([args.query])[0]
+                if not result.ok:
+                    log(f"无法获取文本向量: {result.error}")
+                embedding = result.embedding
+        finally:
+            api.close()
+            query_cache.save()
+        if embedding is None:
+            if args.image:
+                log("无法获取图片向量")
+            return 1
+
+    results = library.search(embedding, args.k, where)
+    if args.json:
+        print(json.dumps({"query": args.query, "results": results}, ensure_ascii=False))
+    else:
+        for rank, item in enumerate(results, 1):
+            print(f"{rank:>4}  {item['score']:.4f}  {item['path']}")
+    return 0
+
+
+def read_queries(source):
+    """逐行读取查询，忽略空行"""
+    for line in source:
+        query = line.strip()
+        if query:
+            yield query
+
+
+def embed_queries(api: EmbeddingAPI, pool: ThreadPoolExecutor, queries: list) -> list:
+    """按 API 批大小拆分后并发请求，结果与输入一一对应"""
+    size = api.batch_size
+    batches = [queries[i:i + size] for i in range(0, len(queries), size)]
+    results = []
+    for batch_results in pool.map(api.get_text_embeddings, batches):
+        results.extend(batch_results)
+    return results
+
+
+def cmd_batch_search(args) -> int:
+    """批量检索：每块查询并发获取向量，再用一次矩阵-矩阵乘法打分，结果按行输出 JSONL"""
+    try:
+        where = compile_filter(args.filter)
+    except ValueError as e:
+        log(str(e))
+        return 2
+    library = open_library(args)
+    if not len(library):
+        log("向量库为空，请先运行 index")
+        return 2
+    if not API_KEY:
+        log("未配置 API Key，请在 config/settings.py 中填写 API_KEY")
+        return 2
+
+    source = sys.stdin if args.queries == "-" else open(args.queries, encoding="utf-8")
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    query_cache = QueryEmbeddingCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_FILE)
+    query_cache.load()
+    api = make_api(query_cache)
+    pool = ThreadPoolExecutor(max_workers=args.concurrency)
+
+    done = failed = 0
+    started = time.perf_counter()
+    try:
+        queries = read_queries(source)
+        while True:
+            block = list(islice(queries, args.block_size))
+            if not block:
+                break
+
+            embeddings = embed_queries(api, pool, block)
+            ok = [i for i, result in enumerate(embeddings) if result.ok]
+            ranked = {}
+            if ok:
+                matrix = np.asarray([embeddings[i].embedding for i in ok], dtype=np.float32)
+                ranked = dict(zip(ok, library.search_batch(matrix, args.k, where)))
+
+            # 按输入顺序逐块写出，下游可以边读边处理
+            for i, query in enumerate(block):
+                if i in ranked:
+                    record = {"query": query, "results": ranked[i]}
+                else:
+                    record = {"query": query, "error": str(embeddings[i].error)}
+                    failed += 1
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            done += len(block)
+            log(f"\r已完成 {done} 条查询", end="")
+    except KeyboardInterrupt:
+        log("\n已取消")
+        return 130
+    finally:
+        pool.shutdown()
+        api.close()
+        query_cache.save()
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    log(f"\r已完成 {done} 条查询（失败 {failed} 条），耗时 {elapsed:.1f} 秒")
+    return 1 if failed else 0
+
+
+def cmd_shards(args) -> int:
+    """列出分片及其条目数"""
+    library = ShardedLibrary(IMAGE_DIRS, args.store)
+    for shard in library.shards:
+        store = VectorStore(shard.store_dir)
+        try:
+            count = len(store) if store.load() else 0
+        except Exception as e:
+            log(f"读取分片 {shard.name or shard.store_dir} 失败: {e}")
+            count = 0
+        print(f"{shard.name or '-':<32}{count:>10}  {', '.join(shard.roots)}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", default=STORE_DIR, help="向量库目录")
+    parser.add_argument("--shard", action="append",
+                        help="分片模式下只加载指定的分片（名称或根目录），可重复指定")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index = commands.add_parser("index", help="扫描图片目录并建立/更新索引")
+    index.add_argument("--dir", action="append", help="图片根目录，可重复指定（默认使用配置中的目录）")
+    index.add_argument("--concurrency", type=int, default=INDEX_CONCURRENCY)
+    index.set_defaults(handler=cmd_index)
+
+    search = commands.add_parser("search", help="检索单条查询")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=10)
+    search.add_argument("--image", action="store_true", help="QUERY 是图片路径，检索相似图片")
+    search.add_argument("--json", action="store_true", help="以 JSON 输出")
+    search.add_argument("--filter", default="", help="元数据过滤条件，如 \"dir:旅行 ext:jpg size>1mb\"")
+    search.set_defaults(handler=cmd_search)
+
+    batch = commands.add_parser("batch-search", help="从文件读取查询（每行一条）批量检索，输出 JSONL")
+    batch.add_argument("queries", help="查询文件，- 表示标准输入")
+    batch.add_argument("-k", type=int, default=10)
+    batch.add_argument("-o", "--output", default="-", help="输出文件，- 表示标准输出")
+    batch.add_argument("--block-size", type=int, default=256, help="每次一起打分并输出的查询数")
+    batch.add_argument("--concurrency", type=int, default=INDEX_CONCURRENCY)
+    batch.add_argument("--filter", default="", help="元数据过滤条件，对全部查询生效")
+    batch.set_defaults(handler=cmd_batch_search)
+
+    shards = commands.add_parser("shards", help="列出分片（SHARDED 为 True 时每个图片根目录一个分片）")
+    shards.set_defaults(handler=cmd_shards)
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
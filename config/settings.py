@@ -1,6 +1,61 @@
-API_KEY = ""  
+import os
+
+API_KEY = os.environ.get("DASHSCOPE_API_KEY", "")  # 也可通过环境变量 DASHSCOPE_API_KEY 提供
 IMAGE_DIR = r"E:\experiment\image"
-CACHE_FILE = "embeddings_cache.json"
-API_URL = "https://dashscope.aliyuncs.com/api/v1/services/embeddings/multimodal-embedding/multimodal-embedding"
+IMAGE_DIRS = [IMAGE_DIR]  # 需要索引的图片根目录，可添加多个
+CACHE_FILE = "embeddings_cache.json"  # 旧版 JSON 缓存，仅用于一次性迁移
+STORE_DIR = "embeddings_store"  # 二进制向量库目录
+API_URL = os.environ.get(
+    "EMBEDDING_API_URL",
+    "https://dashscope.aliyuncs.com/api/v1/services/embeddings/multimodal-embedding/multimodal-embedding"
+)  # 设置 EMBEDDING_API_URL 可切换到本地测试服务（python -m tools.fake_server）
 MODEL_NAME = "multimodal-embedding-v1"
 SUPPORTED_FORMATS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
+RESULTS_PAGE_SIZE = 50  # 结果列表每次加载的条数，滚动到底部时继续加载
+ANN_ENABLED = False  # 超大图库启用 IVF 近似检索
+ANN_MIN_VECTORS = 200000  # 向量数低于该值时仍使用精确检索
+ANN_NLIST = 0  # 聚类中心数，0 表示按 sqrt(N) 自动选择
+ANN_NPROBE = 16  # 每次查询扫描的簇数，越大召回越高、越慢
+INDEX_CONCURRENCY = 4  # 索引时同时进行的 embedding 请求数
+API_QPS = 5.0  # 按账号的 QPS 配额填写，0 表示不限流
+EMBED_BATCH_SIZE = 8  # 单次请求最多打包的输入数（不能超过 API 的上限）
+EMBED_BATCH_MAX_BYTES = 8 * 1024 * 1024  # 单次请求体的大小上限
+API_MAX_RETRIES = 4  # 429/5xx/超时的最大重试次数
+API_BACKOFF_BASE = 0.5  # 指数退避的初始间隔（秒）
+API_BACKOFF_MAX = 30.0  # 单次退避的最长间隔（秒）
+INDEX_REQUEUE_ROUNDS = 2  # 索引结束前对可重试失败项的重新排队轮数
+JOURNAL_CHECKPOINT_ENTRIES = 2000  # 索引过程中每累计多少条新向量合并一次到内存中的向量库
+JOURNAL_COMPACT_RATIO = 0.25  # 未写回的变化超过向量库条目数的该比例（且不少于上一项）时重写向量文件
+QUERY_CACHE_SIZE = 1000  # 查询向量缓存的最大条目数，0 表示不缓存
+QUERY_CACHE_TTL = 7 * 24 * 3600  # 查询向量缓存的有效期（秒），0 表示永不过期
+QUERY_CACHE_FILE = "query_cache.json"  # 查询向量缓存的持久化文件，留空则只保存在内存中
+HASH_ALGORITHM = "blake2b"  # 内容哈希算法：md5 / blake2b / xxh3（需安装 xxhash）
+SCAN_RECURSIVE = False  # 是否递归扫描子目录
+SCAN_INCLUDE = []  # 只索引匹配这些 glob 模式的文件（相对路径或文件名），为空表示全部
+SCAN_EXCLUDE = []  # 排除匹配这些 glob 模式的文件或目录
+SCAN_SYMLINKS = "files"  # 符号链接策略：skip / files（收录指向文件的链接，与旧版相同）/ follow
+WATCH_ENABLED = False  # 监视图片目录，文件变化后自动增量索引
+WATCH_DEBOUNCE_MS = 2000  # 合并文件变化事件的等待时间（毫秒）
+PREPROCESS_ENABLED = True  # 上传前缩小并重新编码图片（需安装 Pillow，否则原样上传）
+PREPROCESS_MAX_EDGE = 1024  # 上传图片的最长边（像素）
+PREPROCESS_QUALITY = 85  # 重新编码的 JPEG 质量
+PREPROCESS_WORKERS = 2  # 图片预处理的进程数，0 表示在请求线程内处理
+PREPROCESS_POOL_MIN_FILES = 32  # 增量索引的文件少于该数时不启动进程池，在请求线程内预处理
+THUMB_SIZE = 180  # 结果缩略图的边长（像素）
+THUMB_CACHE_DIR = "thumbnail_cache"  # 缩略图磁盘缓存目录
+THUMB_CACHE_MAX_BYTES = 200 * 1024 * 1024  # 缩略图磁盘缓存的容量上限
+THUMB_MEMORY_ITEMS = 500  # 内存中保留的缩略图数量
+STATS_REFRESH_MS = 1000  # 运行统计面板的刷新间隔（毫秒）
+PROFILE_MODE = os.environ.get("IMAGE_SEARCH_PROFILE", "")  # cpu / memory / all：为本次启动后的首次索引与搜索采集剖析
+PROFILE_DIR = "profiles"  # 性能剖析结果的输出目录
+QUANTIZATION = "none"  # 检索引擎内存中的向量格式：none / float16 / int8（int8 内存为 1/4，推荐大图库使用）
+RERANK_CANDIDATES = 200  # 量化时用原始 float32 向量精确重排的候选数
+SEARCH_AS_YOU_TYPE = True  # 输入时自动搜索（停止输入 SEARCH_DEBOUNCE_MS 毫秒后触发）
+SEARCH_DEBOUNCE_MS = 400  # 输入防抖的等待时间（毫秒）
+SEARCH_STREAMING = True  # 大图库分块扫描，边扫描边显示当前最好的结果
+SEARCH_STREAM_MIN_VECTORS = 200000  # 向量数低于该值时一次打分，不分块
+SEARCH_STREAM_CHUNK_ROWS = 32768  # 分块扫描时每块的行数
+SEARCH_PARTIAL_INTERVAL_MS = 50  # 刷新中间结果的最短间隔（毫秒）
+SEARCH_TIME_BUDGET_MS = 0  # 分块扫描的时间预算（毫秒），超时返回已扫描部分的结果；0 表示不限
+SHARDED = False  # 每个图片根目录单独建立分片（保存在 STORE_DIR 下的子目录），可单独重建、加载与卸载
+SHARD_SEARCH_WORKERS = 4  # 并行检索分片的线程数
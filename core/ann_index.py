@@ -0,0 +1,163 @@
+import os
+import numpy as np
+from pathlib import Path
+from typing import Optional
+
+from core.vector_math import normalize_rows, top_k_indices
+
+
+class IVFIndex:
+    """倒排文件（IVF）近似最近邻索引
+
+    用球面 k-means 把归一化向量划分为 nlist 个簇，查询时只扫描与查询
+    最接近的 nprobe 个簇。nprobe 越大召回越高、延迟也越高；nprobe 等于
+    nlist 时退化为精确检索。簇编号按检索引擎的行号保存，倒排表在索引
+    变化后的第一次查询时惰性重建。
+    """
+
+    FILE_NAME = "ann_ivf.npz"
+    ASSIGN_CHUNK_ROWS = 16384
+
+    def __init__(self, nlist: int, nprobe: int = 16):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self.trained_count = 0  # 训练时的向量数，用于判断是否需要重新训练
+        self.generation = -1  # 持久化时对应的向量库版本
+        self._labels = np.zeros(0, dtype=np.int32)
+        self._count = 0
+        self._order = None
+        self._offsets = None
+
+    @staticmethod
+    def auto_nlist(count: int) -> int:
+        """按 sqrt(N) 选择聚类中心数"""
+        return int(min(65536, max(16, round(np.sqrt(count)))))
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def labels(self) -> np.ndarray:
+        """按行号排列的簇编号"""
+        return self._labels[:self._count]
+
+    def train(self, vectors: np.ndarray, iterations: int = 10,
+              sample_per_list: int = 64, seed: int = 0):
+        """在采样向量上训练球面 k-means，vectors 可以是未归一化的 memmap"""
+        rows = self.sample_rows(len(vectors), sample_per_list, seed)
+        self.train_sample(vectors[rows], len(vectors), iterations, seed)
+
+    def sample_rows(self, count: int, sample_per_list: int = 64, seed: int = 0) -> np.ndarray:
+        """训练所用的采样行号（升序），调用方按行号读取后交给 train_sample"""
+        rng = np.random.default_rng(seed)
+        sample_size = min(count, self.nlist * sample_per_list)
+        return np.sort(rng.choice(count, sample_size, replace=False))
+
+    def train_sample(self, sample: np.ndarray, count: int, iterations: int = 10, seed: int = 0):
+        """在已读出的采样向量（可以未归一化）上训练，count 为向量总数"""
+        rng = np.random.default_rng(seed + 1)
+        sample = normalize_rows(sample)
+        sample_size = len(sample)
+
+        nlist = min(self.nlist, sample_size)
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)]
+        for _ in range(iterations):
+            labels = self._nearest(sample, centroids)
+            order = np.argsort(labels, kind='stable')
+            clusters, starts = np.unique(labels[order], return_index=True)
+            sums = np.zeros_like(centroids)
+            sums[clusters] = np.add.reduceat(sample[order], starts)
+            # 空簇用随机样本重新播种
+            empty = np.setdiff1d(np.arange(nlist), clusters)
+            if empty.size:
+                sums[empty] = sample[rng.choice(sample_size, empty.size)]
+            centroids = normalize_rows(sums)
+
+        self.nlist = nlist
+        self.centroids = centroids
+        self.trained_count = count
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """分块计算每个向量所属的簇"""
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), self.ASSIGN_CHUNK_ROWS):
+            block = normalize_rows(vectors[start:start + self.ASSIGN_CHUNK_ROWS])
+            labels[start:start + len(block)] = self._nearest(block, self.centroids)
+        return labels
+
+    def set_labels(self, labels: np.ndarray):
+        self._labels = np.array(labels, dtype=np.int32)
+        self._count = len(self._labels)
+        self._invalidate()
+
+    def add(self, row: int, vector: np.ndarray):
+        """插入或更新一行（vector 已归一化）"""
+        if row >= len(self._labels):
+            grown = np.empty(max(row + 1, len(self._labels) * 5 // 4, 1024), dtype=np.int32)
+            grown[:self._count] = self._labels[:self._count]
+            self._labels = grown
+        self._labels[row] = int(np.argmax(self.centroids @ vector))
+        self._count = max(self._count, row + 1)
+        self._invalidate()
+
+    def move(self, src: int, dst: int):
+        """把 src 行的簇编号移动到 dst 行（配合检索引擎的交换删除）"""
+        self._labels[dst] = self._labels[src]
+        self._invalidate()
+
+    def truncate(self, count: int):
+        self._count = count
+        self._invalidate()
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        """返回查询最近的 nprobe 个簇内的全部行号"""
+        if self._order is None:
+            labels = self.labels
+            self._order = np.argsort(labels, kind='stable')
+            self._offsets = np.searchsorted(labels[self._order], np.arange(self.nlist + 1))
+        probes = top_k_indices(self.centroids @ query, self.nprobe)
+        return np.concatenate(
+            [self._order[self._offsets[c]:self._offsets[c + 1]] for c in probes]
+        )
+
+    def save(self, store_dir: str, labels: np.ndarray, generation: int):
+        """保存到向量库目录，labels 按向量库的行顺序排列"""
+        target = Path(store_dir) / self.FILE_NAME
+        tmp = target.with_name(target.name + ".tmp")
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                labels=np.asarray(labels, dtype=np.int32),
+                generation=generation,
+                trained_count=self.trained_count,
+            )
+        os.replace(tmp, target)
+        self.generation = generation
+
+    @classmethod
+    def load(cls, store_dir: str, nprobe: int) -> Optional["IVFIndex"]:
+        """加载已保存的索引，labels 按保存时向量库的行顺序排列"""
+        path = Path(store_dir) / cls.FILE_NAME
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            index = cls(len(data["centroids"]), nprobe)
+            index.centroids = data["centroids"]
+            index.trained_count = int(data["trained_count"])
+            index.generation = int(data["generation"])
+            index.set_labels(data["labels"])
+        return index
+
+    def _nearest(self, vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), self.ASSIGN_CHUNK_ROWS):
+            block = vectors[start:start + self.ASSIGN_CHUNK_ROWS]
+            labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return labels
+
+    def _invalidate(self):
+        self._order = None
+        self._offsets = None
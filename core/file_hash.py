@@ -0,0 +1,52 @@
+import os
+import hashlib
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _new_hasher(algorithm: str):
+    if algorithm == "xxh3":
+        if xxhash is None:
+            raise ValueError("xxh3 需要安装 xxhash 包")
+        return xxhash.xxh3_128()
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=16)
+    if algorithm == "md5":
+        return hashlib.md5()
+    raise ValueError(f"不支持的哈希算法: {algorithm}")
+
+
+def file_hash(filepath: str, algorithm: str) -> str:
+    """计算文件内容哈希
+
+    md5 保持旧版缓存的纯十六进制格式，其它算法带 "算法:" 前缀，
+    以便与已保存的哈希按同一算法比较。
+    """
+    hasher = _new_hasher(algorithm)
+    with open(filepath, 'rb') as f:
+        buf = f.read(CHUNK_SIZE)
+        while len(buf) > 0:
+            hasher.update(buf)
+            buf = f.read(CHUNK_SIZE)
+    digest = hasher.hexdigest()
+    return digest if algorithm == "md5" else f"{algorithm}:{digest}"
+
+
+def hash_algorithm_of(value: str) -> str:
+    """返回已保存哈希所用的算法"""
+    return value.split(":", 1)[0] if ":" in value else "md5"
+
+
+def file_stat(filepath: str) -> dict:
+    """返回用于快速判断文件是否变化的 stat 信息"""
+    st = os.stat(filepath)
+    return {
+        "size": st.st_size,
+        "mtime": st.st_mtime_ns,
+        "inode": st.st_ino
+    }
@@ -0,0 +1,271 @@
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# 过滤条件：dir:/ext: 取值匹配，其余字段比较大小；前缀 - 表示取反
+TERM_PATTERN = re.compile(
+    r'(?<!\S)(-?)(?:(dir|ext):("[^"]*"|\S+)'
+    r'|(size|mtime|date|width|height)(>=|<=|>|<|=)(\S+))(?!\S)'
+)
+
+SIZE_UNITS = {"": 1, "b": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2,
+              "g": 1024 ** 3, "gb": 1024 ** 3}
+AGE_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400, "y": 365 * 86400}
+
+
+class MetadataColumns:
+    """检索引擎各行的元数据列，与向量矩阵的行一一对应
+
+    数值列（大小、修改时间、宽、高）保存为 numpy 数组，目录与扩展名按字典
+    编码为整数，过滤条件对整列做一次向量化比较即可得到布尔掩码；目录条件
+    只需在去重后的目录表上匹配字符串。未知的值（例如旧版向量库没有记录
+    图片尺寸）为 -1，任何比较都不匹配。
+
+    目录与扩展名的编码需要逐条处理路径，推迟到第一次按目录或扩展名过滤时
+    才构建，不增加加载耗时。paths 与检索引擎共用同一个列表。
+    """
+
+    NUMERIC = {"size": np.int64, "mtime": np.int64, "width": np.int32, "height": np.int32}
+
+    def __init__(self):
+        self.paths = []
+        self.values = {name: np.zeros(0, dtype=dtype) for name, dtype in self.NUMERIC.items()}
+        self.dir_codes = None  # 尚未构建时为 None
+        self.ext_codes = None
+        self.dirs = []  # 编码 -> 目录
+        self.exts = []  # 编码 -> 小写扩展名（含点）
+        self._dir_index = {}
+        self._ext_index = {}
+
+    def load(self, paths: List[str], columns: dict):
+        """按向量库的行顺序整体构建数值列"""
+        count = len(paths)
+        self.paths = paths
+        for name, dtype in self.NUMERIC.items():
+            values = columns.get(name) or [None] * count
+            try:
+                array = np.asarray(values, dtype=dtype)
+            except TypeError:  # 含有未知值
+                array = np.fromiter((-1 if v is None else v for v in values), dtype=dtype, count=count)
+            if name in ("width", "height"):
+                array[array <= 0] = -1
+            self.values[name] = array
+        self.dir_codes = self.ext_codes = None
+
+    def codes(self, count: int):
+        """返回前 count 行的 (目录编码, 扩展名编码)，第一次调用时构建"""
+        if self.dir_codes is None:
+            capacity = len(self.values["size"])
+            self.dirs, self._dir_index = [], {}
+            self.exts, self._ext_index = [], {}
+            self.dir_codes = np.empty(capacity, dtype=np.int32)
+            self.ext_codes = np.empty(capacity, dtype=np.int32)
+            for row, path in enumerate(self.paths[:count]):
+                self.dir_codes[row] = self._dir_code(path)
+                self.ext_codes[row] = self._ext_code(path)
+        return self.dir_codes[:count], self.ext_codes[:count]
+
+    def reserve(self, capacity: int, count: int):
+        """扩容到 capacity 行，保留前 count 行"""
+        if capacity <= len(self.values["size"]):
+            return
+        for name, values in self.values.items():
+            self.values[name] = self._grow(values, capacity, count)
+        if self.dir_codes is not None:
+            self.dir_codes = self._grow(self.dir_codes, capacity, count)
+            self.ext_codes = self._grow(self.ext_codes, capacity, count)
+
+    def set(self, row: int, path: str, data: dict):
+        for name, values in self.values.items():
+            values[row] = self._number(name, data.get(name))
+        if self.dir_codes is not None:
+            self.dir_codes[row] = self._dir_code(path)
+            self.ext_codes[row] = self._ext_code(path)
+
+    def move(self, source: int, target: int):
+        for values in self.values.values():
+            values[target] = values[source]
+        if self.dir_codes is not None:
+            self.dir_codes[target] = self.dir_codes[source]
+            self.ext_codes[target] = self.ext_codes[source]
+
+    @staticmethod
+    def _number(name: str, value) -> int:
+        if value is None or (name in ("width", "height") and value <= 0):
+            return -1
+        return value
+
+    @staticmethod
+    def _grow(values: np.ndarray, capacity: int, count: int) -> np.ndarray:
+        grown = np.empty(capacity, dtype=values.dtype)
+        grown[:count] = values[:count]
+        return grown
+
+    def _dir_code(self, path: str) -> int:
+        directory = os.path.dirname(path)
+        code = self._dir_index.get(directory)
+        if code is None:
+            code = self._dir_index[directory] = len(self.dirs)
+            self.dirs.append(directory)
+        return code
+
+    def _ext_code(self, path: str) -> int:
+        ext = os.path.splitext(path)[1].lower()
+        code = self._ext_index.get(ext)
+        if code is None:
+            code = self._ext_index[ext] = len(self.exts)
+            self.exts.append(ext)
+        return code
+
+
+class Filter:
+    """编译好的过滤条件（各项之间为“与”），对任意一组元数据列生成布尔掩码"""
+
+    def __init__(self, expression: str, terms: list):
+        self.expression = expression
+        self.terms = terms  # (是否取反, 掩码函数)
+
+    def __repr__(self) -> str:
+        return f"Filter({self.expression!r})"
+
+    def mask(self, columns: MetadataColumns, count: int) -> np.ndarray:
+        """返回前 count 行是否满足全部条件"""
+        mask = np.ones(count, dtype=bool)
+        for negate, term in self.terms:
+            matched = term(columns, count)
+            if negate:
+                mask &= ~matched
+            else:
+                mask &= matched
+        return mask
+
+
+def split_query(text: str) -> Tuple[str, str]:
+    """从搜索框文字中分离过滤条件，返回 (描述文字, 过滤表达式)"""
+    terms = [match.group(0) for match in TERM_PATTERN.finditer(text)]
+    query = " ".join(TERM_PATTERN.sub(" ", text).split())
+    return query, " ".join(terms)
+
+
+def compile_filter(expression: str) -> Optional[Filter]:
+    """把过滤表达式编译为 Filter，表达式为空时返回 None
+
+    语法（空格分隔，各项同时满足，前缀 - 表示排除）：
+
+    - dir:旅行/2023      目录：绝对路径按前缀匹配（含子目录），否则匹配路径中连续的目录名
+    - ext:jpg,png        扩展名
+    - size>1.5mb         文件大小，单位 b/kb/mb/gb（1024 进制）
+    - mtime>=2024-01-01  修改时间（date 为同义词）；也可写 7d、12h、2w 表示距今的时间点，
+                         例如 mtime>7d 为最近 7 天内修改
+    - width>=1920、height<1080  图片尺寸（像素）
+
+    比较符为 > >= < <= =；日期只写到天时按整天计算（= 表示当天）。
+    """
+    expression = expression.strip()
+    if not expression:
+        return None
+    terms, position = [], 0
+    for match in TERM_PATTERN.finditer(expression):
+        _check_gap(expression[position:match.start()])
+        position = match.end()
+        negate, field, value, compare_field, op, bound = match.groups()
+        if field == "dir":
+            term = _dir_term(value.strip('"'))
+        elif field == "ext":
+            term = _ext_term(value.strip('"'))
+        else:
+            term = _compare_term(compare_field, op, bound)
+        terms.append((bool(negate), term))
+    _check_gap(expression[position:])
+    return Filter(expression, terms)
+
+
+def _check_gap(text: str):
+    if text.strip():
+        raise ValueError(f"无法识别的过滤条件: {text.strip()}")
+
+
+def _dir_term(value: str):
+    if not value:
+        raise ValueError("dir: 需要目录")
+    target = os.path.normcase(os.path.normpath(value))
+    absolute = os.path.isabs(value)
+    wrapped = os.sep + target.strip(os.sep) + os.sep
+
+    def matches(directory: str) -> bool:
+        directory = os.path.normcase(os.path.normpath(directory))
+        if absolute:
+            return directory == target or directory.startswith(target.rstrip(os.sep) + os.sep)
+        return wrapped in os.sep + directory.strip(os.sep) + os.sep
+
+    def term(columns: MetadataColumns, count: int) -> np.ndarray:
+        dir_codes, _ = columns.codes(count)
+        codes = [code for code, directory in enumerate(columns.dirs) if matches(directory)]
+        return np.isin(dir_codes, codes)
+    return term
+
+
+def _ext_term(value: str):
+    wanted = {
+        "." + ext.lower().lstrip(".") for ext in value.split(",") if ext.strip(". ")
+    }
+    if not wanted:
+        raise ValueError("ext: 需要扩展名")
+
+    def term(columns: MetadataColumns, count: int) -> np.ndarray:
+        _, ext_codes = columns.codes(count)
+        codes = [code for code, ext in enumerate(columns.exts) if ext in wanted]
+        return np.isin(ext_codes, codes)
+    return term
+
+
+def _compare_term(field: str, op: str, value: str):
+    field = "mtime" if field == "date" else field
+    low, high = _parse_bound(field, value)
+
+    def term(columns: MetadataColumns, count: int) -> np.ndarray:
+        values = columns.values[field][:count]
+        if op == ">=":
+            matched = values >= low
+        elif op == ">":
+            matched = values >= high
+        elif op == "<":
+            matched = values < low
+        elif op == "<=":
+            matched = values < high
+        else:
+            matched = (values >= low) & (values < high)
+        return matched & (values >= 0)
+    return term
+
+
+def _parse_bound(field: str, value: str) -> Tuple[int, int]:
+    """取值解析为半开区间 [low, high)：整数为 [n, n + 1)，只写到天的日期为当天"""
+    value = value.lower()
+    try:
+        if field == "size":
+            number, unit = re.fullmatch(r"([\d.]+)([a-z]*)", value).groups()
+            low = int(float(number) * SIZE_UNITS[unit])
+            return low, low + 1
+        if field == "mtime":
+            return _parse_time(value)
+        low = int(value)
+        return low, low + 1
+    except (AttributeError, KeyError, ValueError):
+        raise ValueError(f"无法解析 {field} 的取值: {value}") from None
+
+
+def _parse_time(value: str) -> Tuple[int, int]:
+    age = re.fullmatch(r"(\d+(?:\.\d+)?)([mhdwy])", value)
+    if age:
+        low = int((time.time() - float(age.group(1)) * AGE_UNITS[age.group(2)]) * 1e9)
+        return low, low + 1
+    moment = datetime.fromisoformat(value)
+    low = int(moment.timestamp() * 1e9)
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+        return low, int((moment + timedelta(days=1)).timestamp() * 1e9)
+    return low, low + 1
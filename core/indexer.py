@@ -0,0 +1,420 @@
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import repeat
+from typing import Callable, List, Optional, Tuple
+import os
+import queue
+import threading
+import time
+
+from api.embedding import EmbeddingAPI
+from api import preprocess
+from api.errors import CancelledError, InputError
+from config.settings import (
+    SUPPORTED_FORMATS, INDEX_CONCURRENCY, INDEX_REQUEUE_ROUNDS, JOURNAL_CHECKPOINT_ENTRIES,
+    HASH_ALGORITHM,
+    SCAN_RECURSIVE, SCAN_INCLUDE, SCAN_EXCLUDE, SCAN_SYMLINKS,
+    PREPROCESS_ENABLED, PREPROCESS_MAX_EDGE, PREPROCESS_QUALITY, PREPROCESS_WORKERS,
+    PREPROCESS_POOL_MIN_FILES,
+)
+from core.file_hash import file_hash, file_stat, hash_algorithm_of
+from core.journal import IndexJournal
+from core.metrics import metrics, RunProfiler
+from core.scanner import scan_images
+from core.vector_store import VectorStore
+
+
+class Indexer:
+    """图片索引流程（不依赖 Qt，图形界面与命令行共用）
+
+    文件分组在线程池中完成 stat 与哈希比对；需要更新的文件另行排队，
+    凑满 API 的批大小才发送一次批量请求（扫描结束时发送剩余部分），
+    变化稀疏的增量索引也不会退化为逐张请求。请求速率由 API 的令牌桶
+    限制。结果按文件顺序收集，进度保持单调递增。可重试的失败项（429、5xx、超时）在
+    主循环结束后重新排队，而不是直接丢弃。各阶段（stat、哈希、编码、请求、
+    写日志）的耗时与文件去向记录在 core.metrics.metrics 中。
+
+    size/mtime/inode 均未变化的文件直接跳过，不读取内容；只有 stat 变化
+    时才计算内容哈希，同时从文件头读取图片尺寸（供元数据过滤）。内容与已有条目相同的文件复用其向量，不再请求 API。
+    已有条目的哈希用其它算法保存时（例如旧版的 md5），只在文件大小相同时
+    用该算法再计算一次候选文件的哈希比较。
+
+    目录由后台线程单遍流式扫描，发现第一个文件即开始处理；扫描期间
+    进度的 total 为已发现的文件数。图片的缩小与重新编码在独立的
+    进程池中并行执行；给定的文件少于 PREPROCESS_POOL_MIN_FILES 个时
+    不启动进程池，在请求线程内进行。
+
+    传入 files 时不扫描目录，只处理给定的文件（监视模式的增量索引），
+    moved 中已带向量的条目与 removed 中的路径直接写入日志与结果。
+
+    每批结果一到达就追加写入索引日志；累计 JOURNAL_CHECKPOINT_ENTRIES 条后
+    封存当前日志段并调用 on_checkpoint(条目, 日志序号)，由调用方合并进向量库。
+    索引只读取构造时的向量库快照，合并不影响正在进行的比对。
+    """
+
+    def __init__(self, api: EmbeddingAPI, image_dirs: List[str], store: VectorStore,
+                 journal: IndexJournal, concurrency: int = INDEX_CONCURRENCY,
+                 files: List[str] = None, moved: dict = None, removed: List[str] = None,
+                 on_progress: Optional[Callable[[int, int, str], None]] = None,
+                 on_checkpoint: Optional[Callable[[dict, int], None]] = None):
+        self.api = api
+        self.image_dirs = image_dirs
+        self.store = store.snapshot()
+        self.journal = journal
+        self.files = files
+        self.moved = moved or {}
+        self.removed = removed or []
+        self.concurrency = max(1, concurrency)
+        self.on_progress = on_progress
+        self.on_checkpoint = on_checkpoint
+        self._is_cancelled = False
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._known_hashes = {}  # 内容哈希 -> 向量库中具有该内容的路径
+        self._legacy_sizes = {}  # 文件大小 -> 该大小的条目保存哈希所用的其它算法
+        self._claimed = {}  # 本次运行中已安排请求的内容哈希 -> 路径
+        self._aliases = []  # 与本次请求中的文件内容相同的 (路径, 来源路径, 条目)
+        self._seen = set()  # 扫描到的全部路径
+        self._scan_done = False
+        self._scan_error = None
+        self._pending = {}  # 已写入日志、尚未合并进向量库的条目
+        self._done = 0  # 已有结果（跳过、复用或请求完成）的文件数
+        self._started = 0.0
+        self._preprocess_pool = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._is_cancelled
+
+    def cancel(self):
+        self._is_cancelled = True
+        self._cancel_event.set()
+
+    def run(self) -> Tuple[dict, list, int]:
+        """执行索引，返回 (尚未合并的条目, 已删除的路径, 已封存的日志序号)"""
+        profiler = RunProfiler.start("index")
+        started = self._started = time.perf_counter()
+        metrics.inc("index_runs_total")
+        if self._use_preprocess_pool():
+            self._preprocess_pool = ProcessPoolExecutor(max_workers=PREPROCESS_WORKERS)
+        try:
+            found = queue.Queue()
+            scanner = threading.Thread(target=self._scan, args=(found,), daemon=True)
+            scanner.start()
+
+            self._known_hashes = {
+                value: path
+                for path, value in zip(self.store.paths, self.store.columns["hash"])
+                if value
+            }
+            self._legacy_sizes = {}
+            for value, size in zip(self.store.columns["hash"], self.store.columns["size"]):
+                if value and size is not None and hash_algorithm_of(value) != HASH_ALGORITHM:
+                    self._legacy_sizes.setdefault(size, set()).add(hash_algorithm_of(value))
+            self.journal.begin(self.store.journal_seq)
+            self._pending = {}
+            self.journal.append({}, self.removed)
+            self._record(self.moved)
+            retry = []
+            batch_size = self.api.batch_size
+            chunks = self._chunks(found, batch_size)
+
+            # 比对与请求各用一个线程池：请求等待网络时，后面的文件仍在比对
+            with ThreadPoolExecutor(max_workers=self.concurrency) as check_pool, \
+                    ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                self._done = 0
+                checked = self._map_ordered(check_pool, profiler.wrap(self._check_chunk), chunks)
+                batches = self._batches(checked, batch_size)
+                embed_files = profiler.wrap(self._embed_files)
+                for batch, (entries, failed) in self._map_ordered(pool, embed_files, batches):
+                    self._record(entries)
+                    retry.extend(failed)
+                    self._advance(len(batch), batch[-1][0].name)
+
+                for _ in range(INDEX_REQUEUE_ROUNDS):
+                    if not retry or self._is_cancelled:
+                        break
+                    metrics.inc("index_requeued_total", len(retry))
+                    retry_chunks = [
+                        retry[i:i + batch_size] for i in range(0, len(retry), batch_size)
+                    ]
+                    retry = []
+                    for _, (entries, failed) in self._map_ordered(pool, embed_files, retry_chunks):
+                        self._record(entries)
+                        retry.extend(failed)
+
+            if retry:
+                metrics.inc("index_files_total", len(retry), result="failed")
+                print(f"{len(retry)} 张图片多次重试后仍然失败，将在下次索引时重试")
+
+            scanner.join()
+            if self._scan_error is not None:
+                raise self._scan_error
+            if self.files is None and not self._seen and not self._is_cancelled:
+                raise FileNotFoundError("未找到任何图片文件")
+
+            # 内容重复的文件复用同一次请求的结果；来源已在之前合并的少数情况重新请求
+            orphans = [
+                (Path(img_str), entry)
+                for img_str, owner, entry in self._aliases
+                if owner not in self._pending and not self._is_cancelled
+            ]
+            self._record(self._resolve_aliases(self._pending))
+            if orphans:
+                self._record(self._embed_files(orphans)[0])
+
+            # 清理已删除的文件（取消时扫描不完整，不做清理）
+            removed = self.removed
+            if self.files is None and not self._is_cancelled and self._scan_done:
+                removed = [
+                    path for path in self.store.paths
+                    if path not in self._seen and not os.path.exists(path)
+                ]
+                self.journal.append({}, removed)
+
+            return self._pending, removed, self.journal.close()
+        finally:
+            self.journal.close()
+            if self._preprocess_pool is not None:
+                self._preprocess_pool.shutdown(cancel_futures=True)
+                self._preprocess_pool = None
+            metrics.observe("index_run_seconds", time.perf_counter() - started)
+            profiler.stop()
+
+    def _use_preprocess_pool(self) -> bool:
+        """是否为本次运行启动预处理进程池
+
+        启动进程池要创建解释器并重新导入 numpy / Pillow（Windows 上尤其慢），
+        监视模式下只有几个文件的增量索引直接在请求线程内预处理。
+        """
+        if not (PREPROCESS_ENABLED and PREPROCESS_WORKERS > 0 and preprocess.Image is not None):
+            return False
+        return self.files is None or len(self.files) >= PREPROCESS_POOL_MIN_FILES
+
+    def _record(self, entries: dict):
+        """把新结果写入索引日志；累计足够多时封存日志段并交给调用方合并"""
+        if not entries:
+            return
+        with metrics.timer("index_stage_seconds", stage="journal"):
+            self.journal.append(entries)
+        self._pending.update(entries)
+        if len(self._pending) < JOURNAL_CHECKPOINT_ENTRIES:
+            return
+
+        aliases = self._resolve_aliases(self._pending)
+        self.journal.append(aliases)
+        self._pending.update(aliases)
+        pending, self._pending = self._pending, {}
+        sealed = self.journal.rotate()
+        if self.on_checkpoint is not None:
+            self.on_checkpoint(pending, sealed)
+
+    def _resolve_aliases(self, entries: dict) -> dict:
+        """取出来源已在 entries 中的重复文件，复用来源的向量"""
+        resolved = {}
+        with self._lock:
+            remaining = []
+            for img_str, owner, entry in self._aliases:
+                if owner in entries:
+                    entry["embedding"] = entries[owner]["embedding"]
+                    resolved[img_str] = entry
+                else:
+                    remaining.append((img_str, owner, entry))
+            self._aliases = remaining
+        return resolved
+
+    def _scan(self, found: queue.Queue):
+        """后台扫描线程：把发现的文件逐个放入队列，结束时放入 None"""
+        try:
+            if self.files is not None:
+                images = (Path(path) for path in self.files)
+            else:
+                images = scan_images(self.image_dirs, SUPPORTED_FORMATS, SCAN_RECURSIVE,
+                                     SCAN_INCLUDE, SCAN_EXCLUDE, SCAN_SYMLINKS)
+            for img_path in images:
+                if self._is_cancelled:
+                    return
+                self._seen.add(str(img_path))
+                found.put(img_path)
+            self._scan_done = True
+        except Exception as e:
+            self._scan_error = e
+        finally:
+            found.put(None)
+
+    def _chunks(self, found: queue.Queue, size: int):
+        """从扫描队列中取出文件，每凑满 size 个交出一组，扫描结束时交出剩余部分"""
+        chunk = []
+        while True:
+            img_path = found.get()
+            if img_path is None:
+                break
+            chunk.append(img_path)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _batches(self, checked, batch_size: int):
+        """记录比对的结果，需要请求的文件排队凑满 batch_size 一批交出，结束时交出剩余部分"""
+        changed = []
+        for chunk, (entries, files) in checked:
+            self._record(entries)
+            self._advance(len(chunk) - len(files), chunk[-1].name)
+            changed.extend(files)
+            while len(changed) >= batch_size:
+                yield changed[:batch_size]
+                changed = changed[batch_size:]
+        if changed and not self._is_cancelled:
+            yield changed
+
+    def _advance(self, count: int, name: str):
+        if not count:
+            return
+        self._done += count
+        metrics.set("index_images_per_s", self._done / (time.perf_counter() - self._started))
+        if self.on_progress is not None:
+            self.on_progress(self._done, len(self._seen), name)
+
+    def _map_ordered(self, pool: ThreadPoolExecutor, fn, items: list):
+        """按提交顺序产出 (item, fn(item))，在途任务数受窗口限制"""
+        # 在途任务上限：保持线程池满载，同时限制内存中排队的结果数
+        window = self.concurrency * 2
+        pending = deque()
+        for item in items:
+            if self._is_cancelled:
+                break
+            pending.append((item, pool.submit(fn, item)))
+            if len(pending) >= window:
+                item, future = pending.popleft()
+                yield item, future.result()
+
+        while pending and not self._is_cancelled:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+        # 取消时丢弃尚未开始的任务，已经发出的请求结果仍然保留
+        for _, future in pending:
+            future.cancel()
+        for item, future in pending:
+            if not future.cancelled() and future.exception() is None:
+                yield item, future.result()
+
+    def _check_chunk(self, chunk: list):
+        """在线程池中执行：比对 stat 与哈希，返回 (无需请求的条目, 需要请求的 (路径, 条目) 列表)"""
+        entries, changed = {}, []
+        for img_path in chunk:
+            img_str = str(img_path)
+            try:
+                with metrics.timer("index_stage_seconds", stage="stat"):
+                    stat = file_stat(img_str)
+            except OSError:
+                continue  # 文件在处理前已被删除或移走
+
+            # 快速路径：stat 未变化时不读取文件内容
+            cached = self.store.get(img_str)
+            if cached is not None and all(cached.get(k) == v for k, v in stat.items()):
+                if cached.get("width") is None and preprocess.Image is not None:
+                    # 旧版向量库没有尺寸列：只读文件头补齐，向量原样复用
+                    entry = dict(cached, **self._dimensions(img_str))
+                    entry["embedding"] = self.store.vector(img_str)
+                    entries[img_str] = entry
+                    metrics.inc("index_files_total", result="backfilled")
+                    continue
+                metrics.inc("index_files_total", result="stat_unchanged")
+                continue
+
+            entry = {"hash": None, "name": img_path.name}
+            entry.update(stat)
+            entry.update(self._dimensions(img_str))
+
+            # 用已保存哈希的算法比较，内容未变时只刷新 stat
+            if cached is not None and cached.get("hash"):
+                algorithm = hash_algorithm_of(cached["hash"])
+                entry["hash"] = self._hash(img_str, stat, algorithm)
+                if entry["hash"] == cached["hash"]:
+                    entry["embedding"] = self.store.vector(img_str)
+                    entries[img_str] = entry
+                    metrics.inc("index_files_total", result="hash_unchanged")
+                    continue
+                if algorithm != HASH_ALGORITHM:
+                    entry["hash"] = None
+            if entry["hash"] is None:
+                entry["hash"] = self._hash(img_str, stat, HASH_ALGORITHM)
+
+            # 内容去重：与已有条目相同则直接复用向量
+            owner = self._known_hashes.get(entry["hash"]) or self._legacy_owner(img_str, stat)
+            if owner is not None and owner in self.store:
+                entry["embedding"] = self.store.vector(owner)
+                entries[img_str] = entry
+                metrics.inc("index_files_total", result="duplicate")
+                continue
+
+            with self._lock:
+                owner = self._claimed.setdefault(entry["hash"], img_str)
+                if owner != img_str:
+                    self._aliases.append((img_str, owner, entry))
+                    metrics.inc("index_files_total", result="duplicate")
+                    continue
+            changed.append((img_path, entry))
+        return entries, changed
+
+    def _legacy_owner(self, path: str, stat: dict) -> Optional[str]:
+        """返回哈希按其它算法保存、内容与 path 相同的已有条目"""
+        for algorithm in self._legacy_sizes.get(stat["size"], ()):
+            owner = self._known_hashes.get(self._hash(path, stat, algorithm))
+            if owner is not None:
+                return owner
+        return None
+
+    def _dimensions(self, path: str) -> dict:
+        """读取图片尺寸供元数据过滤使用；无法识别时记为 0，下次不再重复读取"""
+        with metrics.timer("index_stage_seconds", stage="probe"):
+            size = preprocess.image_size(path)
+        width, height = size or (0, 0)
+        return {"width": width, "height": height}
+
+    def _hash(self, path: str, stat: dict, algorithm: str) -> str:
+        with metrics.timer("index_stage_seconds", stage="hash"):
+            value = file_hash(path, algorithm)
+        metrics.inc("index_hashed_bytes_total", stat["size"])
+        return value
+
+    def _embed_files(self, files: list):
+        """批量获取 (路径, 条目) 列表的向量，返回 (新条目, 可重试的失败项)"""
+        if not files or self._is_cancelled:
+            return {}, []
+
+        # 获取新的embedding
+        paths = [str(img_path) for img_path, _ in files]
+        if self._preprocess_pool is not None:
+            # 读取、缩小与 base64 编码在进程池中进行，这里统计整批的等待时间
+            with metrics.timer("index_stage_seconds", stage="encode"):
+                encoded = self._preprocess_pool.map(
+                    preprocess.encode_image_safe, paths,
+                    repeat(PREPROCESS_MAX_EDGE), repeat(PREPROCESS_QUALITY)
+                )
+                data_uris = [
+                    data_uri if data_uri is not None else InputError(f"图片预处理失败: {error}")
+                    for data_uri, error in encoded
+                ]
+            with metrics.timer("index_stage_seconds", stage="embed"):
+                results = self.api.get_data_uri_embeddings(data_uris, cancel_event=self._cancel_event)
+        else:
+            with metrics.timer("index_stage_seconds", stage="embed"):
+                results = self.api.get_image_embeddings(paths, cancel_event=self._cancel_event)
+
+        entries, failed = {}, []
+        for (img_path, entry), result in zip(files, results):
+            if result.ok:
+                entry["embedding"] = result.embedding
+                entries[str(img_path)] = entry
+                metrics.inc("index_files_total", result="embedded")
+            elif result.retryable:
+                failed.append((img_path, entry))
+            elif not isinstance(result.error, CancelledError):
+                metrics.inc("index_files_total", result="failed")
+                print(f"图片Embedding错误 {img_path}: {result.error}")
+        return entries, failed
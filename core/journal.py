@@ -0,0 +1,159 @@
+import os
+import json
+import zlib
+import struct
+import numpy as np
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+
+class IndexJournal:
+    """追加写的索引日志
+
+    索引过程中每得到一批向量就追加写入当前日志段，单条写入的代价与库的
+    规模无关。日志段按序号命名，合并进向量库后整体删除；向量库的 meta.json
+    记录已合并的最大序号，因此合并后、删除前崩溃也不会重复应用。
+
+    记录格式：<负载长度 u32><CRC32 u32><元数据长度 u32><元数据 JSON><float32 向量>，
+    删除记录的元数据带 "deleted" 标记且没有向量。读取时遇到截断或校验失败的
+    记录即停止（崩溃时最后一条可能只写了一半）。
+    """
+
+    MAGIC = b"IJNL"
+    FORMAT_VERSION = 1
+    FILE_HEADER = struct.Struct("<4sI")  # 魔数, 格式版本
+    RECORD_HEADER = struct.Struct("<II")  # 负载长度, CRC32
+    META_LENGTH = struct.Struct("<I")
+
+    def __init__(self, store_dir: str):
+        self.store_dir = Path(store_dir)
+        self.seq = 0  # 已使用的最大日志段序号
+        self._file = None
+
+    def segments(self) -> list:
+        """返回按序号排列的 [(序号, 路径)]"""
+        if not self.store_dir.exists():
+            return []
+        result = []
+        for file in self.store_dir.glob("journal_*.log"):
+            try:
+                result.append((int(file.stem.split("_")[1]), file))
+            except ValueError:
+                continue
+        return sorted(result)
+
+    def replay(self, after_seq: int) -> Tuple[dict, set, int]:
+        """读取序号大于 after_seq 的日志段，按写入顺序合并，返回 (条目, 已删除的路径, 最大序号)"""
+        updates, removed = {}, set()
+        self.seq = max(self.seq, after_seq)
+        for seq, file in self.segments():
+            self.seq = max(self.seq, seq)
+            if seq <= after_seq:
+                continue
+            for path, entry in self.read_segment(file):
+                if entry is None:
+                    updates.pop(path, None)
+                    removed.add(path)
+                else:
+                    removed.discard(path)
+                    updates[path] = entry
+        return updates, removed, self.seq
+
+    def begin(self, after_seq: int = 0) -> int:
+        """开始写入一个新的日志段，序号大于 after_seq 与已有的各段，返回其序号"""
+        self.close()
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        existing = [seq for seq, _ in self.segments()]
+        self.seq = max([self.seq, after_seq] + existing) + 1
+        self._file = open(self._segment_path(self.seq), "ab")
+        self._file.write(self.FILE_HEADER.pack(self.MAGIC, self.FORMAT_VERSION))
+        self._sync()
+        return self.seq
+
+    def append(self, entries: dict, removed: Iterable[str] = ()):
+        """把一批条目与删除的路径追加到当前日志段并落盘；条目格式与 VectorStore.apply 相同"""
+        removed = list(removed)
+        if not entries and not removed:
+            return
+        if self._file is None:
+            self.begin()
+        records = []
+        for path in removed:
+            payload = self._payload({"path": path, "deleted": True}, b"")
+            records.append(self.RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+            records.append(payload)
+        for path, entry in entries.items():
+            meta = {k: v for k, v in entry.items() if k != "embedding"}
+            meta["path"] = path
+            payload = self._payload(meta, np.asarray(entry["embedding"], dtype="<f4").tobytes())
+            records.append(self.RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+            records.append(payload)
+        self._file.write(b"".join(records))
+        self._sync()
+
+    def rotate(self) -> int:
+        """封存当前日志段并开始新的一段，返回被封存的序号"""
+        sealed = self.close()
+        self.begin(sealed)
+        return sealed
+
+    def close(self) -> int:
+        """封存当前日志段，返回其序号"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return self.seq
+
+    def discard(self, up_to_seq: int):
+        """删除已合并进向量库的日志段（正在写入的段除外）"""
+        for seq, file in self.segments():
+            if seq > up_to_seq or (self._file is not None and seq == self.seq):
+                continue
+            try:
+                file.unlink()
+            except OSError:
+                pass
+
+    @classmethod
+    def read_segment(cls, file: Path) -> Iterator[Tuple[str, Optional[dict]]]:
+        """逐条读取日志段中完整且校验通过的记录，删除记录的条目为 None"""
+        with open(file, "rb") as f:
+            header = f.read(cls.FILE_HEADER.size)
+            if len(header) < cls.FILE_HEADER.size:
+                return
+            magic, version = cls.FILE_HEADER.unpack(header)
+            if magic != cls.MAGIC or version != cls.FORMAT_VERSION:
+                print(f"无法识别的索引日志: {file}")
+                return
+
+            while True:
+                header = f.read(cls.RECORD_HEADER.size)
+                if len(header) < cls.RECORD_HEADER.size:
+                    return
+                length, crc = cls.RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    print(f"索引日志在 {file.name} 末尾不完整，已忽略损坏的记录")
+                    return
+
+                meta_length, = cls.META_LENGTH.unpack_from(payload)
+                start = cls.META_LENGTH.size
+                meta = json.loads(payload[start:start + meta_length].decode("utf-8"))
+                if meta.pop("deleted", False):
+                    yield meta["path"], None
+                    continue
+                meta["embedding"] = np.frombuffer(
+                    payload, dtype="<f4", offset=start + meta_length
+                ).astype(np.float32)
+                yield meta.pop("path"), meta
+
+    def _payload(self, meta: dict, vector: bytes) -> bytes:
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        return self.META_LENGTH.pack(len(meta_bytes)) + meta_bytes + vector
+
+    def _segment_path(self, seq: int) -> Path:
+        return self.store_dir / f"journal_{seq:06d}.log"
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
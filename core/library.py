@@ -0,0 +1,141 @@
+import os
+import threading
+from typing import Callable, Optional
+
+from config.settings import (
+    CACHE_FILE, STORE_DIR, JOURNAL_CHECKPOINT_ENTRIES, JOURNAL_COMPACT_RATIO, ANN_NPROBE,
+)
+from core.ann_index import IVFIndex
+from core.journal import IndexJournal
+from core.search_engine import SearchEngine
+from core.vector_store import VectorStore
+
+
+class ImageLibrary:
+    """图片库：向量库、索引日志与检索引擎的组合（不依赖 Qt）
+
+    负责加载（含旧版缓存迁移与索引日志恢复）、合并索引结果并保存，
+    图形界面与命令行共用同一套逻辑。
+    """
+
+    def __init__(self, store_dir: str = STORE_DIR, migrate_from: str = CACHE_FILE):
+        self.store_dir = store_dir
+        self.migrate_from = migrate_from  # 向量库不存在时从该旧版 JSON 缓存迁移，留空则不迁移
+        self.store = VectorStore(store_dir)
+        self.journal = IndexJournal(store_dir)
+        self.engine = SearchEngine()
+        self.unsaved_changes = 0  # 已合并到内存、只记录在索引日志中的变化数
+        self.write_lock = threading.RLock()  # 同一时间只有一次写回（见 Compaction）
+
+    def load(self, on_progress: Optional[Callable[[int, int], None]] = None):
+        """加载向量库，首次运行时从旧版 JSON 缓存迁移，并恢复上次未合并的索引日志
+
+        on_progress(已载入行数, 总行数) 报告检索引擎的构建进度（加载中最耗时的部分）。
+        """
+        try:
+            if not self.store.load() and self.migrate_from and os.path.exists(self.migrate_from):
+                count = self.store.migrate_from_json(self.migrate_from)
+                print(f"已从 {self.migrate_from} 迁移 {count} 条向量")
+        except Exception as e:
+            print(f"加载缓存失败: {e}")
+            self.store = VectorStore(self.store_dir)
+        self.replay_journal()
+        self.engine.load(self.store, on_progress)
+
+    def load_ann(self, nprobe: int = ANN_NPROBE) -> Optional[IVFIndex]:
+        """读取磁盘上的近似索引，与向量库一致时挂载到检索引擎；返回读到的索引（可能已过期）"""
+        try:
+            ann = IVFIndex.load(self.store_dir, nprobe)
+        except Exception as e:
+            print(f"加载近似索引失败: {e}")
+            return None
+        if ann is not None and ann.generation == self.store.generation:
+            self.engine.attach_ann(ann, self.store.paths)
+        return ann
+
+    def replay_journal(self) -> tuple:
+        """把尚未合并的索引日志写入向量库，返回恢复的 (条目, 已删除的路径)"""
+        try:
+            updates, removed, seq = self.journal.replay(self.store.journal_seq)
+        except Exception as e:
+            print(f"读取索引日志失败: {e}")
+            return {}, []
+
+        removed = [path for path in removed if path in self.store]
+        if updates or removed:
+            self.store.apply(updates, removed)
+            print(f"已从索引日志恢复 {len(updates)} 条向量，删除 {len(removed)} 条")
+        self.store.journal_seq = seq
+        self.unsaved_changes += len(updates) + len(removed)
+        if self.compaction_due:
+            self.flush()
+        elif not self.unsaved_changes:
+            self.journal.discard(seq)  # 只剩已合并或没有有效记录的日志段
+        return updates, removed
+
+    @property
+    def compaction_due(self) -> bool:
+        """未写回的变化是否多到需要重写向量库
+
+        阈值与向量库的规模成正比：每次重写的代价与条目数成正比，按比例触发时
+        整个索引过程的写回总量与图片数成线性关系，而不是随检查点数平方增长。
+        """
+        threshold = max(JOURNAL_CHECKPOINT_ENTRIES, JOURNAL_COMPACT_RATIO * len(self.store))
+        return self.unsaved_changes >= threshold
+
+    def commit(self, updates: dict, removed: list, journal_seq: int, save: bool = True):
+        """合并索引结果；save 为 True 时立即写回向量库并删除已合并的日志段
+
+        save 为 False 时只合并到内存，变化已在索引日志中，由调用方在 compaction_due
+        时调用 flush，或在后台执行 Compaction 写回。
+        """
+        self.store.apply(updates, removed)
+        self.engine.apply(updates, removed)
+        self.store.journal_seq = journal_seq
+        self.unsaved_changes += len(updates) + len(removed)
+        if save:
+            self.flush()
+
+    def flush(self):
+        """把内存中的变化写回向量库（以及已挂载的近似索引）并删除已合并的日志段"""
+        with self.write_lock:
+            compaction = Compaction(self)
+            if compaction.run():
+                compaction.finish()
+
+
+class Compaction:
+    """把图片库的当前状态写回向量库并删除已合并的日志段
+
+    构造（取快照）与 finish 在修改图片库的线程中调用；run 只读取快照，
+    可以在后台线程执行，写回期间图片库可以继续合并新的变化，这些变化
+    仍只记录在索引日志中，留给下一次写回。
+    """
+
+    def __init__(self, library: ImageLibrary):
+        self.library = library
+        self.snapshot = library.store.snapshot()
+        self.changes = library.unsaved_changes
+        self.ann = library.engine.ann
+        self.ann_labels = None if self.ann is None else library.engine.ann_labels_for(self.snapshot.paths)
+        self.written = None
+
+    def run(self) -> bool:
+        """写出新一代向量文件与元数据，返回是否成功"""
+        with self.library.write_lock:
+            try:
+                self.written = self.snapshot.write()
+                if self.ann is not None:
+                    self.ann.save(self.library.store_dir, self.ann_labels, self.written[1])
+                return True
+            except Exception as e:
+                print(f"保存缓存失败: {e}")
+                return False
+
+    def finish(self):
+        """切换到写出的向量文件；写出期间向量库已被另一次写回替换时什么也不做"""
+        library = self.library
+        if self.written is None or not library.store.adopt(self.written):
+            return
+        library.journal.discard(self.snapshot.journal_seq)
+        library.unsaved_changes = max(0, library.unsaved_changes - self.changes)
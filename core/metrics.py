@@ -0,0 +1,349 @@
+import json
+import time
+import threading
+import cProfile
+import pstats
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+from config.settings import PROFILE_MODE, PROFILE_DIR
+
+
+class Histogram:
+    """固定分桶的耗时直方图（秒），分位数按桶内线性插值估算"""
+
+    BUCKETS = (
+        0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+        0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+    )
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= target:
+                lower = self.BUCKETS[i - 1] if i else 0.0
+                upper = self.BUCKETS[i] if i < len(self.BUCKETS) else self.max
+                upper = min(upper, self.max)
+                return lower + (upper - lower) * (target - cumulative) / count
+            cumulative += count
+        return self.max
+
+
+class MetricsRegistry:
+    """进程内的计数器、仪表与耗时直方图（线程安全）
+
+    指标按 (名称, 标签) 区分，可导出为 JSON 或 Prometheus 文本格式。
+    记录一次的开销是一次加锁与少量算术，可以放在热路径上。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self.started = time.time()
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """统计 with 块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def value(self, name: str, **labels) -> float:
+        """返回计数器（或仪表）的当前值"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+
+    def total(self, name: str) -> float:
+        """返回某个计数器所有标签组合之和"""
+        with self._lock:
+            return sum(v for (n, _), v in self._counters.items() if n == name)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(
+                (key, self._copy(histogram)) for key, histogram in self._histograms.items()
+            )
+        return {
+            "uptime_s": time.time() - self.started,
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in counters
+            ],
+            "gauges": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in gauges
+            ],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": h.sum,
+                    "mean": h.sum / h.count if h.count else 0.0,
+                    "p50": h.quantile(0.5),
+                    "p90": h.quantile(0.9),
+                    "p99": h.quantile(0.99),
+                    "max": h.max,
+                    "buckets": dict(zip([str(b) for b in Histogram.BUCKETS] + ["+Inf"], h.counts)),
+                }
+                for (name, labels), h in histograms
+            ],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(
+                (key, self._copy(histogram)) for key, histogram in self._histograms.items()
+            )
+
+        lines = []
+        typed = set()
+        for kind, items in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in items:
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{self._labels(labels)} {value:g}")
+
+        for (name, labels), h in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            bounds = [f"{b:g}" for b in Histogram.BUCKETS] + ["+Inf"]
+            for bound, count in zip(bounds, h.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{self._labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{self._labels(labels)} {h.sum:g}")
+            lines.append(f"{name}_count{self._labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _copy(histogram: Histogram) -> Histogram:
+        clone = Histogram()
+        clone.counts = list(histogram.counts)
+        clone.count = histogram.count
+        clone.sum = histogram.sum
+        clone.max = histogram.max
+        return clone
+
+    @staticmethod
+    def _labels(labels: tuple) -> str:
+        if not labels:
+            return ""
+        escaped = (
+            (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+            for k, v in labels
+        )
+        return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+metrics = MetricsRegistry()
+
+
+class StartupTimeline:
+    """启动各阶段的时间线
+
+    mark(阶段) 记录距 start() 时刻的秒数，同时写入 startup_seconds 仪表；
+    同一阶段只记录第一次。summary() 按先后顺序列出各阶段的增量耗时。
+    """
+
+    STAGES = {
+        "imports": "导入",
+        "window": "创建窗口",
+        "first_paint": "首次绘制",
+        "deferred_imports": "后台导入",
+        "index_loaded": "加载索引",
+        "ready": "就绪",
+    }
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.marks = {}  # 阶段 -> 距启动的秒数（按记录顺序）
+        self._lock = threading.Lock()
+
+    def start(self, origin: float = None):
+        """以 origin（time.perf_counter() 的读数，默认当前）为启动时刻重新计时"""
+        with self._lock:
+            self.origin = time.perf_counter() if origin is None else origin
+            self.marks = {}
+
+    def mark(self, stage: str):
+        with self._lock:
+            if stage in self.marks:
+                return
+            elapsed = self.marks[stage] = time.perf_counter() - self.origin
+        metrics.set("startup_seconds", elapsed, stage=stage)
+
+    def summary(self) -> str:
+        with self._lock:
+            marks = sorted(self.marks.items(), key=lambda item: item[1])
+        parts, previous = [], 0.0
+        for stage, elapsed in marks:
+            parts.append(f"{self.STAGES.get(stage, stage)} +{(elapsed - previous) * 1000:.0f}")
+            previous = elapsed
+        return f"启动耗时 {previous * 1000:.0f} ms：" + "  ".join(parts)
+
+
+startup = StartupTimeline()
+
+
+class RunProfiler:
+    """按 PROFILE_MODE（环境变量 IMAGE_SEARCH_PROFILE）为一次运行采集性能剖析
+
+    cpu 采集 cProfile（包括经 wrap 包装、在线程池中执行的函数），memory 采集
+    tracemalloc 的分配统计，all 两者都采集。每个名称在进程内只采集第一次运行，
+    结果写入 PROFILE_DIR。未开启时 wrap 原样返回函数，stop 什么也不做。
+    """
+
+    _captured = set()
+    _lock = threading.Lock()
+
+    def __init__(self, name: str, mode: str = ""):
+        self.name = name
+        self.cpu = mode in ("cpu", "all")
+        self.memory = mode in ("memory", "all")
+        self._profiles = []
+        self._local = threading.local()
+        self._started_tracing = False
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if self.cpu:
+            self._main = self._thread_profile()
+            self._enable(self._main)
+
+    @property
+    def active(self) -> bool:
+        return self.cpu or self.memory
+
+    @classmethod
+    def start(cls, name: str, mode: str = PROFILE_MODE) -> "RunProfiler":
+        with cls._lock:
+            if not mode or name in cls._captured:
+                mode = ""
+            else:
+                cls._captured.add(name)
+        return cls(name, mode)
+
+    def wrap(self, fn):
+        """返回在当前线程的剖析器下执行 fn 的函数"""
+        if not self.cpu:
+            return fn
+
+        def profiled(*args, **kwargs):
+            profile = self._thread_profile()
+            if not self._enable(profile):
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled
+
+    def stop(self):
+        if not self.active:
+            return
+        out_dir = Path(PROFILE_DIR)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        if self.cpu:
+            self._main.disable()
+
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if self._started_tracing:
+                tracemalloc.stop()
+            path = out_dir / f"{self.name}_{stamp}_memory.txt"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"current={current / 2 ** 20:.1f}MB peak={peak / 2 ** 20:.1f}MB\n\n")
+                for stat in snapshot.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
+            print(f"已保存内存分配统计: {path}")
+            self.memory = False
+
+        if self.cpu:
+            stats = pstats.Stats(self._main)
+            for profile in self._profiles:
+                if profile is not self._main:
+                    try:
+                        stats.add(profile)
+                    except TypeError:
+                        pass  # 该线程没有采集到数据
+            path = out_dir / f"{self.name}_{stamp}.prof"
+            stats.dump_stats(str(path))
+            print(f"已保存性能剖析: {path}（可用 python -m pstats 或 snakeviz 查看）")
+            self.cpu = False
+
+    def _thread_profile(self) -> cProfile.Profile:
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    @staticmethod
+    def _enable(profile: cProfile.Profile) -> bool:
+        # Python 3.12 起同一时刻只能有一个剖析器，此时主剖析器已覆盖全部线程
+        try:
+            profile.enable()
+            return True
+        except ValueError:
+            return False
@@ -0,0 +1,68 @@
+import numpy as np
+from typing import Optional, Tuple
+
+# 检索引擎内存中向量的存储格式
+CODE_DTYPES = {
+    "none": np.float32,
+    "float16": np.float16,
+    "int8": np.int8,
+}
+
+SCAN_BLOCK_ROWS = 256  # 扫描时每次解码的行数，解码缓冲区保持在 CPU 缓存内
+
+
+def quantize(vectors: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """把已归一化的 float32 向量编码为 mode 对应的格式，返回 (编码, 每行缩放系数)
+
+    int8 按行对称量化：每行除以 max|x| / 127 后取整，缩放系数单独保存；
+    其余格式没有缩放系数，返回 None。
+    """
+    if mode == "int8":
+        scales = np.maximum(np.abs(vectors).max(axis=-1), 1e-12) / 127
+        codes = np.rint(vectors / scales[..., None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    return vectors.astype(CODE_DTYPES[mode], copy=False), None
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    """解码为 float32"""
+    vectors = codes.astype(np.float32)
+    if scales is not None:
+        vectors *= scales[..., None]
+    return vectors
+
+
+def scan(codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+    """计算每行编码与查询向量的内积
+
+    numpy 没有低精度的矩阵乘法，这里按 SCAN_BLOCK_ROWS 行解码到复用的
+    float32 缓冲区再做矩阵-向量乘法，整块矩阵不会被整体转换。
+    """
+    if codes.dtype == np.float32:
+        return codes @ query
+    count = len(codes)
+    scores = np.empty(count, dtype=np.float32)
+    buffer = np.empty((min(SCAN_BLOCK_ROWS, count), codes.shape[1]), dtype=np.float32)
+    for start in range(0, count, SCAN_BLOCK_ROWS):
+        end = min(start + SCAN_BLOCK_ROWS, count)
+        block = buffer[:end - start]
+        block[...] = codes[start:end]
+        np.dot(block, query, out=scores[start:end])
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+def scan_many(codes: np.ndarray, scales: Optional[np.ndarray], queries: np.ndarray,
+              block_rows: int = 4096) -> np.ndarray:
+    """计算每条查询与每行编码的内积，返回 (查询数, 行数) 的得分矩阵"""
+    if codes.dtype == np.float32:
+        return queries @ codes.T
+    count = len(codes)
+    scores = np.empty((len(queries), count), dtype=np.float32)
+    for start in range(0, count, block_rows):
+        end = min(start + block_rows, count)
+        scores[:, start:end] = queries @ codes[start:end].astype(np.float32).T
+    if scales is not None:
+        scores *= scales
+    return scores
@@ -0,0 +1,95 @@
+import os
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+SYMLINK_POLICIES = ("skip", "files", "follow")
+
+
+def _matches(rel_path: str, name: str, patterns: Iterable[str]) -> bool:
+    return any(fnmatch(rel_path, p) or fnmatch(name, p) for p in patterns)
+
+
+def list_directory(directory: str, rel_dir: str, extensions: Iterable[str],
+                   include: Iterable[str] = (), exclude: Iterable[str] = (),
+                   symlinks: str = "files") -> Tuple[List[os.DirEntry], List[Tuple[str, str]]]:
+    """列出单个目录（不递归），返回 (图片的 DirEntry 列表, 子目录 [(路径, 相对路径)])
+
+    rel_dir 为该目录相对扫描根目录的路径，用于匹配 include/exclude；
+    目录无法读取时抛出 OSError。
+    """
+    extensions = {ext.lower() for ext in extensions}
+    with os.scandir(directory) as it:
+        entries = list(it)
+
+    files, subdirs = [], []
+    for entry in entries:
+        rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+        try:
+            is_link = entry.is_symlink()
+            if is_link and symlinks == "skip":
+                continue
+            if entry.is_dir(follow_symlinks=symlinks == "follow"):
+                if not _matches(rel_path, entry.name, exclude):
+                    subdirs.append((entry.path, rel_path))
+                continue
+            if not entry.is_file():
+                continue
+        except OSError:
+            continue
+
+        if os.path.splitext(entry.name)[1].lower() not in extensions:
+            continue
+        if include and not _matches(rel_path, entry.name, include):
+            continue
+        if _matches(rel_path, entry.name, exclude):
+            continue
+        files.append(entry)
+    return files, subdirs
+
+
+def scan_images(roots: Iterable[str], extensions: Iterable[str], recursive: bool = True,
+                include: Iterable[str] = (), exclude: Iterable[str] = (),
+                symlinks: str = "files") -> Iterator[Path]:
+    """单遍扫描一个或多个根目录，以生成器形式逐个产出图片路径
+
+    - extensions: 扩展名集合（大小写不敏感）
+    - include/exclude: glob 模式，匹配相对根目录的路径（以 / 分隔）或文件名；
+      exclude 同样作用于目录，命中的目录整体跳过
+    - symlinks: skip 忽略全部符号链接；files 只收录指向文件的链接；
+      follow 同时进入链接目录（按 设备号+inode 防止循环与重复）
+    """
+    if symlinks not in SYMLINK_POLICIES:
+        raise ValueError(f"不支持的符号链接策略: {symlinks}")
+
+    extensions = {ext.lower() for ext in extensions}
+    include, exclude = list(include), list(exclude)
+    visited = set()
+
+    for root in roots:
+        stack = [(root, "")]
+        while stack:
+            directory, rel_dir = stack.pop()
+            try:
+                st = os.stat(directory)
+            except OSError:
+                continue
+            # 多个根目录重叠或链接成环时只遍历一次
+            key = (st.st_dev, st.st_ino)
+            if key in visited:
+                continue
+            visited.add(key)
+
+            try:
+                files, subdirs = list_directory(directory, rel_dir, extensions,
+                                                include, exclude, symlinks)
+            except OSError as e:
+                print(f"无法读取目录 {directory}: {e}")
+                continue
+
+            for entry in files:
+                yield Path(entry.path)
+
+            # 逆序入栈，使遍历顺序与目录列表顺序一致
+            if recursive:
+                stack.extend(reversed(subdirs))
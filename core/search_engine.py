@@ -0,0 +1,369 @@
+import numpy as np
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from config.settings import QUANTIZATION, RERANK_CANDIDATES
+from core.ann_index import IVFIndex
+from core.filters import Filter, MetadataColumns
+from core.quantization import CODE_DTYPES, quantize, dequantize, scan, scan_many
+from core.vector_math import normalize_rows, top_k_indices, top_k_rows
+from core.vector_store import VectorStore
+
+
+class RankedResults:
+    """按需分页的排序结果
+
+    只保存候选行号与得分；取某一页时才对所需前缀做 argpartition 局部排序，
+    前缀长度按倍数增长，翻页的均摊代价与已浏览的结果数成正比。检索引擎
+    在搜索开始之后发生变化时行号可能失效，此时不再返回新的结果。
+    """
+
+    def __init__(self, engine: "SearchEngine", rows: np.ndarray, scores: np.ndarray, version: int):
+        self.engine = engine
+        self.version = version  # 开始打分前的引擎版本
+        self.rows = rows
+        self.scores = scores
+        self.complete = True  # 在时间预算内没有扫描完全部候选时为 False
+        self._order = np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def fetch(self, start: int, count: int) -> list:
+        """返回排名 [start, start + count) 的结果"""
+        if self.engine.version != self.version:
+            return []
+        end = min(start + count, len(self.rows))
+        if end > len(self._order):
+            self._order = top_k_indices(self.scores, max(end, len(self._order) * 2))
+        return [
+            self.engine._result(self.rows[i], self.scores[i]) for i in self._order[start:end]
+        ]
+
+
+class SearchEngine:
+    """常驻内存的向量检索引擎
+
+    维护全部图片向量的 L2 归一化矩阵与路径数组，一次查询只需一次
+    矩阵-向量乘法加 argpartition 取 top-k。索引变化时按条目增量更新，
+    删除采用与末行交换的方式，不会触发整体重建。挂载 IVF 索引后只对
+    候选簇内的行打分。
+
+    quantization 为 float16 / int8 时内存中只保存压缩后的编码（分别为
+    float32 的 1/2、1/4），先用编码粗排，再从向量库读取得分最高的 rerank
+    个结果的 float32 原始向量精确重排。
+
+    每行的目录、扩展名、大小、修改时间与尺寸保存在按列排列的 MetadataColumns
+    中。带过滤条件的检索先把条件编译为布尔掩码，只对满足条件的行打分。
+    """
+
+    LOAD_CHUNK_ROWS = 16384  # 分块归一化，同时决定加载进度的粒度
+    BATCH_SCORE_ELEMENTS = 1 << 25  # 批量检索时单块得分矩阵的元素上限（约 128MB）
+    DENSE_FILTER_FRACTION = 0.5  # 满足过滤条件的行超过该比例时整体打分再取子集，比按行号取出更快
+
+    def __init__(self, quantization: str = QUANTIZATION, rerank: int = RERANK_CANDIDATES):
+        if quantization not in CODE_DTYPES:
+            raise ValueError(f"不支持的量化格式: {quantization}")
+        self.quantization = quantization
+        self.rerank = rerank if quantization != "none" else 0
+        self._matrix = np.zeros((0, 0), dtype=CODE_DTYPES[quantization])  # 带预留容量的缓冲区
+        self._scales = np.zeros(0, dtype=np.float32) if quantization == "int8" else None
+        self._store = None  # 精确重排时读取原始向量
+        self._count = 0
+        self.paths = []
+        self.names = []
+        self.metadata = MetadataColumns()
+        self.metadata.paths = self.paths
+        self.ann = None
+        self.version = 0  # 每次内容变化时递增，用于判断已有结果是否失效
+        self._rows = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._rows
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """当前有效的编码矩阵视图（未量化时即归一化的 float32 矩阵）"""
+        return self._matrix[:self._count]
+
+    @property
+    def nbytes(self) -> int:
+        """向量缓冲区（含预留容量）占用的内存"""
+        return self._matrix.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+
+    def vectors(self, rows) -> np.ndarray:
+        """返回指定行的归一化 float32 向量（量化时为解码后的近似值）"""
+        rows = np.asarray(rows, dtype=np.int64)
+        return dequantize(self._matrix[rows], self._row_scales(rows))
+
+    def vector_of(self, path: str) -> Optional[np.ndarray]:
+        """返回库中图片的归一化向量（优先读取原始向量），不在库中时返回 None"""
+        row = self._rows.get(path)
+        if row is None:
+            return None
+        return self._exact_vectors(np.array([row], dtype=np.int64))[0]
+
+    def load(self, store: VectorStore, on_progress: Optional[Callable[[int, int], None]] = None):
+        """从向量库全量构建（分块归一化与编码，避免额外的整块临时内存）
+
+        on_progress(已载入行数, 总行数) 在开始时与每块完成后调用。
+        """
+        count = len(store)
+        dim = store.dim if count else 0
+        self._matrix = np.empty((count, dim), dtype=CODE_DTYPES[self.quantization])
+        if self._scales is not None:
+            self._scales = np.empty(count, dtype=np.float32)
+        if on_progress is not None:
+            on_progress(0, count)
+        for start in range(0, count, self.LOAD_CHUNK_ROWS):
+            block = store.vectors_at(slice(start, min(start + self.LOAD_CHUNK_ROWS, count)))
+            self._store_rows(start, normalize_rows(block))
+            if on_progress is not None:
+                on_progress(start + len(block), count)
+
+        self._store = store
+        self._count = count
+        self.paths = list(store.paths)
+        self.names = [
+            name or Path(path).name
+            for path, name in zip(store.paths, store.columns["name"])
+        ]
+        self._rows = {path: row for row, path in enumerate(self.paths)}
+        self.metadata.load(self.paths, store.columns)
+        self.ann = None
+        self.version += 1
+
+    def attach_ann(self, ann: IVFIndex, paths: list):
+        """挂载近似索引，ann 的簇编号按 paths 的顺序排列"""
+        if paths == self.paths:
+            labels = np.array(ann.labels, dtype=np.int32)
+        else:
+            labels = np.full(self._count, -1, dtype=np.int32)
+            for label, path in zip(ann.labels, paths):
+                row = self._rows.get(path)
+                if row is not None:
+                    labels[row] = label
+            # 保存之后新增的行按最近的簇补齐
+            missing = np.flatnonzero(labels < 0)
+            if missing.size:
+                labels[missing] = ann.assign(self.vectors(missing))
+        ann.set_labels(labels)
+        self.ann = ann
+
+    def detach_ann(self):
+        self.ann = None
+
+    def ann_labels_for(self, paths: list) -> np.ndarray:
+        """按给定路径顺序导出簇编号，用于持久化"""
+        rows = np.fromiter((self._rows[path] for path in paths), dtype=np.int64, count=len(paths))
+        return self.ann.labels[rows]
+
+    def apply(self, updates: dict, removed: Iterable[str] = ()):
+        """增量应用索引变化，updates 格式与 VectorStore.apply 相同"""
+        self.version += 1
+        for path in removed:
+            self._remove(path)
+        for path, data in updates.items():
+            self._upsert(path, data, data["embedding"])
+
+    def filter_mask(self, where: Optional[Filter]) -> Optional[np.ndarray]:
+        """返回各行是否满足过滤条件，没有条件时返回 None"""
+        if where is None:
+            return None
+        return where.mask(self.metadata, self._count)
+
+    def search(self, query_embedding, k: int, where: Optional[Filter] = None) -> list:
+        """返回与查询向量最相似的 k 个结果"""
+        return self.rank(query_embedding, self.rerank and max(k, self.rerank), where).fetch(0, k)
+
+    def search_batch(self, query_embeddings, k: int, where: Optional[Filter] = None) -> list:
+        """批量检索，返回与查询一一对应的结果列表
+
+        查询按块做一次矩阵-矩阵乘法再逐行取 top-k，块大小按得分矩阵的
+        元素上限确定。挂载近似索引时各查询的候选集不同，逐条检索。
+        量化时每条查询先取 max(k, rerank) 个候选，统一读取原始向量后精确重排。
+        带过滤条件时满足条件的行只取出一次，供全部查询共用。
+        """
+        queries = normalize_rows(query_embeddings)
+        if queries.ndim != 2:
+            raise ValueError("query_embeddings 必须是二维数组")
+        if self.ann is not None:
+            return [self.search(query, k, where) for query in queries]
+
+        mask = self.filter_mask(where)
+        subset = None if mask is None else np.flatnonzero(mask)
+        if subset is None:
+            codes, scales = self.matrix, self._row_scales(slice(0, self._count))
+        else:
+            codes, scales = self._matrix[subset], self._row_scales(subset)
+        if len(codes) == 0:
+            return [[] for _ in range(len(queries))]
+
+        block = max(1, self.BATCH_SCORE_ELEMENTS // len(codes))
+        shortlist = max(k, self.rerank) if self.rerank else k
+        results = []
+        for start in range(0, len(queries), block):
+            batch = queries[start:start + block]
+            scores = scan_many(codes, scales, batch)
+            top = top_k_rows(scores, shortlist)
+            if self.rerank and top.size:
+                candidates, inverse = np.unique(top, return_inverse=True)
+                exact = self._exact_vectors(candidates if subset is None else subset[candidates])
+                for query, row_scores, rows, index in zip(batch, scores, top, inverse.reshape(top.shape)):
+                    row_scores[rows] = exact[index] @ query
+                top = np.take_along_axis(
+                    top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable'), axis=1
+                )[:, :k]
+            for row_scores, rows in zip(scores, top):
+                results.append([
+                    self._result(row if subset is None else subset[row], row_scores[row]) for row in rows
+                ])
+        return results
+
+    def rank(self, query_embedding, rerank: Optional[int] = None,
+             where: Optional[Filter] = None) -> RankedResults:
+        """对全部（或近似索引的候选）向量打分，返回可按需分页的结果
+
+        量化时得分最高的 rerank（默认 self.rerank）个结果使用原始向量的精确得分，
+        其余为编码的近似得分。where 不为空时只对满足过滤条件的行打分；满足条件的
+        行比近似索引的候选还少时不使用近似索引，直接精确打分。
+        """
+        version = self.version
+        empty = RankedResults(self, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), version)
+        if self._count == 0:
+            return empty
+        query = normalize_rows(query_embedding)
+        rows = self.candidate_rows(query, where)
+        if rows is None:
+            rows = np.arange(self._count)
+            scores = self.score(query, slice(0, self._count))
+        elif not rows.size:
+            return empty
+        elif self.ann is None and len(rows) > self._count * self.DENSE_FILTER_FRACTION:
+            scores = self.score(query, slice(0, self._count))[rows]
+        else:
+            scores = self.score(query, rows)
+        return self.ranked(rows, scores, query, rerank, version)
+
+    def candidate_rows(self, query: np.ndarray, where: Optional[Filter] = None) -> Optional[np.ndarray]:
+        """返回需要打分的行号，None 表示全部行；query 需已归一化
+
+        有过滤条件时为满足条件的行；挂载近似索引时为候选簇内（且满足条件）的行，
+        满足条件的行比候选还少时直接使用满足条件的行。
+        """
+        mask = self.filter_mask(where)
+        rows = None if mask is None else np.flatnonzero(mask)
+        if self.ann is not None and self._count and (rows is None or rows.size):
+            candidates = self.ann.candidates(query)
+            if rows is None or len(rows) > len(candidates):
+                rows = candidates if mask is None else candidates[mask[candidates]]
+        return rows
+
+    def score(self, query: np.ndarray, rows) -> np.ndarray:
+        """对 rows（行号数组或切片）的编码打分，量化时为近似得分；query 需已归一化"""
+        return scan(self._matrix[rows], self._row_scales(rows), query)
+
+    def ranked(self, rows: np.ndarray, scores: np.ndarray, query: np.ndarray,
+               rerank: Optional[int] = None, version: Optional[int] = None) -> RankedResults:
+        """由行号与近似得分构造排序结果，得分最高的 rerank 个改为原始向量的精确得分
+
+        version 为开始打分前记下的 self.version，默认为当前版本。
+        """
+        version = self.version if version is None else version
+        rerank = self.rerank if rerank is None else rerank
+        if rerank and len(rows):
+            shortlist = top_k_indices(scores, rerank)
+            scores[shortlist] = self._exact_vectors(rows[shortlist]) @ query
+        return RankedResults(self, rows, scores, version)
+
+    def _result(self, row: int, score: float) -> dict:
+        return {
+            "path": self.paths[row],
+            "name": self.names[row],
+            "score": float(score),
+            # 索引时记录的文件版本，界面据此区分同一路径的新旧缩略图；未知时为 -1
+            "size": int(self.metadata.values["size"][row]),
+            "mtime": int(self.metadata.values["mtime"][row]),
+        }
+
+    def _row_scales(self, rows) -> Optional[np.ndarray]:
+        return self._scales[rows] if self._scales is not None else None
+
+    def _store_rows(self, start: int, vectors: np.ndarray):
+        """把已归一化的向量编码后写入从 start 开始的行"""
+        codes, scales = quantize(vectors, self.quantization)
+        self._matrix[start:start + len(vectors)] = codes
+        if scales is not None:
+            self._scales[start:start + len(vectors)] = scales
+
+    def _exact_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """从向量库读取指定行的原始向量并归一化；向量库中找不到的行使用解码值"""
+        vectors = self.vectors(rows)
+        if self._store is None:
+            return vectors
+        store_rows = [self._store.row_of(self.paths[row]) for row in rows]
+        found = [i for i, row in enumerate(store_rows) if row is not None and row < len(self._store)]
+        if found:
+            source = self._store.vectors_at(np.array([store_rows[i] for i in found], dtype=np.int64))
+            if source.shape[-1] == vectors.shape[-1]:
+                vectors[found] = normalize_rows(source)
+        return vectors
+
+    def _upsert(self, path: str, data: dict, embedding):
+        vector = normalize_rows(embedding)
+        name = data.get("name") or Path(path).name
+        row = self._rows.get(path)
+        if row is None:
+            self._ensure_capacity(self._count + 1, vector.shape[0])
+            row = self._count
+            self._count += 1
+            self.paths.append(path)
+            self.names.append(name)
+            self._rows[path] = row
+        else:
+            self.names[row] = name
+        self.metadata.set(row, path, data)
+        self._store_rows(row, vector[None])
+        if self.ann is not None:
+            self.ann.add(row, vector)
+
+    def _remove(self, path: str):
+        row = self._rows.pop(path, None)
+        if row is None:
+            return
+        last = self._count - 1
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            if self._scales is not None:
+                self._scales[row] = self._scales[last]
+            self.paths[row] = self.paths[last]
+            self.names[row] = self.names[last]
+            self.metadata.move(last, row)
+            self._rows[self.paths[row]] = row
+            if self.ann is not None:
+                self.ann.move(last, row)
+        self.paths.pop()
+        self.names.pop()
+        self._count = last
+        if self.ann is not None:
+            self.ann.truncate(last)
+
+    def _ensure_capacity(self, count: int, dim: int):
+        capacity, current_dim = self._matrix.shape
+        if self._count and current_dim != dim:
+            raise ValueError(f"向量维度不一致: {dim} != {current_dim}")
+        if count <= capacity and current_dim == dim:
+            return
+        new_capacity = max(count, capacity + capacity // 4, 1024)
+        grown = np.empty((new_capacity, dim), dtype=self._matrix.dtype)
+        if self._count:
+            grown[:self._count] = self._matrix[:self._count]
+        self._matrix = grown
+        self.metadata.reserve(new_capacity, self._count)
+        if self._scales is not None:
+            scales = np.empty(new_capacity, dtype=np.float32)
+            scales[:self._count] = self._scales[:self._count]
+            self._scales = scales
@@ -0,0 +1,353 @@
+import hashlib
+import heapq
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+import numpy as np
+
+from config.settings import (
+    IMAGE_DIRS, STORE_DIR, CACHE_FILE, ANN_NPROBE, SHARDED, SHARD_SEARCH_WORKERS,
+)
+from core.filters import Filter
+from core.library import ImageLibrary
+from core.streaming import StreamingSearch
+from core.vector_store import VectorStore
+
+
+def shard_name(root: str) -> str:
+    """分片目录名：根目录名加绝对路径的短哈希，同名的不同目录互不冲突"""
+    digest = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()[:8]
+    name = re.sub(r"[^\w.-]+", "_", Path(root).name).strip("._") or "root"
+    return f"{name}-{digest}"
+
+
+class Shard:
+    """一个分片：若干图片根目录及其独立的图片库（向量库、索引日志与检索引擎）"""
+
+    INFO_FILE = "shard.json"
+
+    def __init__(self, name: str, roots: List[str], store_dir: str, migrate_from: str = "",
+                 legacy_split: bool = False):
+        self.name = name
+        self.roots = list(roots)  # 保持原样：向量库中的路径由根目录拼接而成
+        self.store_dir = store_dir
+        self.migrate_from = migrate_from
+        self.legacy_split = legacy_split  # 是否已处理过原有单库中属于本分片的条目
+        self.library = ImageLibrary(store_dir, migrate_from)
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self.library.store)
+
+    def has_root(self, root: str) -> bool:
+        root = os.path.normpath(root)
+        return any(os.path.normpath(own) == root for own in self.roots)
+
+    def owns(self, path: str) -> bool:
+        """路径是否位于本分片的根目录下"""
+        path = os.path.normpath(path)
+        for root in map(os.path.normpath, self.roots):
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return True
+        return False
+
+    def save_info(self):
+        """记录分片对应的根目录，命令行可以发现配置之外建立的分片"""
+        os.makedirs(self.store_dir, exist_ok=True)
+        with open(os.path.join(self.store_dir, self.INFO_FILE), "w", encoding="utf-8") as f:
+            json.dump({"name": self.name, "roots": self.roots, "legacy_split": self.legacy_split}, f,
+                      ensure_ascii=False)
+
+
+class MergedResults:
+    """多个分片的排序结果按得分归并，接口与 RankedResults 相同
+
+    每个分片的结果已按得分降序，按需逐条做 k 路归并，取前 n 条的代价为
+    O(n log 分片数)。任一分片在搜索后发生变化时不再返回新的结果。
+    """
+
+    def __init__(self, parts: list, chunk: int = 64):
+        self.parts = [part for part in parts if len(part)]
+        self.chunk = chunk
+        self.complete = all(part.complete for part in parts)
+        self._total = sum(len(part) for part in self.parts)
+        self._merged = []
+        self._buffers = [[] for _ in self.parts]  # 各分片已取出、尚未归并的结果（倒序）
+        self._taken = [0] * len(self.parts)
+        self._heap = None
+        self._stale = False
+
+    def __len__(self) -> int:
+        return self._total
+
+    def fetch(self, start: int, count: int) -> list:
+        """返回排名 [start, start + count) 的结果"""
+        end = min(start + count, self._total)
+        if self._heap is None:
+            self._heap = []
+            for i in range(len(self.parts)):
+                self._push(i)
+        while len(self._merged) < end and self._heap and not self._stale:
+            _, i, item = heapq.heappop(self._heap)
+            self._merged.append(item)
+            self._push(i)
+        if self._stale:
+            return []
+        return self._merged[start:end]
+
+    def _push(self, i: int):
+        buffer = self._buffers[i]
+        if not buffer and self._taken[i] < len(self.parts[i]):
+            page = self.parts[i].fetch(self._taken[i], self.chunk)
+            if not page:
+                self._stale = True
+                return
+            self._taken[i] += len(page)
+            buffer.extend(reversed(page))
+        if buffer:
+            item = buffer.pop()
+            heapq.heappush(self._heap, (-item["score"], i, item))
+
+
+class ShardedLibrary:
+    """按图片根目录分片的图片库
+
+    sharded 为 True 时每个根目录是一个分片，数据保存在 store_dir/<分片名>，
+    可以单独重建索引、加载或卸载；为 False 时全部根目录共用 store_dir 下的
+    一个分片，与单库布局相同。检索在线程池中并行查询已加载的分片（numpy 的
+    矩阵运算会释放 GIL），再按得分合并各分片的结果。
+    """
+
+    def __init__(self, roots: Iterable[str] = IMAGE_DIRS, store_dir: str = STORE_DIR,
+                 sharded: bool = SHARDED, workers: int = SHARD_SEARCH_WORKERS):
+        self.store_dir = store_dir
+        self.sharded = sharded
+        self.workers = workers
+        self._pool = None
+        self._legacy = None  # 加载分片期间读出的原有单库，加载结束后释放
+        self._legacy_lock = threading.Lock()
+        if sharded:
+            self.shards = self._discover()
+            for root in roots:
+                self.add(root)
+        else:
+            self.shards = [Shard("", list(roots), store_dir, CACHE_FILE)]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.loaded_shards())
+
+    def __contains__(self, path: str) -> bool:
+        return any(path in shard.library.engine for shard in self.loaded_shards())
+
+    def add(self, root: str) -> Shard:
+        """登记图片根目录，返回对应的分片（已登记时直接返回）"""
+        for shard in self.shards:
+            if shard.has_root(root):
+                return shard
+        name = shard_name(root)
+        shard = Shard(name, [root], os.path.join(self.store_dir, name))
+        self.shards.append(shard)
+        return shard
+
+    def shards_for(self, roots: Iterable[str]) -> List[Shard]:
+        """返回负责这些根目录的分片（未分片时即唯一的分片）"""
+        if not self.sharded:
+            return list(self.shards)
+        return [self.add(root) for root in roots]
+
+    def get(self, name: str) -> Optional[Shard]:
+        return next((shard for shard in self.shards if shard.name == name), None)
+
+    def shard_of(self, path: str) -> Optional[Shard]:
+        """返回负责该路径的分片"""
+        return next((shard for shard in self.shards if shard.owns(path)), None)
+
+    def loaded_shards(self) -> List[Shard]:
+        return [shard for shard in self.shards if shard.loaded]
+
+    def load(self, shards: Iterable[Shard] = None,
+             on_progress: Optional[Callable[[int, int], None]] = None):
+        """加载分片（默认全部），多个分片并行加载
+
+        on_progress(已载入行数, 总行数) 汇总各分片的进度；分片读到元数据后才计入
+        总行数，因此总数可能在加载过程中增长。
+        """
+        pending = [shard for shard in (self.shards if shards is None else shards) if not shard.loaded]
+        for shard in pending:
+            if self.sharded:
+                shard.save_info()
+        try:
+            if on_progress is None:
+                self._map(self._load_shard, pending)
+                return
+
+            rows = {}  # 分片名 -> (已载入行数, 总行数)
+            lock = threading.Lock()
+
+            def report(shard: Shard, done: int, total: int):
+                with lock:
+                    rows[shard.name] = (done, total)
+                    done, total = map(sum, zip(*rows.values()))
+                on_progress(done, total)
+            self._map(
+                lambda shard: self._load_shard(shard, lambda done, total: report(shard, done, total)),
+                pending
+            )
+        finally:
+            self._legacy = None
+
+    def load_ann(self, nprobe: int = ANN_NPROBE):
+        """为已加载的分片挂载磁盘上与向量库一致的近似索引"""
+        for shard in self.loaded_shards():
+            shard.library.load_ann(nprobe)
+
+    def unload(self, shard: Shard):
+        """卸载分片，释放检索引擎与向量映射；未写回的变化先保存"""
+        if not shard.loaded:
+            return
+        if shard.library.unsaved_changes:
+            shard.library.flush()
+        shard.library = ImageLibrary(shard.store_dir, shard.migrate_from)
+        shard.loaded = False
+
+    def flush(self):
+        for shard in self.loaded_shards():
+            if shard.library.unsaved_changes:
+                shard.library.flush()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def vector_of(self, path: str) -> Optional[np.ndarray]:
+        """返回库中图片的归一化向量，不在已加载的分片中时返回 None"""
+        for shard in self.loaded_shards():
+            vector = shard.library.engine.vector_of(path)
+            if vector is not None:
+                return vector
+        return None
+
+    def rank(self, query_embedding, where: Optional[Filter] = None):
+        """并行对各分片打分，返回按得分归并、可按需分页的结果
+
+        where 为过滤条件，各分片按自己的元数据列生成掩码，只对满足条件的行打分。
+        """
+        shards = self.loaded_shards()
+        if len(shards) == 1:
+            return shards[0].library.engine.rank(query_embedding, where=where)
+        return MergedResults(self._map(
+            lambda shard: shard.library.engine.rank(query_embedding, where=where), shards
+        ))
+
+    def rank_stream(self, query_embedding, where: Optional[Filter] = None,
+                    cancel: Optional[threading.Event] = None,
+                    on_partial: Optional[Callable[[list, float], None]] = None):
+        """与 rank 相同，但各分片并行分块扫描，扫描过程中通过 on_partial 报告当前最好的结果
+
+        cancel 置位时返回 None；超出时间预算时结果的 complete 为 False（见 StreamingSearch）。
+        """
+        shards = self.loaded_shards()
+        stream = StreamingSearch([shard.library.engine for shard in shards], query_embedding, where,
+                                 cancel=cancel, on_partial=on_partial)
+        parts = stream.run(lambda fn, items: self._map(fn, list(items)))
+        if parts is None:
+            return None
+        return parts[0] if len(parts) == 1 else MergedResults(parts)
+
+    def search(self, query_embedding, k: int, where: Optional[Filter] = None) -> list:
+        """返回与查询向量最相似的 k 个结果"""
+        parts = self._map(lambda shard: shard.library.engine.search(query_embedding, k, where),
+                          self.loaded_shards())
+        return heapq.nlargest(k, chain.from_iterable(parts), key=lambda item: item["score"])
+
+    def search_batch(self, query_embeddings, k: int, where: Optional[Filter] = None) -> list:
+        """批量检索，返回与查询一一对应的结果列表"""
+        parts = self._map(lambda shard: shard.library.engine.search_batch(query_embeddings, k, where),
+                          self.loaded_shards())
+        if not parts:
+            return [[] for _ in range(len(query_embeddings))]
+        return [
+            heapq.nlargest(k, chain.from_iterable(results), key=lambda item: item["score"])
+            for results in zip(*parts)
+        ]
+
+    def _load_shard(self, shard: Shard, on_progress: Optional[Callable[[int, int], None]] = None):
+        shard.library.load(on_progress)
+        if self.sharded and not shard.legacy_split:
+            # 只拆分一次：之后在分片中删除的条目不会再从原有单库中恢复
+            if len(shard) or self._split_legacy(shard):
+                shard.legacy_split = True
+                shard.save_info()
+        shard.loaded = True
+
+    def _split_legacy(self, shard: Shard) -> bool:
+        """首次启用分片时，从 store_dir 下原有的单库中取出该分片的条目，不需要重新请求向量
+
+        返回是否处理完毕（没有原有单库也算）；读取失败时返回 False，下次加载时重试。
+        """
+        try:
+            legacy = self._legacy_store()
+        except Exception as e:
+            print(f"读取原有向量库失败: {e}")
+            return False
+        if legacy is None:
+            return True
+        updates = {
+            path: dict(legacy.get(path), embedding=legacy.vector(path))
+            for path in legacy.paths if shard.owns(path)
+        }
+        if not updates:
+            return True
+        library = shard.library
+        library.commit(updates, [], library.store.journal_seq)
+        if library.unsaved_changes:
+            return False  # 写回失败，下次加载时重新拆分
+        print(f"已从原有向量库拆分 {len(updates)} 条向量到分片 {shard.name}")
+        return True
+
+    def _legacy_store(self) -> Optional[VectorStore]:
+        """读出 store_dir 下原有的单库，各分片共用一份；没有单库时先迁移旧版 JSON 缓存
+
+        未分片时由 ImageLibrary 负责迁移；分片后旧版缓存先迁移成单库，再按
+        根目录拆分到各分片，同样不需要重新请求向量。都不存在时返回 None。
+        """
+        with self._legacy_lock:
+            if self._legacy is None:
+                legacy = VectorStore(self.store_dir)
+                if not legacy.load():
+                    if not os.path.exists(CACHE_FILE):
+                        return None
+                    count = legacy.migrate_from_json(CACHE_FILE)
+                    print(f"已从 {CACHE_FILE} 迁移 {count} 条向量")
+                self._legacy = legacy
+            return self._legacy
+
+    def _map(self, fn, shards: list) -> list:
+        if len(shards) <= 1 or self.workers <= 1:
+            return [fn(shard) for shard in shards]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        return list(self._pool.map(fn, shards))
+
+    def _discover(self) -> List[Shard]:
+        """列出 store_dir 下已有的分片"""
+        shards = []
+        root = Path(self.store_dir)
+        if not root.is_dir():
+            return shards
+        for info_path in sorted(root.glob(f"*/{Shard.INFO_FILE}")):
+            try:
+                with open(info_path, "r", encoding="utf-8") as f:
+                    info = json.load(f)
+                shards.append(Shard(info["name"], info["roots"], str(info_path.parent),
+                                    legacy_split=info.get("legacy_split", False)))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"读取分片信息失败 {info_path}: {e}")
+        return shards
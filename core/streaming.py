@@ -0,0 +1,122 @@
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from config.settings import (
+    RESULTS_PAGE_SIZE, SEARCH_STREAM_CHUNK_ROWS, SEARCH_PARTIAL_INTERVAL_MS, SEARCH_TIME_BUDGET_MS,
+)
+from core.filters import Filter
+from core.search_engine import RankedResults, SearchEngine
+from core.vector_math import normalize_rows, top_k_indices
+
+
+class StreamingSearch:
+    """分块扫描的渐进式检索
+
+    各检索引擎的候选行按 chunk_rows 分块打分，每块的 top-k 归并进全局的
+    前 k 名，并通过 on_partial(结果列表, 已扫描比例) 报告当前最好的结果：
+    第一块扫描完立即报告，之后至少间隔 interval 秒。量化时中间结果的得分是
+    编码的近似得分，最终结果与 SearchEngine.rank 相同（同样精确重排）。
+
+    每块之间检查 cancel 与时间预算：取消时 run() 返回 None；超出预算时停止
+    扫描，只用已扫描的行构造结果，结果的 complete 为 False。每个引擎至少
+    扫描一块，预算很小时也有结果。
+    """
+
+    def __init__(self, engines: List[SearchEngine], query_embedding, where: Optional[Filter] = None,
+                 k: int = RESULTS_PAGE_SIZE, chunk_rows: int = SEARCH_STREAM_CHUNK_ROWS,
+                 time_budget: float = SEARCH_TIME_BUDGET_MS / 1000,
+                 interval: float = SEARCH_PARTIAL_INTERVAL_MS / 1000,
+                 cancel: Optional[threading.Event] = None,
+                 on_partial: Optional[Callable[[list, float], None]] = None):
+        self.engines = engines
+        self.query = normalize_rows(query_embedding)
+        self.where = where
+        self.k = k
+        self.chunk_rows = chunk_rows
+        self.time_budget = time_budget
+        self.interval = interval
+        self.cancel = cancel or threading.Event()
+        self.on_partial = on_partial
+        self._lock = threading.Lock()
+        self._versions = []
+        self._plans = []  # 各引擎的候选行，None 表示全部行
+        self._total = 0
+        self._scanned = 0
+        self._deadline = None
+        self._last_partial = None
+        # 全局前 k 名：得分、引擎序号、行号
+        self._top_scores = np.zeros(0, dtype=np.float32)
+        self._top_engines = np.zeros(0, dtype=np.int64)
+        self._top_rows = np.zeros(0, dtype=np.int64)
+
+    def run(self, map_fn=map) -> Optional[List[RankedResults]]:
+        """扫描全部引擎，返回与 engines 一一对应的排序结果，取消时返回 None
+
+        map_fn 决定各引擎的扫描方式，传入线程池的 map 即可并行扫描。
+        """
+        started = time.perf_counter()
+        if self.time_budget > 0:
+            self._deadline = started + self.time_budget
+        self._versions = [engine.version for engine in self.engines]
+        self._plans = [
+            engine.candidate_rows(self.query, self.where) if len(engine) else np.zeros(0, dtype=np.int64)
+            for engine in self.engines
+        ]
+        self._total = sum(
+            len(engine) if rows is None else len(rows) for engine, rows in zip(self.engines, self._plans)
+        )
+        parts = list(map_fn(self._scan, range(len(self.engines))))
+        if self.cancel.is_set():
+            return None
+        return parts
+
+    def _scan(self, i: int) -> RankedResults:
+        engine, rows = self.engines[i], self._plans[i]
+        total = len(engine) if rows is None else len(rows)
+        chunks = []
+        for start in range(0, total, self.chunk_rows):
+            if self.cancel.is_set() or engine.version != self._versions[i]:
+                break
+            if chunks and self._deadline is not None and time.perf_counter() >= self._deadline:
+                break
+            end = min(start + self.chunk_rows, total)
+            chunk = slice(start, end) if rows is None else rows[start:end]
+            scores = engine.score(self.query, chunk)
+            chunks.append(scores)
+            top = top_k_indices(scores, self.k)
+            self._merge(i, top + start if rows is None else chunk[top], scores[top], len(scores))
+
+        scanned = sum(len(scores) for scores in chunks)
+        scanned_rows = np.arange(scanned) if rows is None else rows[:scanned]
+        scores = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+        ranked = engine.ranked(scanned_rows, scores, self.query, version=self._versions[i])
+        ranked.complete = scanned == total
+        return ranked
+
+    def _merge(self, i: int, rows: np.ndarray, scores: np.ndarray, scanned: int):
+        """把一块的 top-k（行号与得分）归并进全局前 k 名，必要时报告中间结果"""
+        with self._lock:
+            self._scanned += scanned
+            merged_scores = np.concatenate([self._top_scores, scores])
+            order = top_k_indices(merged_scores, self.k)
+            self._top_scores = merged_scores[order]
+            self._top_engines = np.concatenate([self._top_engines, np.full(len(rows), i)])[order]
+            self._top_rows = np.concatenate([self._top_rows, rows])[order]
+
+            if self.on_partial is None or self._scanned >= self._total:
+                return  # 全部扫描完时直接给出最终结果
+            now = time.perf_counter()
+            if self._last_partial is not None and now - self._last_partial < self.interval:
+                return
+            if any(engine.version != version for engine, version in zip(self.engines, self._versions)):
+                return
+            self._last_partial = now
+            # 在锁内报告，保证中间结果按扫描进度的先后送达
+            items = [
+                self.engines[engine]._result(row, score)
+                for engine, row, score in zip(self._top_engines, self._top_rows, self._top_scores)
+            ]
+            self.on_partial(items, self._scanned / self._total)
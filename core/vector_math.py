@@ -0,0 +1,33 @@
+import numpy as np
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """按行做 L2 归一化（零向量保持为零）"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """返回得分最高的 k 个下标（按得分降序）"""
+    if k <= 0 or scores.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """对二维得分矩阵逐行取得分最高的 k 个下标（每行按得分降序）"""
+    rows, cols = scores.shape
+    k = min(k, cols)
+    if k <= 0:
+        return np.zeros((rows, 0), dtype=np.int64)
+    if k < cols:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(cols), (rows, cols))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
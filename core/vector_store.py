@@ -0,0 +1,328 @@
+import os
+import copy
+import json
+import numpy as np
+from pathlib import Path
+from typing import Iterable, Optional
+
+
+class VectorStore:
+    """基于内存映射的二进制向量库
+
+    向量保存为连续的 float32 矩阵（.npy），加载时以 mmap 方式打开，
+    多个进程可通过页缓存共享同一份数据；路径、哈希、文件名、stat 等元数据
+    按列保存在旁路的 meta.json 中。每次保存写出新一代向量文件，
+    再原子替换 meta.json，崩溃时旧数据保持完整。meta.json 同时记录已合并的
+    索引日志序号（见 IndexJournal）。
+
+    内存中的修改不改动映射的文件：新增或更新的向量追加到内存中的增量缓冲区，
+    每行通过位置数组指向文件中的行或缓冲区中的行；删除与末行交换。一次 apply
+    的代价只与变化的条目数有关，保存时才把两部分合并写成新的向量文件。
+    """
+
+    META_FILE = "meta.json"
+    FORMAT_VERSION = 1
+    COLUMNS = ("hash", "name", "size", "mtime", "inode", "width", "height")
+    WRITE_CHUNK_ROWS = 16384  # 保存时分块写出，不在内存中拼接整个矩阵
+
+    def __init__(self, store_dir: str):
+        self.store_dir = Path(store_dir)
+        self.paths = []
+        self.columns = {name: [] for name in self.COLUMNS}
+        self.generation = 0
+        self.journal_seq = 0  # 已合并进向量库的最大索引日志序号
+        self._vectors_file = None
+        self._rows = {}
+        self._base = np.zeros((0, 0), dtype=np.float32)  # 映射的向量文件（只读）
+        self._delta = np.zeros((0, 0), dtype=np.float32)  # 增量缓冲区（带预留容量，只追加）
+        self._delta_count = 0
+        self._loc = np.zeros(0, dtype=np.int64)  # 行 -> 位置：小于 len(_base) 为文件中的行，否则为缓冲区中的行
+        self._identity = True  # 第 i 行即文件的第 i 行，没有增量
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._rows
+
+    @property
+    def dim(self) -> int:
+        return self._base.shape[1]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """全部原始向量；有增量时需要整体拼接，大向量库请使用 vectors_at 分块读取"""
+        return self.vectors_at(slice(0, len(self.paths)))
+
+    @vectors.setter
+    def vectors(self, vectors: np.ndarray):
+        """整体替换向量（行与 paths 一一对应），通常随后调用 save"""
+        self._base = vectors
+        self._reset_delta(len(vectors))
+
+    def row_of(self, path: str) -> Optional[int]:
+        """返回路径对应的行号"""
+        return self._rows.get(path)
+
+    def get(self, path: str) -> Optional[dict]:
+        """返回路径对应的元数据（不含向量）"""
+        row = self._rows.get(path)
+        if row is None:
+            return None
+        return {name: values[row] for name, values in self.columns.items()}
+
+    def vector(self, path: str) -> Optional[np.ndarray]:
+        """返回路径对应的原始向量"""
+        row = self._rows.get(path)
+        if row is None:
+            return None
+        if self._identity:
+            return self._base[row]
+        loc = self._loc[row]
+        return self._base[loc] if loc < len(self._base) else self._delta[loc - len(self._base)]
+
+    def vectors_at(self, rows) -> np.ndarray:
+        """返回指定行（行号数组或切片）的原始向量"""
+        if self._identity:
+            return self._base[rows]
+        loc = self._loc[:len(self.paths)][rows]
+        base_rows = len(self._base)
+        vectors = np.empty((len(loc), self.dim), dtype=np.float32)
+        in_base = loc < base_rows
+        vectors[in_base] = self._base[loc[in_base]]
+        vectors[~in_base] = self._delta[loc[~in_base] - base_rows]
+        return vectors
+
+    def snapshot(self) -> "VectorStore":
+        """返回不受之后修改影响的副本，供后台线程读取
+
+        复制路径、各列与位置数组；向量文件只读、增量缓冲区只追加，两者与原对象共用。
+        """
+        clone = copy.copy(self)
+        clone.paths = list(self.paths)
+        clone.columns = {name: list(values) for name, values in self.columns.items()}
+        clone._rows = dict(self._rows)
+        clone._loc = self._loc[:len(self.paths)].copy()
+        return clone
+
+    def load(self) -> bool:
+        """加载向量库，不存在时返回 False"""
+        meta_path = self.store_dir / self.META_FILE
+        if not meta_path.exists():
+            return False
+
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        count = meta["count"]
+        vectors = self._open_vectors(meta["vectors_file"], count, meta["dim"])
+        if len(vectors) != count or len(meta["paths"]) != count:
+            raise ValueError("向量库元数据与向量文件不一致")
+
+        self.paths = meta["paths"]
+        self.columns = {
+            name: meta.get(name, [None] * count) for name in self.COLUMNS
+        }
+        self.vectors = vectors
+        self.generation = meta["generation"]
+        self.journal_seq = meta.get("journal_seq", 0)
+        self._vectors_file = meta["vectors_file"]
+        self._rebuild_rows()
+        self._remove_stale_files()
+        return True
+
+    def apply(self, updates: dict, removed: Iterable[str] = ()):
+        """合并新增/更新的条目并删除指定路径，仅修改内存，需调用 save 持久化
+
+        updates 的格式与旧版缓存一致：{path: {"embedding": [...], "hash": ..., "name": ...}}。
+        已有路径的更新保持原来的行号。
+        """
+        new_paths = list(updates)
+        dim = self.dim if len(self.paths) else 0
+        new_vectors = np.asarray(
+            [updates[path]["embedding"] for path in new_paths], dtype=np.float32
+        )
+        if new_paths:
+            if dim and new_vectors.shape[1] != dim:
+                raise ValueError(f"向量维度不一致: {new_vectors.shape[1]} != {dim}")
+            if not len(self.paths) and new_vectors.shape[1] != self.dim:
+                self._base = np.zeros((0, new_vectors.shape[1]), dtype=np.float32)
+                self._reset_delta(0)
+
+        for path in removed:
+            row = self._rows.get(path)
+            if row is not None and path not in updates:
+                self._remove_row(row)
+        if not new_paths:
+            return
+
+        locations = self._append_vectors(new_vectors)
+        for path, loc in zip(new_paths, locations):
+            data = updates[path]
+            row = self._rows.get(path)
+            if row is None:
+                row = self._rows[path] = len(self.paths)
+                self.paths.append(path)
+                for name, values in self.columns.items():
+                    values.append(data.get(name))
+                self._ensure_loc_capacity(len(self.paths))
+            else:
+                for name, values in self.columns.items():
+                    values[row] = data.get(name)
+            self._loc[row] = loc
+        self._identity = False
+
+    def save(self):
+        """写出新一代向量文件并原子替换元数据，之后改为映射新文件"""
+        self.adopt(self.write())
+
+    def write(self) -> tuple:
+        """把当前内容写成新一代向量文件并原子替换元数据，不修改内存中的数据
+
+        可以在快照上于后台线程执行；返回值交给原对象的 adopt，切换到新文件。
+        """
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        generation = self.generation + 1
+        vectors_file = f"vectors_{generation:06d}.npy"
+        count, dim = len(self.paths), self.dim
+
+        def write_vectors(f):
+            np.lib.format.write_array_header_1_0(f, {
+                "descr": np.lib.format.dtype_to_descr(np.dtype("<f4")),
+                "fortran_order": False,
+                "shape": (count, dim),
+            })
+            for start in range(0, count, self.WRITE_CHUNK_ROWS):
+                block = self.vectors_at(slice(start, min(start + self.WRITE_CHUNK_ROWS, count)))
+                f.write(np.ascontiguousarray(block, dtype="<f4").tobytes())
+        self._atomic_write(vectors_file, write_vectors)
+
+        meta = {
+            "version": self.FORMAT_VERSION,
+            "generation": generation,
+            "journal_seq": self.journal_seq,
+            "vectors_file": vectors_file,
+            "count": count,
+            "dim": dim,
+            "paths": self.paths,
+        }
+        meta.update(self.columns)
+        self._atomic_write(
+            self.META_FILE,
+            lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode('utf-8')),
+        )
+        locations = np.arange(count) if self._identity else self._loc[:count].copy()
+        return self._base, generation, vectors_file, dim, locations, len(self._base) + self._delta_count
+
+    def adopt(self, written: tuple) -> bool:
+        """切换到 write 写出的向量文件（written 为其返回值），返回是否切换
+
+        写出时已有的向量改为从新文件映射；之后追加的向量保留在增量缓冲区中。
+        写出期间的删除与交换只移动位置，位置按写出时的布局整体换算即可。
+        写出之后本对象已切换过向量文件（例如重新加载）时不再切换。
+        """
+        written_base, generation, vectors_file, dim, locations, written_slots = written
+        if written_base is not self._base:
+            return False
+        base = self._open_vectors(vectors_file, len(locations), dim)
+        count = len(self.paths)
+        loc = np.arange(count) if self._identity else self._loc[:count]
+        new_slot = np.full(written_slots, -1, dtype=np.int64)  # 写出时的位置 -> 新文件中的行
+        new_slot[locations] = np.arange(len(locations))
+
+        newer = loc >= written_slots
+        remapped = np.empty(count, dtype=np.int64)
+        remapped[~newer] = new_slot[loc[~newer]]
+        remapped[newer] = len(locations) + loc[newer] - written_slots
+        tail = self._delta[written_slots - len(self._base):self._delta_count].copy()
+
+        self._base = base
+        self._delta = tail
+        self._delta_count = len(tail)
+        self._loc = remapped
+        self._identity = not len(tail) and bool(np.array_equal(remapped, np.arange(count)))
+        self.generation = generation
+        self._vectors_file = vectors_file
+        self._remove_stale_files()
+        return True
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """从旧版 JSON 缓存一次性迁移，返回迁移的条目数"""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+
+        updates = {
+            path: data for path, data in legacy.items() if data.get("embedding")
+        }
+        self.apply(updates)
+        self.save()
+        # 迁移完成后改名，避免下次启动重复迁移
+        os.replace(json_path, json_path + ".migrated")
+        return len(updates)
+
+    def _open_vectors(self, vectors_file: str, count: int, dim: int) -> np.ndarray:
+        if count == 0:
+            return np.zeros((0, dim), dtype=np.float32)
+        return np.load(self.store_dir / vectors_file, mmap_mode='r')
+
+    def _atomic_write(self, filename: str, write):
+        target = self.store_dir / filename
+        tmp = target.with_name(target.name + ".tmp")
+        with open(tmp, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+
+    def _remove_stale_files(self):
+        """清理旧代向量文件（在 Windows 上仍被映射的文件留待下次清理）"""
+        for file in self.store_dir.glob("vectors_*.npy*"):
+            if file.name != self._vectors_file:
+                try:
+                    file.unlink()
+                except OSError:
+                    pass
+
+    def _rebuild_rows(self):
+        self._rows = {path: row for row, path in enumerate(self.paths)}
+
+    def _reset_delta(self, count: int):
+        self._delta = np.zeros((0, self._base.shape[1]), dtype=np.float32)
+        self._delta_count = 0
+        self._loc = np.arange(count, dtype=np.int64)
+        self._identity = True
+
+    def _append_vectors(self, vectors: np.ndarray) -> np.ndarray:
+        """把向量追加到增量缓冲区，返回它们的位置"""
+        needed = self._delta_count + len(vectors)
+        if needed > len(self._delta):
+            grown = np.empty((max(needed, len(self._delta) * 2, 1024), self.dim), dtype=np.float32)
+            grown[:self._delta_count] = self._delta[:self._delta_count]
+            self._delta = grown
+        self._delta[self._delta_count:needed] = vectors
+        locations = len(self._base) + np.arange(self._delta_count, needed)
+        self._delta_count = needed
+        return locations
+
+    def _ensure_loc_capacity(self, count: int):
+        if count > len(self._loc):
+            grown = np.empty(max(count, len(self._loc) * 2, 1024), dtype=np.int64)
+            grown[:len(self._loc)] = self._loc
+            self._loc = grown
+
+    def _remove_row(self, row: int):
+        """删除一行：末行移到该行，其余行号不变"""
+        self._identity = False
+        last = len(self.paths) - 1
+        path = self.paths[row]
+        if row != last:
+            moved = self.paths[last]
+            self.paths[row] = moved
+            for values in self.columns.values():
+                values[row] = values[last]
+            self._loc[row] = self._loc[last]
+            self._rows[moved] = row
+        self.paths.pop()
+        for values in self.columns.values():
+            values.pop()
+        del self._rows[path]
@@ -1,10 +1,16 @@
+import time
+STARTED = time.perf_counter()  # 在导入其它模块之前计时，启动耗时包含导入
+
 import sys
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtGui import QFont
 
+from core.metrics import startup
 from ui.main_window import MainWindow
 
 def main():
+    startup.start(STARTED)
+    startup.mark("imports")
     app = QApplication(sys.argv)
     
     # 设置应用字体
@@ -12,6 +18,7 @@ def main():
     app.setFont(font)
     
     window = MainWindow()
+    startup.mark("window")
     window.show()
     
     sys.exit(app.exec())
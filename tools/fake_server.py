@@ -0,0 +1,258 @@
+"""本地模拟的多模态 embedding 服务，用于离线压测与回归测试
+
+请求/响应格式与百炼 multimodal-embedding 接口一致，向量由输入内容的哈希
+确定性生成（相同输入总是得到相同向量）。可注入延迟、429/5xx/超时错误与
+服务端限流：
+
+    python -m tools.fake_server --port 8000 --latency 0.05 --qps 20 --error-5xx 0.01
+
+然后让客户端指向它：
+
+    EMBEDDING_API_URL=http://127.0.0.1:8000/ DASHSCOPE_API_KEY=fake python cli.py index
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+from api.rate_limiter import TokenBucket
+
+DEFAULT_DIM = 1024  # multimodal-embedding-v1 的向量维度
+
+
+class FakeServerConfig:
+    """模拟服务的行为参数；比例均为 0~1 的概率，按请求独立抽样"""
+
+    def __init__(self, dim: int = DEFAULT_DIM, latency: float = 0.0, jitter: float = 0.0,
+                 latency_per_item: float = 0.0, qps: float = 0.0, error_429: float = 0.0,
+                 error_5xx: float = 0.0, error_timeout: float = 0.0, timeout_delay: float = 65.0,
+                 max_batch: int = 20, seed: int = None):
+        self.dim = dim
+        self.latency = latency  # 每个请求的基础延迟（秒）
+        self.jitter = jitter  # 在基础延迟上叠加的 [0, jitter) 秒随机延迟
+        self.latency_per_item = latency_per_item  # 批内每个输入额外增加的延迟（秒）
+        self.qps = qps  # 服务端限流，超出时返回 429 与 Retry-After，0 表示不限
+        self.error_429 = error_429
+        self.error_5xx = error_5xx
+        self.error_timeout = error_timeout  # 挂起 timeout_delay 秒后断开连接，不返回响应
+        self.timeout_delay = timeout_delay
+        self.max_batch = max_batch  # 单次请求的输入数上限，超出返回 400
+        self.seed = seed
+
+
+class FakeEmbeddingServer:
+    """在后台线程中运行的模拟服务，可在基准测试或脚本中直接启动
+
+        with FakeEmbeddingServer(FakeServerConfig(latency=0.02)) as server:
+            ...  # 请求 server.url
+    """
+
+    def __init__(self, config: FakeServerConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeServerConfig()
+        self.limiter = TokenBucket(self.config.qps)
+        self.random = random.Random(self.config.seed)
+        self.stats = {"requests": 0, "inputs": 0, "ok": 0, "429": 0, "5xx": 0, "timeout": 0, "400": 0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "FakeEmbeddingServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeEmbeddingServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def snapshot_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def embed(self, data: bytes) -> list:
+        """由输入内容确定性地生成单位向量"""
+        seed = int.from_bytes(hashlib.sha256(data).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.config.dim, dtype=np.float32)
+        vector /= np.linalg.norm(vector)
+        return vector.tolist()
+
+    def handle(self, body: bytes):
+        """处理一次请求，返回 (状态码, 响应头, 响应体)；返回 None 表示模拟超时"""
+        config = self.config
+        request_id = str(uuid.uuid4())
+        self._count("requests")
+
+        with self._lock:
+            roll = self.random.random()
+        if roll < config.error_timeout:
+            self._count("timeout")
+            return None
+        roll -= config.error_timeout
+        if roll < config.error_429:
+            return self._error(429, "Throttling.RateQuota", "Requests rate limit exceeded",
+                               request_id, {"Retry-After": "1"})
+        roll -= config.error_429
+        if roll < config.error_5xx:
+            return self._error(500, "InternalError", "Injected server error", request_id)
+
+        wait = self.limiter.try_acquire()
+        if wait > 0:
+            return self._error(429, "Throttling.RateQuota", "Requests rate limit exceeded",
+                               request_id, {"Retry-After": f"{wait:.3f}"})
+
+        try:
+            payload = json.loads(body)
+            contents = payload["input"]["contents"]
+            if not isinstance(contents, list) or not contents:
+                raise ValueError("contents 不能为空")
+        except (ValueError, KeyError, TypeError) as e:
+            return self._error(400, "InvalidParameter", f"Malformed request: {e}", request_id)
+        if len(contents) > config.max_batch:
+            return self._error(400, "InvalidParameter",
+                               f"contents exceeds the limit of {config.max_batch}", request_id)
+
+        embeddings = []
+        images = 0
+        for index, content in enumerate(contents):
+            try:
+                data, kind = self._decode(content)
+            except ValueError as e:
+                return self._error(400, "InvalidParameter", f"contents[{index}]: {e}", request_id)
+            images += kind == "image"
+            embeddings.append({"index": index, "embedding": self.embed(data), "type": kind})
+
+        with self._lock:
+            delay = config.latency + self.random.random() * config.jitter
+        time.sleep(delay + config.latency_per_item * len(contents))
+
+        self._count("ok")
+        self._count("inputs", len(contents))
+        return 200, {}, {
+            "output": {"embeddings": embeddings},
+            "usage": {"input_tokens": len(contents) - images, "image_count": images},
+            "request_id": request_id,
+        }
+
+    def _decode(self, content: dict):
+        """返回 (用于生成向量的字节, 类型)"""
+        if not isinstance(content, dict):
+            raise ValueError("content must be an object")
+        if "text" in content:
+            return str(content["text"]).encode("utf-8"), "text"
+        if "image" in content:
+            image = str(content["image"])
+            if image.startswith("data:"):
+                header, _, encoded = image.partition(",")
+                if not header.endswith(";base64"):
+                    raise ValueError("image data URI must be base64")
+                try:
+                    return base64.b64decode(encoded, validate=True), "image"
+                except binascii.Error:
+                    raise ValueError("invalid base64 image data")
+            return image.encode("utf-8"), "image"  # URL 形式的输入按字符串生成向量
+        raise ValueError("content must contain text or image")
+
+    def _error(self, status: int, code: str, message: str, request_id: str, headers: dict = None):
+        self._count("5xx" if status >= 500 else str(status))
+        return status, headers or {}, {"code": code, "message": message, "request_id": request_id}
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 保持长连接，与真实服务一致
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                # GET /stats 返回请求计数，便于压测脚本核对
+                self._send(200, {}, server.snapshot_stats())
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    self._send(401, {}, {"code": "InvalidApiKey", "message": "No API-key provided."})
+                    return
+                result = server.handle(body)
+                if result is None:
+                    time.sleep(server.config.timeout_delay)
+                    self.close_connection = True
+                    return
+                self._send(*result)
+
+            def _send(self, status: int, headers: dict, body: dict):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="叠加的随机延迟上限（秒）")
+    parser.add_argument("--latency-per-item", type=float, default=0.0, help="批内每个输入的额外延迟（秒）")
+    parser.add_argument("--qps", type=float, default=0.0, help="服务端限流，0 表示不限")
+    parser.add_argument("--error-429", type=float, default=0.0, help="随机返回 429 的比例")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="随机返回 500 的比例")
+    parser.add_argument("--error-timeout", type=float, default=0.0, help="随机挂起不响应的比例")
+    parser.add_argument("--timeout-delay", type=float, default=65.0, help="模拟超时时挂起的秒数")
+    parser.add_argument("--max-batch", type=int, default=20, help="单次请求的输入数上限")
+    parser.add_argument("--seed", type=int, default=None, help="错误注入与延迟抖动的随机种子")
+    args = parser.parse_args()
+
+    config = FakeServerConfig(
+        dim=args.dim, latency=args.latency, jitter=args.jitter,
+        latency_per_item=args.latency_per_item, qps=args.qps,
+        error_429=args.error_429, error_5xx=args.error_5xx, error_timeout=args.error_timeout,
+        timeout_delay=args.timeout_delay, max_batch=args.max_batch, seed=args.seed,
+    )
+    server = FakeEmbeddingServer(config, args.host, args.port)
+    print(f"模拟 embedding 服务已启动: {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
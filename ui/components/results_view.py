@@ -0,0 +1,229 @@
+import subprocess
+from typing import TYPE_CHECKING
+
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView, QMenu
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QRectF, QSize, pyqtSignal
+from PyQt6.QtGui import QColor, QFont, QPainter, QPen, QPixmap
+
+from config.settings import RESULTS_PAGE_SIZE
+from ui.components.thumbnail_loader import ThumbnailLoader
+
+if TYPE_CHECKING:
+    from core.search_engine import RankedResults  # 依赖 numpy，启动时不导入
+
+
+class ResultsModel(QAbstractListModel):
+    """搜索结果模型
+
+    只保存已经翻到的结果；视图滚动到底部时通过 fetchMore 再向
+    RankedResults 取下一页。缩略图在绘制时才向 ThumbnailLoader 请求。
+    """
+    ResultRole = Qt.ItemDataRole.UserRole + 1
+    ThumbnailFailedRole = Qt.ItemDataRole.UserRole + 2
+
+    def __init__(self, page_size: int = RESULTS_PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.page_size = page_size
+        self._ranked = None
+        self._items = []
+        self._rows_by_key = {}  # 缩略图 key -> 行号
+        self._failed = set()
+        ThumbnailLoader.instance().ready.connect(self.on_thumbnail_ready)
+
+    def set_results(self, ranked: "RankedResults"):
+        """替换为新的搜索结果，并取第一页"""
+        self.beginResetModel()
+        self._ranked = ranked
+        self._items = []
+        self._rows_by_key = {}
+        self._failed = set()
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def set_partial(self, items: list):
+        """显示扫描过程中的中间结果（一页），最终结果到达后由 set_results 替换"""
+        self.beginResetModel()
+        self._ranked = None
+        self._items = list(items)
+        self._rows_by_key = {}
+        self._failed = set()
+        self.endResetModel()
+
+    def clear(self):
+        self.set_results(None)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._items)
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        if parent.isValid() or self._ranked is None:
+            return False
+        return len(self._items) < len(self._ranked)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        page = self._ranked.fetch(len(self._items), self.page_size)
+        if not page:
+            # 索引在搜索之后发生了变化，停止继续翻页
+            self._ranked = None
+            return
+
+        start = len(self._items)
+        self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+        self._items.extend(page)
+        self.endInsertRows()
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self._items[index.row()]
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            return item["name"]
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return item["path"]
+        if role == self.ResultRole:
+            return item
+        if role == Qt.ItemDataRole.DecorationRole:
+            # 加载失败的缩略图不再重复请求，避免 绘制 -> 请求 -> 失败 的循环
+            if item["path"] in self._failed:
+                return None
+            version = f"{item['mtime']}|{item['size']}"
+            key, pixmap = ThumbnailLoader.instance().request(item["path"], version=version)
+            self._rows_by_key[key] = index.row()
+            return pixmap
+        if role == self.ThumbnailFailedRole:
+            return item["path"] in self._failed
+        return None
+
+    def on_thumbnail_ready(self, key: str, pixmap: QPixmap):
+        """缩略图加载完成，刷新对应的单元格"""
+        row = self._rows_by_key.get(key)
+        if row is None or row >= len(self._items):
+            return
+        if pixmap.isNull():
+            self._failed.add(self._items[row]["path"])
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class ResultDelegate(QStyledItemDelegate):
+    """绘制结果卡片：缩略图、排名、相似度与文件名"""
+
+    CARD_SIZE = QSize(184, 236)
+    IMAGE_SIZE = 160
+    PADDING = 12
+
+    def sizeHint(self, option, index) -> QSize:
+        return self.CARD_SIZE
+
+    def paint(self, painter: QPainter, option, index: QModelIndex):
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+
+        rect = option.rect
+        hovered = bool(option.state & QStyle.StateFlag.State_MouseOver)
+
+        # 卡片背景
+        painter.setPen(QPen(QColor("#4A90A4" if hovered else "#EEEEEE"), 1))
+        painter.setBrush(QColor("#FFFFFF"))
+        painter.drawRoundedRect(QRectF(rect).adjusted(0.5, 0.5, -0.5, -0.5), 12, 12)
+
+        # 缩略图
+        image_rect = QRect(
+            rect.left() + (rect.width() - self.IMAGE_SIZE) // 2,
+            rect.top() + self.PADDING,
+            self.IMAGE_SIZE, self.IMAGE_SIZE
+        )
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor("#F5F5F5"))
+        painter.drawRoundedRect(QRectF(image_rect), 8, 8)
+
+        pixmap = index.data(Qt.ItemDataRole.DecorationRole)
+        if pixmap is not None and not pixmap.isNull():
+            size = pixmap.size().scaled(image_rect.size(), Qt.AspectRatioMode.KeepAspectRatio)
+            target = QRect(0, 0, size.width(), size.height())
+            target.moveCenter(image_rect.center())
+            painter.drawPixmap(target, pixmap)
+        else:
+            failed = index.data(ResultsModel.ThumbnailFailedRole)
+            painter.setPen(QColor("#AAAAAA"))
+            painter.drawText(image_rect, Qt.AlignmentFlag.AlignCenter,
+                             "无法加载" if failed else "加载中...")
+
+        result = index.data(ResultsModel.ResultRole)
+        text_left = rect.left() + self.PADDING
+        text_width = rect.width() - 2 * self.PADDING
+
+        # 信息栏：排名与相似度
+        info_rect = QRect(text_left, image_rect.bottom() + 9, text_width, 18)
+        font = QFont(option.font)
+        font.setPixelSize(12)
+        font.setWeight(QFont.Weight.DemiBold)
+        painter.setFont(font)
+        painter.setPen(QColor("#4A90A4"))
+        painter.drawText(info_rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+                         f"#{index.row() + 1}")
+
+        font.setPixelSize(11)
+        font.setWeight(QFont.Weight.Normal)
+        painter.setFont(font)
+        painter.setPen(QColor("#888888"))
+        painter.drawText(info_rect, Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter,
+                         f"{result['score']:.3f}")
+
+        # 文件名（过长时中间省略）
+        name_rect = QRect(text_left, info_rect.bottom() + 7, text_width, 18)
+        font.setPixelSize(12)
+        painter.setFont(font)
+        painter.setPen(QColor("#555555"))
+        name = painter.fontMetrics().elidedText(
+            result["name"], Qt.TextElideMode.ElideMiddle, text_width
+        )
+        painter.drawText(name_rect, Qt.AlignmentFlag.AlignCenter, name)
+
+        painter.restore()
+
+
+class ResultsView(QListView):
+    """虚拟化的结果网格，只绘制可见的单元格，滚动到底部时自动加载下一页"""
+    find_similar = pyqtSignal(str)  # 图片路径
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("resultsView")
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setMovement(QListView.Movement.Static)
+        self.setUniformItemSizes(True)
+        self.setSpacing(10)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setMouseTracking(True)
+        self.viewport().setCursor(Qt.CursorShape.PointingHandCursor)
+        self.setItemDelegate(ResultDelegate(self))
+        self.doubleClicked.connect(self.open_location)
+
+    def open_location(self, index: QModelIndex):
+        """双击打开文件所在位置"""
+        result = index.data(ResultsModel.ResultRole)
+        if result:
+            subprocess.run(['explorer', '/select,', result["path"]])
+
+    def contextMenuEvent(self, event):
+        """右键菜单：查找相似图片 / 打开所在位置"""
+        index = self.indexAt(event.pos())
+        result = index.data(ResultsModel.ResultRole) if index.isValid() else None
+        if not result:
+            return
+        menu = QMenu(self)
+        similar = menu.addAction("查找相似图片")
+        locate = menu.addAction("打开所在位置")
+        chosen = menu.exec(event.globalPos())
+        if chosen is similar:
+            self.find_similar.emit(result["path"])
+        elif chosen is locate:
+            self.open_location(index)
@@ -0,0 +1,159 @@
+from PyQt6.QtWidgets import (
+    QFrame, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QPlainTextEdit, QFileDialog
+)
+from PyQt6.QtCore import QTimer
+
+from config.settings import STATS_REFRESH_MS
+from core.metrics import metrics, StartupTimeline
+
+
+class StatsPanel(QFrame):
+    """运行统计面板：可见时定时刷新 core.metrics 中的指标，可导出为 JSON 或 Prometheus 文本"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("statsPanel")
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(12, 8, 12, 8)
+        layout.setSpacing(4)
+
+        header = QHBoxLayout()
+        title = QLabel("运行统计")
+        title.setObjectName("statusLabel")
+        header.addWidget(title)
+        header.addStretch()
+        for text, handler in (("导出 JSON", self.export_json),
+                              ("导出 Prometheus", self.export_prometheus),
+                              ("清零", self.reset)):
+            button = QPushButton(text)
+            button.setObjectName("statsExportButton")
+            button.clicked.connect(handler)
+            header.addWidget(button)
+        layout.addLayout(header)
+
+        self.text = QPlainTextEdit()
+        self.text.setObjectName("statsText")
+        self.text.setReadOnly(True)
+        self.text.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        layout.addWidget(self.text)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(STATS_REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.timer.stop()
+
+    def refresh(self):
+        scroll = self.text.verticalScrollBar().value()
+        self.text.setPlainText(self.render(metrics.snapshot()))
+        self.text.verticalScrollBar().setValue(scroll)
+
+    def reset(self):
+        metrics.reset()
+        self.refresh()
+
+    def export_json(self):
+        self._export("导出统计（JSON）", "metrics.json", "JSON (*.json)", metrics.to_json())
+
+    def export_prometheus(self):
+        self._export("导出统计（Prometheus）", "metrics.prom", "Prometheus (*.prom *.txt)",
+                     metrics.to_prometheus())
+
+    def _export(self, caption: str, default: str, filters: str, content: str):
+        path, _ = QFileDialog.getSaveFileName(self, caption, default, filters)
+        if not path:
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+        except OSError as e:
+            print(f"导出统计失败: {e}")
+
+    @staticmethod
+    def render(snapshot: dict) -> str:
+        """把指标快照整理成便于阅读的文本"""
+        counters = {}
+        for item in snapshot["counters"]:
+            counters.setdefault(item["name"], {})[_label_text(item["labels"])] = item["value"]
+        gauges = {item["name"]: item["value"] for item in snapshot["gauges"]}
+
+        def rate(name: str, hits: tuple) -> str:
+            values = counters.get(name, {})
+            total = sum(values.values())
+            if not total:
+                return "-"
+            hit = sum(v for label, v in values.items() if label in hits)
+            return f"{hit / total:.0%} ({int(hit)}/{int(total)})"
+
+        lines = []
+        marks = sorted(
+            (item["value"], item["labels"].get("stage", "")) for item in snapshot["gauges"]
+            if item["name"] == "startup_seconds"
+        )
+        if marks:
+            lines.append(
+                "启动    " + "  ".join(
+                    f"{StartupTimeline.STAGES.get(stage, stage)} {value * 1000:.0f} ms" for value, stage in marks
+                )
+            )
+
+        files = counters.get("index_files_total", {})
+        if files or "index_images_per_s" in gauges:
+            lines.append(
+                "索引    " + "  ".join(f"{_short(label)} {int(v)}" for label, v in sorted(files.items()))
+            )
+            lines.append(
+                f"        速度 {gauges.get('index_images_per_s', 0):.1f} 张/秒  "
+                f"哈希读取 {counters.get('index_hashed_bytes_total', {}).get('', 0) / 2 ** 20:.1f} MB  "
+                f"重新排队 {int(counters.get('index_requeued_total', {}).get('', 0))}"
+            )
+
+        requests = counters.get("api_requests_total", {})
+        if requests:
+            lines.append(
+                "API     " + "  ".join(f"{_short(label)} {int(v)}" for label, v in sorted(requests.items()))
+            )
+            lines.append(
+                f"        重试 {int(counters.get('api_retries_total', {}).get('', 0))}  "
+                f"上传 {counters.get('api_upload_bytes_total', {}).get('', 0) / 2 ** 20:.1f} MB"
+            )
+            inputs = counters.get("api_inputs_total", {})
+            if inputs:
+                lines.append(
+                    "        输入 " + "  ".join(f"{_short(label)} {int(v)}" for label, v in sorted(inputs.items()))
+                )
+
+        lines.append(
+            f"命中率  查询向量 {rate('query_cache_requests_total', ('result=hit',))}  "
+            f"缩略图 {rate('thumbnail_requests_total', ('result=memory', 'result=disk'))}"
+        )
+
+        if snapshot["histograms"]:
+            lines.append("")
+            lines.append(f"{'阶段耗时 (ms)':<30}{'次数':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'最大':>10}")
+            for h in snapshot["histograms"]:
+                name = h["name"].replace("_seconds", "")
+                label = _short(_label_text(h["labels"]))
+                title = f"{name}.{label}" if label else name
+                lines.append(
+                    f"{title:<34}{h['count']:>8}{h['p50'] * 1000:>10.2f}{h['p90'] * 1000:>10.2f}"
+                    f"{h['p99'] * 1000:>10.2f}{h['max'] * 1000:>10.2f}"
+                )
+        return "\n".join(lines)
+
+
+def _label_text(labels: dict) -> str:
+    return ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+
+
+def _short(label: str) -> str:
+    """只保留标签的取值，例如 kind=image,result=ok -> image/ok"""
+    return "/".join(part.split("=", 1)[-1] for part in label.split(",") if part)
@@ -0,0 +1,164 @@
+import os
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QSize, Qt, pyqtSignal
+from PyQt6.QtGui import QImage, QImageReader, QPixmap
+
+from config.settings import (
+    THUMB_SIZE, THUMB_CACHE_DIR, THUMB_CACHE_MAX_BYTES, THUMB_MEMORY_ITEMS,
+)
+from core.metrics import metrics
+
+
+class _ThumbnailSignals(QObject):
+    loaded = pyqtSignal(str, QImage)  # key, image
+
+
+class _ThumbnailTask(QRunnable):
+    """在线程池中生成缩略图：优先读磁盘缓存，否则按目标尺寸解码原图"""
+
+    def __init__(self, key: str, path: str, size: int, cache_dir: Path,
+                 signals: _ThumbnailSignals):
+        super().__init__()
+        self.key = key
+        self.path = path
+        self.size = size
+        self.cache_dir = cache_dir
+        self.signals = signals
+
+    def run(self):
+        image = QImage()
+        try:
+            cache_file = self._cache_file()
+            if cache_file.exists():
+                image.load(str(cache_file))
+                os.utime(cache_file)  # 刷新访问时间，供 LRU 清理参考
+                if not image.isNull():
+                    metrics.inc("thumbnail_requests_total", result="disk")
+
+            if image.isNull():
+                metrics.inc("thumbnail_requests_total", result="decode")
+                image = self._decode()
+                if not image.isNull():
+                    tmp = cache_file.with_name(cache_file.name + ".tmp")
+                    if image.save(str(tmp), "JPG", 85):
+                        os.replace(tmp, cache_file)
+        except OSError:
+            pass
+        self.signals.loaded.emit(self.key, image)
+
+    def _cache_file(self) -> Path:
+        # 以 路径 + 文件版本(mtime, size) + 缩略图尺寸 作为磁盘缓存键
+        st = os.stat(self.path)
+        raw = f"{self.path}|{st.st_mtime_ns}|{st.st_size}|{self.size}"
+        return self.cache_dir / (hashlib.sha1(raw.encode("utf-8")).hexdigest() + ".jpg")
+
+    def _decode(self) -> QImage:
+        reader = QImageReader(self.path)
+        reader.setAutoTransform(True)
+        original = reader.size()
+        if original.isValid():
+            # 让解码器直接按缩略图尺寸解码（JPEG 可跳过大部分像素）
+            reader.setScaledSize(original.scaled(
+                QSize(self.size, self.size), Qt.AspectRatioMode.KeepAspectRatio
+            ))
+        return reader.read()
+
+
+class _PruneTask(QRunnable):
+    """把磁盘缓存清理到容量上限以内，最久未访问的文件先删除"""
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        super().__init__()
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def run(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file():
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+class ThumbnailLoader(QObject):
+    """异步缩略图加载器
+
+    缩略图在 QThreadPool 中生成并写入有容量上限的磁盘缓存，生成后在
+    GUI 线程转为 QPixmap 并放入内存 LRU。request 命中内存时立即返回，
+    否则安排后台任务并在完成后发出 ready 信号。
+    """
+    ready = pyqtSignal(str, QPixmap)  # key, pixmap（加载失败时为空）
+
+    PRUNE_EVERY = 100  # 每生成多少张缩略图检查一次磁盘缓存容量
+
+    _instance = None
+
+    def __init__(self, cache_dir: str = THUMB_CACHE_DIR, max_bytes: int = THUMB_CACHE_MAX_BYTES,
+                 memory_items: int = THUMB_MEMORY_ITEMS):
+        super().__init__()
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max(2, QThreadPool.globalInstance().maxThreadCount() // 2))
+        self._pixmaps = OrderedDict()
+        self._pending = set()
+        self._loaded_count = 0
+        self._signals = _ThumbnailSignals()
+        self._signals.loaded.connect(self._on_loaded, Qt.ConnectionType.QueuedConnection)
+
+    @classmethod
+    def instance(cls) -> "ThumbnailLoader":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def request(self, path: str, size: int = THUMB_SIZE,
+                version: str = "") -> Tuple[str, Optional[QPixmap]]:
+        """返回 (key, pixmap)；pixmap 为 None 时结果稍后通过 ready 信号送达
+
+        version 为调用方已知的文件版本（例如向量库记录的修改时间与大小），计入
+        内存缓存键，图片重新索引后不再命中旧的缩略图。这里在 GUI 线程中调用，
+        不访问文件系统；按实际文件状态失效由后台任务的磁盘缓存键负责。
+        """
+        key = f"{size}|{version}|{path}" if version else f"{size}|{path}"
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+            metrics.inc("thumbnail_requests_total", result="memory")
+            return key, pixmap
+
+        if key not in self._pending:
+            self._pending.add(key)
+            self.pool.start(_ThumbnailTask(key, path, size, self.cache_dir, self._signals))
+        return key, None
+
+    def _on_loaded(self, key: str, image: QImage):
+        self._pending.discard(key)
+        pixmap = QPixmap.fromImage(image)
+        if not pixmap.isNull():
+            self._pixmaps[key] = pixmap
+            while len(self._pixmaps) > self.memory_items:
+                self._pixmaps.popitem(last=False)
+
+            self._loaded_count += 1
+            if self._loaded_count % self.PRUNE_EVERY == 0:
+                self.pool.start(_PruneTask(self.cache_dir, self.max_bytes))
+        self.ready.emit(key, pixmap)
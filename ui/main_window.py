@@ -1,39 +1,68 @@
 import os
-import json
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLineEdit, QPushButton, QLabel, QScrollArea,
-    QProgressBar, QMessageBox, QGridLayout
+    QLineEdit, QPushButton, QLabel, QStackedWidget,
+    QProgressBar, QMessageBox
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 
 from config.settings import (
-    API_KEY, IMAGE_DIR, CACHE_FILE, 
+    API_KEY, IMAGE_DIRS, STORE_DIR, SUPPORTED_FORMATS,
+    ANN_ENABLED, ANN_MIN_VECTORS, ANN_NLIST, ANN_NPROBE, API_QPS,
+    WATCH_ENABLED, SEARCH_AS_YOU_TYPE, SEARCH_DEBOUNCE_MS, PROFILE_MODE,
 )
-from api.embedding import EmbeddingAPI
-from workers.index_worker import IndexWorker
-from workers.search_worker import SearchWorker
-from ui.components.image_card import ImageCard
+from api.rate_limiter import TokenBucket
+from core.metrics import startup
+from workers.library_loader import LibraryLoader
+from ui.components.results_view import ResultsModel, ResultsView
+from ui.components.stats_panel import StatsPanel
 from ui.styles.qss import STYLE_SHEET
 
+# 依赖 numpy / requests 的模块在后台加载图片库时才第一次导入，窗口可以立即显示
+if TYPE_CHECKING:
+    from api.embedding import EmbeddingAPI
+    from api.query_cache import QueryEmbeddingCache
+    from core.ann_index import IVFIndex
+    from core.library import Compaction
+    from core.search_engine import RankedResults
+    from core.shards import Shard, ShardedLibrary
+    from workers.search_worker import SearchWorker
+
 class MainWindow(QMainWindow):
     """主窗口"""
     
     def __init__(self):
         super().__init__()
-        self.embeddings = {}
+        self.shards = None  # ShardedLibrary，后台加载完成前为 None
         self.api = None
+        self.rate_limiter = TokenBucket(API_QPS)
+        self.query_cache = None
+        self.loader = None
         self.index_worker = None
+        self.index_shard = None  # 正在索引的分片
+        self.indexing = False  # 是否有完整重建或监视模式的增量索引在进行
+        self.index_queue = []  # 完整重建时等待索引的分片
+        self.index_errors = []
         self.search_worker = None
+        self.search_request = 0  # 最新搜索请求的编号，其它编号的结果直接丢弃
+        self.search_explicit = False  # 最新请求是否由回车、按钮或菜单触发（出错时弹窗）
+        self.partial_request = 0  # 已显示过中间结果的请求编号
+        self.deferred = []  # 等搜索线程空闲后再执行的修改（见 when_search_idle）
+        self.ann_worker = None
+        self.compaction_worker = None
+        self.watchers = {}  # 分片名 -> LibraryWatcher
         
         self.setup_ui()
-        self.load_cache()
-        self.update_status()
+        self.load_library()
     
     def setup_ui(self):
         self.setWindowTitle("图片语义检索")
         self.setMinimumSize(1000, 700)
         self.resize(1100, 800)
+        self.setAcceptDrops(True)  # 拖入图片以图搜图
         
         # 中央部件
         central = QWidget()
@@ -63,6 +92,12 @@ class MainWindow(QMainWindow):
         self.index_btn.clicked.connect(self.start_indexing)
         header_layout.addWidget(self.index_btn)
         
+        self.stats_btn = QPushButton("统计")
+        self.stats_btn.setObjectName("statsButton")
+        self.stats_btn.setCheckable(True)
+        self.stats_btn.toggled.connect(self.toggle_stats)
+        header_layout.addWidget(self.stats_btn)
+        
         main_layout.addLayout(header_layout)
         
         # ===== 搜索栏 =====
@@ -71,10 +106,23 @@ class MainWindow(QMainWindow):
         
         self.search_input = QLineEdit()
         self.search_input.setObjectName("searchInput")
-        self.search_input.setPlaceholderText("输入描述文字，搜索匹配的图片...")
+        self.search_input.setPlaceholderText("输入描述文字，或拖入图片，搜索匹配的图片...")
+        self.search_input.setToolTip(
+            "可在描述后附加过滤条件，例如：\n"
+            "dir:旅行/2023  ext:jpg,png  size>1mb  mtime>=2024-01-01  mtime>7d  width>=1920\n"
+            "前缀 - 表示排除，如 -ext:gif；以图搜图时同样生效"
+        )
+        self.search_input.setAcceptDrops(False)  # 拖入的文件交给窗口处理，不插入为文本
         self.search_input.returnPressed.connect(self.start_search)
+        self.search_input.textEdited.connect(self.on_search_text_edited)
         search_layout.addWidget(self.search_input)
         
+        # 输入防抖：停止输入一段时间后自动搜索
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.on_search_timer)
+        
         self.search_btn = QPushButton("搜索")
         self.search_btn.setObjectName("searchButton")
         self.search_btn.clicked.connect(self.start_search)
@@ -89,58 +137,245 @@ class MainWindow(QMainWindow):
         self.progress_bar.setFixedHeight(6)
         main_layout.addWidget(self.progress_bar)
         
+        # ===== 运行统计（默认隐藏）=====
+        self.stats_panel = StatsPanel()
+        self.stats_panel.setMaximumHeight(240)
+        self.stats_panel.setVisible(False)
+        main_layout.addWidget(self.stats_panel)
+        
         # ===== 结果区域 =====
-        scroll = QScrollArea()
-        scroll.setWidgetResizable(True)
-        scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        # 结果网格只绘制可见单元格，滚动时按页加载；无结果时切换为提示文本
+        self.results_stack = QStackedWidget()
         
-        self.results_container = QWidget()
-        self.results_layout = QGridLayout(self.results_container)
-        self.results_layout.setContentsMargins(0, 16, 0, 16)
-        self.results_layout.setSpacing(20)
-        self.results_layout.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
+        self.hint_label = QLabel()
+        self.hint_label.setObjectName("hintLabel")
+        self.hint_label.setAlignment(Qt.AlignmentFlag.AlignHCenter | Qt.AlignmentFlag.AlignTop)
+        self.hint_label.setContentsMargins(0, 16, 0, 16)
+        self.results_stack.addWidget(self.hint_label)
         
-        scroll.setWidget(self.results_container)
-        main_layout.addWidget(scroll, 1)
+        self.results_model = ResultsModel(parent=self)
+        self.results_view = ResultsView()
+        self.results_view.setModel(self.results_model)
+        self.results_view.find_similar.connect(self.find_similar)
+        self.results_stack.addWidget(self.results_view)
+        
+        main_layout.addWidget(self.results_stack, 1)
         
         # 初始化提示标签
         self.show_hint("请先构建索引，然后输入文字进行搜索")
         
         self.setStyleSheet(STYLE_SHEET)
     
+    def toggle_stats(self, checked: bool):
+        """显示或隐藏运行统计面板"""
+        self.stats_panel.setVisible(checked)
+    
     def show_hint(self, text: str):
         """显示提示文本"""
         self.clear_results()
-        hint_label = QLabel(text)
-        hint_label.setObjectName("hintLabel")
-        hint_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.results_layout.addWidget(hint_label, 0, 0, 1, 5, Qt.AlignmentFlag.AlignCenter)
-    
-    def load_cache(self):
-        """加载缓存的embeddings"""
-        if os.path.exists(CACHE_FILE):
-            try:
-                with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                    self.embeddings = json.load(f)
-            except Exception as e:
-                print(f"加载缓存失败: {e}")
-                self.embeddings = {}
-    
-    def save_cache(self):
-        """保存embeddings到缓存"""
+        self.hint_label.setText(text)
+        self.results_stack.setCurrentWidget(self.hint_label)
+    
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        startup.mark("first_paint")
+    
+    def load_library(self):
+        """在后台加载各分片的向量库（迁移旧版缓存、恢复索引日志的逻辑见 ImageLibrary.load）
+        
+        加载期间窗口照常显示，搜索与索引在加载完成后才可用。
+        """
+        self.index_btn.setEnabled(False)
+        self.search_btn.setEnabled(False)
+        self.search_input.setEnabled(False)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setMaximum(100)
+        self.progress_bar.setValue(0)
+        self.status_label.setText("正在加载索引 0%")
+        self.show_hint("正在加载索引...")
+        
+        self.loader = LibraryLoader(IMAGE_DIRS, STORE_DIR)
+        self.loader.progress.connect(self.on_library_progress)
+        self.loader.finished.connect(self.on_library_loaded)
+        self.loader.error.connect(self.on_library_error)
+        self.loader.start()
+    
+    def on_library_progress(self, percent: int):
+        self.progress_bar.setValue(percent)
+        self.status_label.setText(f"正在加载索引 {percent}%")
+    
+    def on_library_loaded(self, library: "ShardedLibrary", query_cache: "QueryEmbeddingCache"):
+        """图片库加载完成，启用搜索"""
+        self.shards = library
+        self.query_cache = query_cache
+        self.update_ann_index()
+        if WATCH_ENABLED:
+            self.start_watching()
+        
+        self.update_index_button()
+        self.search_btn.setEnabled(True)
+        self.search_input.setEnabled(True)
+        self.progress_bar.setVisible(False)
+        self.update_status()
+        if len(self.shards):
+            self.show_hint("输入描述文字开始搜索")
+        else:
+            self.show_hint("请先构建索引，然后输入文字进行搜索")
+        self.search_input.setFocus()
+        
+        startup.mark("ready")
+        if PROFILE_MODE:
+            print(startup.summary())  # 平时只在统计面板中显示启动耗时
+    
+    def on_library_error(self, error: str):
+        self.progress_bar.setVisible(False)
+        self.status_label.setText("加载索引失败")
+        self.show_hint("加载索引失败")
+        QMessageBox.critical(self, "加载错误", error)
+    
+    def commit_updates(self, shard: "Shard", updates: dict, removed: list, journal_seq: int):
+        """把索引结果合并到分片的内存中，未写回的变化足够多时在后台写回"""
+        shard.library.commit(updates, removed, journal_seq, save=False)
+        self.start_compaction()
+    
+    def start_compaction(self):
+        """在后台写回未写回变化最多的分片（同一时间只写回一个，完成后再检查其余分片）"""
+        if self.compaction_worker is not None:
+            return
+        due = [shard for shard in self.shards.loaded_shards() if shard.library.compaction_due]
+        if not due:
+            return
+        
+        from core.library import Compaction
+        from workers.compaction_worker import CompactionWorker
+        
+        library = max(due, key=lambda shard: shard.library.unsaved_changes).library
+        self.compaction_worker = CompactionWorker(Compaction(library))
+        self.compaction_worker.finished.connect(partial(self.when_search_idle, self.on_compaction_finished))
+        self.compaction_worker.start()
+    
+    def on_compaction_finished(self, compaction: "Compaction", ok: bool):
+        """后台写回完成，切换到新的向量文件"""
+        self.compaction_worker.wait()
+        self.compaction_worker = None
+        if ok:
+            compaction.finish()
+        self.start_compaction()
+    
+    def update_ann_index(self):
+        """按需为各分片加载近似索引，缺失、过期或规模变化较大时在后台依次重建"""
+        for shard in self.shards.loaded_shards():
+            library = shard.library
+            if not ANN_ENABLED or len(library.store) < ANN_MIN_VECTORS:
+                library.engine.detach_ann()
+                continue
+        
+            ann = library.engine.ann
+            if ann is None:
+                ann = library.load_ann(ANN_NPROBE)
+                if ann is None or library.engine.ann is None:
+                    self.start_ann_build(shard, ann)
+                    continue
+        
+            if ann.trained_count * 2 < len(library.store):
+                self.start_ann_build(shard)
+    
+    def start_ann_build(self, shard: "Shard", previous: "IVFIndex" = None):
+        """在后台训练/重建分片的近似索引（同一时间只构建一个，完成后再检查其余分片）"""
+        if self.ann_worker and self.ann_worker.isRunning():
+            return
+        
+        from workers.ann_worker import AnnBuildWorker
+        
+        self.ann_worker = AnnBuildWorker(shard.library.store, ANN_NLIST, ANN_NPROBE, previous)
+        self.ann_worker.finished.connect(partial(self.when_search_idle, self.on_ann_built, shard))
+        self.ann_worker.error.connect(self.on_ann_error)
+        self.ann_worker.start()
+    
+    def on_ann_built(self, shard: "Shard", index: "IVFIndex", paths: list):
+        """近似索引构建完成"""
+        if not shard.loaded:
+            return
+        library = shard.library
+        library.engine.attach_ann(index, paths)
+        if library.unsaved_changes:
+            # 向量库文件落后于内存，簇编号与下一次写回的向量文件一起保存
+            self.update_ann_index()
+            return
         try:
-            with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.embeddings, f)
+            index.save(library.store_dir, library.engine.ann_labels_for(library.store.paths),
+                       library.store.generation)
         except Exception as e:
-            print(f"保存缓存失败: {e}")
+            print(f"保存近似索引失败: {e}")
+        self.update_ann_index()
+    
+    def on_ann_error(self, error: str):
+        """近似索引构建出错，继续使用精确检索"""
+        print(f"构建近似索引失败: {error}")
+    
+    def start_watching(self):
+        """监视各分片的图片目录，变化经防抖合并后自动增量索引"""
+        from workers.library_watcher import LibraryWatcher
+        for shard in self.shards.loaded_shards():
+            watcher = LibraryWatcher(shard.roots, shard.library.store, parent=self)
+            watcher.changed.connect(partial(self.on_library_changed, shard))
+            watcher.reset()
+            self.watchers[shard.name] = watcher
+    
+    def pause_watchers(self):
+        """索引进行中暂停处理目录变化，事件继续累积"""
+        for watcher in self.watchers.values():
+            watcher.paused = True
+    
+    def resume_watchers(self):
+        for watcher in self.watchers.values():
+            watcher.resume()
+    
+    def on_library_changed(self, shard: "Shard", files: list, moved: dict, removed: list):
+        """图片目录发生变化：移动与删除直接生效，新增或修改的文件在后台索引"""
+        if files and not API_KEY:
+            print(f"未配置 API Key，跳过 {len(files)} 个新增或修改的文件")
+            files = []
+        if not (files or moved or removed):
+            return
+        
+        self.pause_watchers()
+        self.index_btn.setEnabled(False)
+        self.status_label.setText(f"正在更新索引 ({len(files) + len(moved) + len(removed)})")
+        self.start_index_worker(shard, files=files, moved=moved, removed=removed)
+    
+    def start_index_worker(self, shard: "Shard", **kwargs):
+        """在后台索引一个分片，参数含义见 IndexWorker"""
+        from workers.index_worker import IndexWorker
+        library = shard.library
+        self.index_shard = shard
+        self.indexing = True
+        self.index_worker = IndexWorker(self.get_api(), shard.roots, library.store, library.journal,
+                                        **kwargs)
+        self.index_worker.progress.connect(self.on_index_progress)
+        # 合并结果会修改检索引擎，等进行中的搜索结束后再处理
+        self.index_worker.checkpoint.connect(partial(self.when_search_idle, self.on_index_checkpoint))
+        self.index_worker.finished.connect(partial(self.when_search_idle, self.on_index_finished))
+        self.index_worker.error.connect(partial(self.when_search_idle, self.on_index_error))
+        self.index_worker.start()
     
     def update_status(self):
         """更新状态显示"""
-        count = len(self.embeddings)
+        if self.shards is None:
+            return  # 仍在加载，显示加载进度
+        count = len(self.shards)
         if count > 0:
-            self.status_label.setText(f"已索引 {count} 张图片")
+            shards = len(self.shards.loaded_shards())
+            suffix = f"（{shards} 个分片）" if self.shards.sharded and shards > 1 else ""
+            self.status_label.setText(f"已索引 {count} 张图片{suffix}")
         else:
             self.status_label.setText("未建立索引")
+        
+        stats = self.query_cache.stats()
+        self.status_label.setToolTip(
+            f"查询缓存：命中 {stats['hits']} 次，未命中 {stats['misses']} 次，"
+            f"共 {stats['size']} 条"
+        )
     
     def check_api_key(self) -> bool:
         """检查API Key是否已配置"""
@@ -154,20 +389,31 @@ class MainWindow(QMainWindow):
             return False
         return True
     
+    def get_api(self) -> "EmbeddingAPI":
+        """复用同一个 API 实例，索引与搜索共享连接池"""
+        if self.api is None:
+            from api.embedding import EmbeddingAPI
+            self.api = EmbeddingAPI(API_KEY, self.rate_limiter, query_cache=self.query_cache)
+        return self.api
+    
     def start_indexing(self):
-        """开始建立索引"""
+        """开始建立索引（分片模式下依次索引每个分片，各自独立保存）"""
         if not self.check_api_key():
             return
         
-        if not os.path.exists(IMAGE_DIR):
+        missing = [d for d in IMAGE_DIRS if not os.path.exists(d)]
+        if missing:
             QMessageBox.warning(
                 self,
                 "路径错误",
-                f"图片目录不存在：\n{IMAGE_DIR}\n\n请检查路径是否正确。"
+                "图片目录不存在：\n" + "\n".join(missing) + "\n\n请检查路径是否正确。"
             )
             return
         
-        self.api = EmbeddingAPI(API_KEY)
+        if self.index_worker and self.index_worker.isRunning():
+            return
+        
+        self.pause_watchers()
         
         self.index_btn.setEnabled(False)
         self.search_btn.setEnabled(False)
@@ -176,55 +422,173 @@ class MainWindow(QMainWindow):
         self.progress_bar.setValue(0)
         self.status_label.setText("正在构建索引...")
         
-        self.index_worker = IndexWorker(self.api, IMAGE_DIR, self.embeddings)
-        self.index_worker.progress.connect(self.on_index_progress)
-        self.index_worker.finished.connect(self.on_index_finished)
-        self.index_worker.error.connect(self.on_index_error)
-        self.index_worker.start()
+        self.index_queue = self.shards.shards_for(IMAGE_DIRS)
+        self.index_errors = []
+        self.shards.load(self.index_queue)
+        self.index_next_shard()
+    
+    def index_next_shard(self):
+        """开始索引队列中的下一个分片"""
+        self.progress_bar.setValue(0)
+        self.start_index_worker(self.index_queue.pop(0))
     
     def on_index_progress(self, current: int, total: int, filename: str):
         """索引进度更新"""
         self.progress_bar.setMaximum(total)
         self.progress_bar.setValue(current)
-        self.status_label.setText(f"正在索引 ({current}/{total})")
+        prefix = f"{self.index_shard.name} " if self.shards.sharded else ""
+        self.status_label.setText(f"正在索引 {prefix}({current}/{total})")
+    
+    def on_index_checkpoint(self, updates: dict, journal_seq: int):
+        """索引过程中的阶段性合并"""
+        self.commit_updates(self.index_shard, updates, [], journal_seq)
+    
+    def on_index_finished(self, updates: dict, removed: list, journal_seq: int):
+        """一个分片索引完成"""
+        incremental = self.index_worker.files is not None
+        self.commit_updates(self.index_shard, updates, removed, journal_seq)
+        self.update_ann_index()
+        
+        if incremental:
+            self.indexing = False
+            self.update_index_button()
+            self.update_status()
+            self.resume_watchers()
+            return
+        if self.index_queue:
+            self.index_next_shard()
+            return
+        self.finish_indexing()
     
-    def on_index_finished(self, embeddings: dict):
-        """索引完成"""
-        self.embeddings = embeddings
-        self.save_cache()
+    def on_index_error(self, error: str):
+        """索引出错，已写入日志的结果仍然保留；完整重建时继续索引其余分片"""
+        library = self.index_shard.library
+        updates, removed = library.replay_journal()
+        if updates or removed:
+            library.engine.apply(updates, removed)
+            self.update_ann_index()
+        
+        incremental = self.index_worker.files is not None
+        if incremental:
+            print(f"增量索引出错: {error}")
+            self.indexing = False
+            self.update_index_button()
+            self.update_status()
+            self.resume_watchers()
+            return
         
-        self.index_btn.setEnabled(True)
+        self.index_errors.append(f"{self.index_shard.name}: {error}" if self.shards.sharded else error)
+        if self.index_queue:
+            self.index_next_shard()
+            return
+        self.finish_indexing()
+    
+    def finish_indexing(self):
+        """全部分片处理完毕，恢复界面"""
+        for watcher in self.watchers.values():
+            watcher.reset()
+        self.resume_watchers()
+        
+        self.indexing = False
+        self.update_index_button()
         self.search_btn.setEnabled(True)
         self.search_input.setEnabled(True)
         self.progress_bar.setVisible(False)
-        
         self.update_status()
+        
+        if self.index_errors:
+            QMessageBox.critical(self, "索引错误", "\n".join(self.index_errors))
+            return
+        
         self.show_hint("输入描述文字开始搜索")
         
         QMessageBox.information(
             self,
             "索引完成",
-            f"已成功索引 {len(self.embeddings)} 张图片"
+            f"已成功索引 {len(self.shards)} 张图片"
         )
-    
-    def on_index_error(self, error: str):
-        """索引出错"""
-        self.index_btn.setEnabled(True)
-        self.search_btn.setEnabled(True)
-        self.search_input.setEnabled(True)
-        self.progress_bar.setVisible(False)
-        self.update_status()
         
-        QMessageBox.critical(self, "索引错误", error)
-    
     def start_search(self):
         """开始搜索"""
-        query = self.search_input.text().strip()
+        self.search_timer.stop()
+        query, where = self.search_text()
         
         if not query:
+            if where:
+                QMessageBox.warning(self, "提示", "请在过滤条件之外输入描述文字")
             return
         
-        if not self.embeddings:
+        self.run_search(query, "text", where=where)
+    
+    def search_text(self) -> tuple:
+        """返回搜索框中的 (描述文字, 过滤表达式)"""
+        from core.filters import split_query
+        return split_query(self.search_input.text())
+    
+    def on_search_text_edited(self, text: str):
+        """输入变化：清空时作废进行中的搜索，否则重新计时"""
+        if not text.strip():
+            self.search_timer.stop()
+            self.cancel_search()
+            if len(self.shards):
+                self.show_hint("输入描述文字开始搜索")
+            return
+        if SEARCH_AS_YOU_TYPE:
+            self.search_timer.start()
+    
+    def on_search_timer(self):
+        """停止输入后自动搜索；条件不满足时不弹窗打断输入"""
+        query, where = self.search_text()
+        if query and len(self.shards) and API_KEY:
+            self.run_search(query, "text", explicit=False, where=where)
+    
+    def find_similar(self, path: str):
+        """以图搜图：库中的图片直接使用已保存的向量，外部图片请求一次后缓存
+        
+        搜索框中的过滤条件同样生效。
+        """
+        self.run_search(os.path.normpath(path), "image", where=self.search_text()[1])
+    
+    def dragEnterEvent(self, event):
+        if self.dropped_image(event.mimeData()):
+            event.acceptProposedAction()
+    
+    def dropEvent(self, event):
+        path = self.dropped_image(event.mimeData())
+        if path:
+            event.acceptProposedAction()
+            self.find_similar(path)
+    
+    @staticmethod
+    def dropped_image(mime_data) -> str:
+        """返回拖入的第一个本地图片文件，没有时返回空字符串"""
+        for url in mime_data.urls():
+            path = url.toLocalFile()
+            if path and Path(path).suffix.lower() in SUPPORTED_FORMATS:
+                return path
+        return ""
+    
+    def get_search_worker(self) -> "SearchWorker":
+        """常驻的搜索线程，首次搜索时启动"""
+        if self.search_worker is None:
+            from workers.search_worker import SearchWorker
+            self.search_worker = SearchWorker(self.get_api(), self.shards)
+            self.search_worker.partial_results.connect(self.on_search_partial)
+            self.search_worker.finished.connect(self.on_search_finished)
+            self.search_worker.error.connect(self.on_search_error)
+            self.search_worker.idle.connect(self.on_search_idle)
+            self.search_worker.start()
+        return self.search_worker
+    
+    def run_search(self, query: str, kind: str, explicit: bool = True, where: str = ""):
+        """提交到搜索线程，kind 为 text（描述文字）或 image（图片路径）
+        
+        where 为元数据过滤表达式。新请求会取代尚未完成的请求，只有最新请求的结果会显示。
+        """
+        if not self.search_input.isEnabled():
+            return  # 正在构建索引
+        
+        if not len(self.shards):
             QMessageBox.warning(
                 self,
                 "提示",
@@ -232,71 +596,106 @@ class MainWindow(QMainWindow):
             )
             return
         
-        if not self.check_api_key():
+        # 库中已有的图片不需要调用 API
+        if (kind == "text" or query not in self.shards) and not self.check_api_key():
             return
         
-        self.api = EmbeddingAPI(API_KEY)
-        
-        self.search_btn.setEnabled(False)
         self.index_btn.setEnabled(False)
         self.progress_bar.setVisible(True)
         self.progress_bar.setMaximum(0)  # 不确定进度
         self.status_label.setText("正在搜索...")
         
-        # 清空结果并显示搜索中提示
-        self.show_hint("正在搜索...")
+        # 以图搜图清空结果；文字搜索保留上一次的结果直到新结果到达，输入时不闪烁
+        if kind == "image":
+            self.show_hint(f"正在查找与 {Path(query).name} 相似的图片...")
+        elif self.results_stack.currentWidget() is self.hint_label:
+            self.show_hint("正在搜索...")
         
-        self.search_worker = SearchWorker(self.api, query, self.embeddings)
-        self.search_worker.finished.connect(self.on_search_finished)
-        self.search_worker.error.connect(self.on_search_error)
-        self.search_worker.start()
+        self.search_explicit = explicit
+        self.search_request = self.get_search_worker().submit(query, kind, where)
+    
+    def on_search_idle(self):
+        """搜索线程处理完全部请求：执行推迟的修改，允许开始完整索引"""
+        if self.search_worker.busy:
+            return  # 期间又提交了新请求，等下一次空闲
+        deferred, self.deferred = self.deferred, []
+        for fn in deferred:
+            fn()
+        self.update_index_button()
+    
+    def when_search_idle(self, fn, *args):
+        """搜索线程空闲时立即执行 fn(*args)，否则推迟到它处理完全部请求之后
+        
+        修改检索引擎或向量库的操作都经过这里，打分期间行号与向量不会变化。
+        """
+        if self.deferred or (self.search_worker is not None and self.search_worker.busy):
+            self.deferred.append(partial(fn, *args))
+        else:
+            fn(*args)
+    
+    def update_index_button(self):
+        """没有索引在进行、搜索线程也已空闲时才允许开始完整索引"""
+        searching = self.search_worker is not None and self.search_worker.busy
+        self.index_btn.setEnabled(self.shards is not None and not self.indexing and not searching)
+    
+    def cancel_search(self):
+        """作废进行中的搜索"""
+        if self.search_worker is not None:
+            self.search_worker.cancel()
+        self.search_request = 0
+        self.update_index_button()
+        self.progress_bar.setVisible(False)
+        self.update_status()
     
     def clear_results(self):
         """清空搜索结果"""
-        while self.results_layout.count():
-            item = self.results_layout.takeAt(0)
-            widget = item.widget()
-            if widget:
-                widget.setParent(None)
-                widget.deleteLater()
-    
-    def on_search_finished(self, results: list):
-        """搜索完成"""
-        self.search_btn.setEnabled(True)
-        self.index_btn.setEnabled(True)
+        self.results_model.clear()
+    
+    def on_search_partial(self, request_id: int, items: list, fraction: float):
+        """大图库扫描过程中的中间结果：先显示当前最好的一页，并显示扫描进度"""
+        if request_id != self.search_request or not items:
+            return
+        percent = int(fraction * 100)
+        self.progress_bar.setMaximum(100)
+        self.progress_bar.setValue(percent)
+        self.status_label.setText(f"正在搜索 {percent}%")
+        
+        self.results_model.set_partial(items)
+        if self.partial_request != request_id:
+            self.partial_request = request_id
+            self.results_view.scrollToTop()
+            self.results_stack.setCurrentWidget(self.results_view)
+    
+    def on_search_finished(self, request_id: int, results: "RankedResults"):
+        """搜索完成，已被新请求取代的结果直接丢弃"""
+        if request_id != self.search_request:
+            return
+        self.update_index_button()
         self.progress_bar.setVisible(False)
         self.update_status()
+        if not results.complete:
+            self.status_label.setText(self.status_label.text() + "（搜索超时，只包含已扫描部分的结果）")
         
-        # 先清空结果
-        self.clear_results()
-        
-        if not results:
+        if not len(results):
             self.show_hint("未找到匹配的图片")
             return
         
-        # 显示结果（每行5个）
-        for i, result in enumerate(results):
-            row = i // 5
-            col = i % 5
-            
-            card = ImageCard(
-                rank=i + 1,
-                path=result["path"],
-                name=result["name"],
-                score=result["score"]
-            )
-            
-            self.results_layout.addWidget(card, row, col)
+        # 模型只取第一页，其余结果在滚动时按需加载
+        self.results_model.set_results(results)
+        self.results_view.scrollToTop()
+        self.results_stack.setCurrentWidget(self.results_view)
     
-    def on_search_error(self, error: str):
-        """搜索出错"""
-        self.search_btn.setEnabled(True)
-        self.index_btn.setEnabled(True)
+    def on_search_error(self, request_id: int, error: str):
+        """搜索出错；输入时自动触发的搜索只显示提示，不弹窗"""
+        if request_id != self.search_request:
+            return
+        self.update_index_button()
         self.progress_bar.setVisible(False)
         self.update_status()
         
         self.show_hint("搜索出错，请重试")
-        QMessageBox.critical(self, "搜索错误", error)
+        if self.search_explicit:
+            QMessageBox.critical(self, "搜索错误", error)
     
     def closeEvent(self, event):
         """关闭窗口时清理"""
@@ -304,7 +703,27 @@ class MainWindow(QMainWindow):
             self.index_worker.cancel()
             self.index_worker.wait()
         
-        if self.search_worker and self.search_worker.isRunning():
-            self.search_worker.wait()
+        if self.search_worker is not None:
+            self.search_worker.stop()
+        
+        if self.ann_worker and self.ann_worker.isRunning():
+            self.ann_worker.wait()
+        
+        if self.compaction_worker is not None:
+            self.compaction_worker.wait()
+        
+        if self.loader is not None and self.loader.isRunning():
+            self.loader.wait()
+        
+        for watcher in self.watchers.values():
+            watcher.stop()
+        if self.shards is not None:
+            self.shards.flush()
+            self.shards.close()
+        
+        if self.api is not None:
+            self.api.close()
+        if self.query_cache is not None:
+            self.query_cache.save()
         
         event.accept()
\ No newline at end of file
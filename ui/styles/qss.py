@@ -66,6 +66,50 @@ QPushButton#indexButton:disabled {
     border-color: #CCCCCC;
 }
 
+QPushButton#statsButton {
+    background-color: transparent;
+    color: #888888;
+    border: 1px solid #E0E0E0;
+    border-radius: 8px;
+    padding: 12px 16px;
+    font-size: 14px;
+}
+
+QPushButton#statsButton:hover {
+    background-color: #F5F5F5;
+}
+
+QPushButton#statsButton:checked {
+    color: #4A90A4;
+    border-color: #4A90A4;
+}
+
+QFrame#statsPanel {
+    background-color: #FFFFFF;
+    border: 1px solid #EEEEEE;
+    border-radius: 8px;
+}
+
+QPlainTextEdit#statsText {
+    border: none;
+    background-color: transparent;
+    color: #555555;
+    font-family: Consolas, "Courier New", monospace;
+    font-size: 12px;
+}
+
+QPushButton#statsExportButton {
+    background-color: transparent;
+    color: #4A90A4;
+    border: none;
+    padding: 4px 8px;
+    font-size: 12px;
+}
+
+QPushButton#statsExportButton:hover {
+    color: #2E5F6D;
+}
+
 QLabel#titleLabel {
     color: #333333;
     font-size: 24px;
@@ -95,34 +139,8 @@ QProgressBar::chunk {
     border-radius: 4px;
 }
 
-QScrollArea {
+QListView#resultsView {
     border: none;
     background-color: transparent;
 }
-
-QFrame#imageCard {
-    background-color: #FFFFFF;
-    border: 1px solid #EEEEEE;
-    border-radius: 12px;
-}
-
-QFrame#imageCard:hover {
-    border: 1px solid #4A90A4;
-}
-
-QLabel#rankLabel {
-    color: #4A90A4;
-    font-size: 12px;
-    font-weight: 600;
-}
-
-QLabel#scoreLabel {
-    color: #888888;
-    font-size: 11px;
-}
-
-QLabel#fileNameLabel {
-    color: #555555;
-    font-size: 12px;
-}
 """
\ No newline at end of file
@@ -0,0 +1,44 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+
+import numpy as np
+
+from core.ann_index import IVFIndex
+from core.vector_store import VectorStore
+
+class AnnBuildWorker(QThread):
+    """近似索引构建线程"""
+    finished = pyqtSignal(object, list)  # IVFIndex, 簇编号对应的路径顺序
+    error = pyqtSignal(str)
+    
+    def __init__(self, store: VectorStore, nlist: int, nprobe: int,
+                 previous: IVFIndex = None):
+        super().__init__()
+        # 取快照：构建期间主线程可能修改 store；向量在后台线程中分块读取
+        self.store = store.snapshot()
+        self.paths = self.store.paths
+        self.nlist = nlist or IVFIndex.auto_nlist(len(self.paths))
+        self.nprobe = nprobe
+        self.previous = previous
+    
+    def run(self):
+        try:
+            # 向量数变化不大时复用已有聚类中心，只重新分配簇
+            previous = self.previous
+            count = len(self.paths)
+            if previous is not None and previous.trained_count * 2 >= count:
+                index = previous
+            else:
+                index = IVFIndex(self.nlist, self.nprobe)
+                rows = index.sample_rows(count)
+                index.train_sample(self.store.vectors_at(rows), count)
+            
+            # 分块读取并分配，有未写回的增量时也不拼接整个向量矩阵
+            labels = np.empty(count, dtype=np.int32)
+            for start in range(0, count, IVFIndex.ASSIGN_CHUNK_ROWS):
+                block = self.store.vectors_at(slice(start, min(start + IVFIndex.ASSIGN_CHUNK_ROWS, count)))
+                labels[start:start + len(block)] = index.assign(block)
+            index.set_labels(labels)
+            self.finished.emit(index, self.paths)
+            
+        except Exception as e:
+            self.error.emit(str(e))
@@ -0,0 +1,14 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from core.library import Compaction
+
+class CompactionWorker(QThread):
+    """在后台把图片库写回向量库，完成后由主线程调用 Compaction.finish"""
+    finished = pyqtSignal(object, bool)  # Compaction, 是否写出成功
+    
+    def __init__(self, compaction: Compaction):
+        super().__init__()
+        self.compaction = compaction
+    
+    def run(self):
+        self.finished.emit(self.compaction, self.compaction.run())
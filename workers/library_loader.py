@@ -0,0 +1,51 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+
+import threading
+from typing import List
+
+from config.settings import QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_FILE
+from core.metrics import startup
+
+class LibraryLoader(QThread):
+    """启动时在后台加载图片库
+
+    numpy、requests 等较重的模块在这里第一次导入，之后读取查询向量缓存并
+    并行加载各分片的向量库，主窗口不必等待即可显示，显示所需的时间与图库
+    规模无关。进度按已载入检索引擎的向量行数计算，只增不减。
+    """
+    progress = pyqtSignal(int)  # 百分比
+    finished = pyqtSignal(object, object)  # ShardedLibrary, QueryEmbeddingCache
+    error = pyqtSignal(str)
+    
+    def __init__(self, roots: List[str], store_dir: str):
+        super().__init__()
+        self.roots = list(roots)
+        self.store_dir = store_dir
+        self._percent = 0
+        self._lock = threading.Lock()
+    
+    def run(self):
+        try:
+            import api.embedding  # 预先导入 requests，首次搜索时不再等待
+            from api.query_cache import QueryEmbeddingCache
+            from core.shards import ShardedLibrary
+            startup.mark("deferred_imports")
+            
+            query_cache = QueryEmbeddingCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_FILE)
+            query_cache.load()
+            library = ShardedLibrary(self.roots, self.store_dir)
+            library.load(on_progress=self.on_progress)
+            startup.mark("index_loaded")
+            self.finished.emit(library, query_cache)
+            
+        except Exception as e:
+            self.error.emit(str(e))
+    
+    def on_progress(self, done: int, total: int):
+        """在加载线程（或并行加载分片的线程）中调用"""
+        percent = done * 100 // total if total else 0
+        with self._lock:
+            if percent <= self._percent:
+                return
+            self._percent = percent
+        self.progress.emit(percent)
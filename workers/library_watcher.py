@@ -0,0 +1,183 @@
+import os
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+from PyQt6.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+from config.settings import (
+    SUPPORTED_FORMATS, SCAN_RECURSIVE, SCAN_INCLUDE, SCAN_EXCLUDE, SCAN_SYMLINKS,
+    WATCH_DEBOUNCE_MS,
+)
+from core.file_hash import file_stat
+from core.scanner import list_directory
+from core.vector_store import VectorStore
+
+
+class LibraryWatcher(QObject):
+    """监视图片目录，把一段时间内的变化合并成一次增量索引请求
+
+    QFileSystemWatcher 只报告“某个目录发生了变化”，因此防抖窗口结束后只
+    重新列出变化过的目录，按 size/mtime 与向量库比对，工作量与变化目录的
+    规模成正比，与整个图库无关。消失的文件若与新出现文件的 size/mtime/inode
+    一致，视为移动或改名，直接复用原有的哈希与向量。
+    """
+    changed = pyqtSignal(list, dict, list)  # 需要索引的文件, 移动或改名后的条目, 已删除的路径
+
+    def __init__(self, roots: Iterable[str], store: VectorStore,
+                 debounce_ms: int = WATCH_DEBOUNCE_MS, parent=None):
+        super().__init__(parent)
+        self.roots = [str(Path(root)) for root in roots]
+        self.store = store
+        self.paused = False  # 索引进行中时暂停处理，事件继续累积
+        self._by_dir = {}  # 目录 -> 位于该目录的已知图片路径
+        self._dirty = set()
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(debounce_ms)
+        self._timer.timeout.connect(self._flush)
+
+    def reset(self, store: VectorStore = None):
+        """按向量库重建目录索引，并监视根目录及（递归模式下）所有已知子目录"""
+        if store is not None:
+            self.store = store
+        by_dir = {}
+        for path in self.store.paths:
+            by_dir.setdefault(os.path.dirname(path), set()).add(path)
+        self._by_dir = by_dir
+
+        directories = set(self.roots)
+        if SCAN_RECURSIVE:
+            directories.update(d for d in by_dir if self._locate(d) is not None)
+        self._watch(directories)
+
+    def stop(self):
+        self._timer.stop()
+        watched = self._watcher.directories()
+        if watched:
+            self._watcher.removePaths(watched)
+
+    def resume(self):
+        """索引结束后恢复处理暂停期间累积的变化"""
+        self.paused = False
+        if self._dirty:
+            self._timer.start()
+
+    def _on_directory_changed(self, path: str):
+        self._dirty.add(str(Path(path)))
+        # 每个新事件都重新计时，连续的复制、移动合并为一批
+        self._timer.start()
+
+    def _flush(self):
+        if self.paused:
+            return
+        dirty, self._dirty = self._dirty, set()
+
+        present, gone = {}, []
+        for directory in dirty:
+            for path, entry in self._relist(directory, gone):
+                present[path] = entry
+
+        # 新出现或 size/mtime 变化的文件；内容是否真的变化由索引线程按哈希判断
+        candidates = []
+        for path, entry in present.items():
+            cached = self.store.get(path)
+            if cached is not None:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if cached.get("size") == st.st_size and cached.get("mtime") == st.st_mtime_ns:
+                    continue
+            candidates.append(path)
+
+        removed = [path for path in gone if path in self.store]
+        sources = {}
+        for path in removed:
+            cached = self.store.get(path)
+            sources[(cached.get("size"), cached.get("mtime"), cached.get("inode"))] = path
+
+        # 移动/改名：新文件的 stat 与某个消失的条目一致时复用其向量
+        files, moved = [], {}
+        for path in candidates:
+            source = None
+            if sources and path not in self.store:
+                try:
+                    stat = file_stat(path)
+                except OSError:
+                    continue
+                source = sources.pop((stat["size"], stat["mtime"], stat["inode"]), None)
+            if source is None:
+                files.append(path)
+                continue
+            entry = self.store.get(source)
+            entry.update(stat)
+            entry["name"] = Path(path).name
+            entry["embedding"] = self.store.vector(source)
+            moved[path] = entry
+
+        if files or moved or removed:
+            self.changed.emit(files, moved, removed)
+
+    def _relist(self, directory: str, gone: list):
+        """重新列出一个目录，产出 (路径, DirEntry)；消失的已知路径加入 gone
+
+        递归模式下新出现的子目录会被加入监视并整体列出。
+        """
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            located = self._locate(current)
+            if located is None:
+                continue
+            try:
+                entries, subdirs = list_directory(current, located[1], SUPPORTED_FORMATS,
+                                                  SCAN_INCLUDE, SCAN_EXCLUDE, SCAN_SYMLINKS)
+            except OSError:
+                # 目录已被删除或移走
+                entries, subdirs = [], []
+                if current in self._watched():
+                    self._watcher.removePath(current)
+
+            listed = {str(Path(entry.path)): entry for entry in entries}
+            gone.extend(self._by_dir.pop(current, set()) - listed.keys())
+            if listed:
+                self._by_dir[current] = set(listed)
+            yield from listed.items()
+
+            if SCAN_RECURSIVE:
+                watched = self._watched()
+                subdirs = {str(Path(sub)) for sub, _ in subdirs}
+                new_dirs = [sub for sub in subdirs if sub not in watched]
+                self._watch(new_dirs)
+                # 被移走的子目录不一定会单独报告变化，在这里一并清理
+                vanished = [
+                    d for d in watched | self._by_dir.keys()
+                    if os.path.dirname(d) == current and d not in subdirs
+                ]
+                stack.extend(new_dirs + vanished)
+
+    def _locate(self, directory: str) -> Optional[Tuple[str, str]]:
+        """返回 (所属根目录, 以 / 分隔的相对路径)，不在任何根目录下时返回 None"""
+        for root in self.roots:
+            if directory == root:
+                return root, ""
+            prefix = root.rstrip(os.sep) + os.sep
+            if directory.startswith(prefix):
+                if not SCAN_RECURSIVE:
+                    continue
+                return root, directory[len(prefix):].replace(os.sep, "/")
+        return None
+
+    def _watched(self) -> set:
+        return {str(Path(d)) for d in self._watcher.directories()}
+
+    def _watch(self, directories: Iterable[str]):
+        new = sorted(set(directories) - self._watched())
+        new = [d for d in new if os.path.isdir(d)]
+        if new:
+            failed = self._watcher.addPaths(new)
+            if failed:
+                print(f"无法监视 {len(failed)} 个目录（可能超出系统的监视数量上限）")
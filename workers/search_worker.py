@@ -1,50 +1,141 @@
-import numpy as np
 from PyQt6.QtCore import QThread, pyqtSignal
-from pathlib import Path
+
+import threading
+import time
 
 from api.embedding import EmbeddingAPI
+from config.settings import SEARCH_STREAMING, SEARCH_STREAM_MIN_VECTORS
+from core.filters import compile_filter
+from core.metrics import metrics, RunProfiler
+from core.shards import ShardedLibrary
 
 class SearchWorker(QThread):
-    """搜索工作线程"""
-    finished = pyqtSignal(list)
-    error = pyqtSignal(str)
+    """常驻的搜索线程
+
+    submit() 提交的请求按编号排队，线程只处理最新的一条：尚未开始的旧请求
+    直接丢弃，进行中的旧请求在限流或重试等待时中断，拿到向量后也不再打分。
+    结果带请求编号发出，界面只显示最新请求的结果。
+
+    kind 为 text 时 query 是描述文字；为 image 时 query 是图片路径，库中已有的
+    图片直接使用保存的向量（不调用 API），外部图片请求一次后按内容缓存。
+    where 为元数据过滤表达式（见 core.filters），只对满足条件的图片打分。
+
+    图库较大时分块扫描（见 core.streaming），扫描过程中通过 partial_results
+    发出当前最好的一页结果，新请求到达时在块之间中断打分。
+
+    处理完全部请求、回到等待状态时发出 idle。检索引擎与向量库只应在 busy 为
+    False 时修改（线程在等待，只有主线程提交新请求才会再次打分）。
+    """
+    partial_results = pyqtSignal(int, list, float)  # 请求编号, 当前最好的结果, 已扫描比例
+    finished = pyqtSignal(int, object)  # 请求编号, RankedResults
+    error = pyqtSignal(int, str)  # 请求编号, 错误信息
+    idle = pyqtSignal()
     
-    def __init__(self, api: EmbeddingAPI, query: str, embeddings: dict):
+    def __init__(self, api: EmbeddingAPI, library: ShardedLibrary):
         super().__init__()
         self.api = api
-        self.query = query
-        self.embeddings = embeddings
+        self.library = library
+        self._condition = threading.Condition()
+        self._pending = None  # (编号, 查询, 类型, 过滤表达式)
+        self._latest = 0
+        self._cancel = threading.Event()  # 进行中的请求被取代时置位
+        self._stopping = False
+        self._busy = False  # 是否正在处理请求（含已作废、尚未退出打分的请求）
+    
+    @property
+    def busy(self) -> bool:
+        """是否有进行中或排队的请求"""
+        with self._condition:
+            return self._busy or self._pending is not None
+    
+    def submit(self, query: str, kind: str = "text", where: str = "") -> int:
+        """提交搜索请求，返回请求编号；之前未完成的请求随之作废"""
+        with self._condition:
+            self._latest += 1
+            self._pending = (self._latest, query, kind, where)
+            self._cancel.set()
+            self._condition.notify()
+            return self._latest
+    
+    def cancel(self):
+        """作废全部未完成的请求"""
+        with self._condition:
+            self._latest += 1
+            self._pending = None
+            self._cancel.set()
+    
+    def stop(self):
+        """结束线程并等待退出"""
+        with self._condition:
+            self._stopping = True
+            self._pending = None
+            self._cancel.set()
+            self._condition.notify()
+        self.wait()
     
     def run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopping:
+                    if self._busy:
+                        self._busy = False
+                        self.idle.emit()
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                request_id, query, kind, where = self._pending
+                self._pending = None
+                self._busy = True
+                self._cancel = cancel = threading.Event()
+            self.search(request_id, query, kind, where, cancel)
+    
+    def search(self, request_id: int, query: str, kind: str, where: str, cancel: threading.Event):
+        profiler = RunProfiler.start("search")
+        started = time.perf_counter()
         try:
-            # 获取查询文本的embedding
-            query_embedding = self.api.get_text_embedding(self.query)
+            # 先编译过滤条件，表达式有误时不必请求向量
+            where = compile_filter(where)
+            query_embedding = None
+            if kind == "image":
+                query_embedding = self.library.vector_of(query)
             
+            # 获取查询文本（或外部图片）的embedding
             if query_embedding is None:
-                self.error.emit("无法获取文本向量，请检查API配置")
-                return
+                with metrics.timer("search_stage_seconds", stage="embed"):
+                    if kind == "image":
+                        query_embedding = self.api.get_image_query_embedding(query, cancel)
+                    else:
+                        query_embedding = self.api.get_text_embedding(query, cancel)
             
-            query_vec = np.array(query_embedding)
+            if cancel.is_set():
+                metrics.inc("search_total", result="cancelled", kind=kind)
+                return
             
-            # 计算相似度
-            results = []
-            for path, data in self.embeddings.items():
-                if "embedding" in data:
-                    img_vec = np.array(data["embedding"])
-                    similarity = self._cosine_similarity(query_vec, img_vec)
-                    results.append({
-                        "path": path,
-                        "name": data.get("name", Path(path).name),
-                        "score": similarity
-                    })
+            if query_embedding is None:
+                metrics.inc("search_total", result="error", kind=kind)
+                self.error.emit(request_id, "无法获取图片向量，请检查图片与API配置" if kind == "image"
+                                else "无法获取文本向量，请检查API配置")
+                return
             
-            # 按相似度排序，取前10
-            results.sort(key=lambda x: x["score"], reverse=True)
-            self.finished.emit(results[:10])
+            # 各分片并行做一次矩阵乘法计算全部相似度，排序留到界面翻页时按需进行；
+            # 大图库分块扫描，先发出中间结果
+            with metrics.timer("search_stage_seconds", stage="score"):
+                if SEARCH_STREAMING and len(self.library) >= SEARCH_STREAM_MIN_VECTORS:
+                    ranked = self.library.rank_stream(
+                        query_embedding, where, cancel,
+                        lambda items, fraction: self.partial_results.emit(request_id, items, fraction)
+                    )
+                else:
+                    ranked = self.library.rank(query_embedding, where)
+            if ranked is None or cancel.is_set():
+                metrics.inc("search_total", result="cancelled", kind=kind)
+                return
+            metrics.observe("search_stage_seconds", time.perf_counter() - started, stage="total")
+            metrics.inc("search_total", result="ok" if ranked.complete else "partial", kind=kind)
+            self.finished.emit(request_id, ranked)
             
         except Exception as e:
-            self.error.emit(str(e))
-    
-    def _cosine_similarity(self, a: np.ndarray, b: np.ndarray) -> float:
-        """计算余弦相似度"""
-        return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
\ No newline at end of file
+            metrics.inc("search_total", result="error", kind=kind)
+            self.error.emit(request_id, str(e))
+        finally:
+            profiler.stop()